@@ -1,6 +1,8 @@
 from homeassistant.loader import async_get_integration
 import asyncio
 from homeassistant import config_entries, core
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.helpers.storage import STORAGE_DIR
 from .const import (
     DOMAIN,
     STARTUP,
@@ -15,9 +17,19 @@ from .const import (
     CONF_SCHOOLSCHEDULE,
     CONF_UGEPLAN,
     CONF_MU_OPGAVER,
+    CONF_UGEPLAN_WEEKS,
+    DEFAULT_UGEPLAN_WEEKS,
+    CONF_HUSKELISTEN_DAYS,
+    DEFAULT_HUSKELISTEN_DAYS,
 )
 import logging
 from .client import Client
+from .coordinator import RefreshScheduler, create_coordinator
+from .metrics import MetricsView
+from .pictures import ProfilePictureCache, ProfilePictureView
+from .recording import RecordingAdapter, adapter_from_environment
+from .transport import Transport
+from .websocket_api import async_register_websocket_commands
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -29,6 +41,27 @@ async def async_setup_entry(
     integration = await async_get_integration(hass, DOMAIN)
     _LOGGER.info(STARTUP, integration.version)
     hass.data.setdefault(DOMAIN, {})
+    # Shared by the clients of all entries, created with the first one
+    if "transport" not in hass.data[DOMAIN]:
+        # Recording or replaying the requests when asked to, see recording.py
+        adapter = await hass.async_add_executor_job(adapter_from_environment)
+        if isinstance(adapter, RecordingAdapter):
+
+            async def async_save_recording(event):
+                await hass.async_add_executor_job(adapter.save)
+
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_save_recording)
+        hass.data[DOMAIN]["transport"] = Transport(adapter=adapter)
+        hass.data[DOMAIN]["scheduler"] = RefreshScheduler(hass)
+        hass.data[DOMAIN]["pictures"] = await hass.async_add_executor_job(
+            ProfilePictureCache,
+            hass.config.path(STORAGE_DIR, DOMAIN + "_profile_pictures"),
+            hass.data[DOMAIN]["transport"],
+        )
+    if not hass.data[DOMAIN].get("views_registered"):
+        hass.http.register_view(ProfilePictureView())
+        hass.http.register_view(MetricsView())
+        hass.data[DOMAIN]["views_registered"] = True
 
     # Extract configuration
     mitid_username = entry.data.get(CONF_MITID_USERNAME)
@@ -87,8 +120,18 @@ async def async_setup_entry(
         mitid_identity,
         hass,  # Pass hass reference for token persistence
         entry,  # Pass config entry for token persistence
+        entry.options.get(
+            CONF_UGEPLAN_WEEKS,
+            entry.data.get(CONF_UGEPLAN_WEEKS, DEFAULT_UGEPLAN_WEEKS),
+        ),
+        entry.options.get(
+            CONF_HUSKELISTEN_DAYS,
+            entry.data.get(CONF_HUSKELISTEN_DAYS, DEFAULT_HUSKELISTEN_DAYS),
+        ),
+        hass.data[DOMAIN]["transport"],
     )
-    hass.data[DOMAIN]["client"] = client
+    hass_data["client"] = client
+    async_register_websocket_commands(hass)
 
     # Perform login/validation
     if not stored_tokens:
@@ -100,7 +143,15 @@ async def async_setup_entry(
         await hass.async_add_executor_job(client.login)
 
     # Fetch initial data before setting up platforms
-    await hass.async_add_executor_job(client.update_data)
+    coordinator = create_coordinator(
+        hass,
+        entry,
+        client,
+        hass.data[DOMAIN]["scheduler"],
+        hass.data[DOMAIN]["pictures"],
+    )
+    hass_data["coordinator"] = coordinator
+    await coordinator.async_config_entry_first_refresh()
 
     await hass.config_entries.async_forward_entry_setups(
         entry, ["sensor", "binary_sensor"]
@@ -108,6 +159,15 @@ async def async_setup_entry(
     return True
 
 
+def loaded_entries(hass: core.HomeAssistant) -> dict:
+    """Return entry id -> runtime data of the config entries with a client."""
+    return {
+        entry_id: data
+        for entry_id, data in hass.data.get(DOMAIN, {}).items()
+        if isinstance(data, dict) and "client" in data
+    }
+
+
 async def async_update_tokens(
     hass: core.HomeAssistant, entry: config_entries.ConfigEntry, tokens: dict
 ):
@@ -160,4 +220,11 @@ async def async_unload_entry(
         if unload_ok:
             hass.data[DOMAIN].pop(entry.entry_id)
 
+    if unload_ok and not loaded_entries(hass):
+        hass.data[DOMAIN].pop("scheduler", None)
+        hass.data[DOMAIN].pop("pictures", None)
+        transport = hass.data[DOMAIN].pop("transport", None)
+        if transport:
+            await hass.async_add_executor_job(transport.close)
+
     return unload_ok
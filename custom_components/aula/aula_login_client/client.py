@@ -78,6 +78,7 @@ class AulaLoginClient:
         timeout: int = 30,
         debug: bool = False,
         verbose: bool = False,
+        session: Optional[requests.Session] = None,
     ):
         """
         Initialize the Aula login client.
@@ -90,6 +91,8 @@ class AulaLoginClient:
             timeout: Request timeout in seconds
             debug: Enable debug logging
             verbose: Enable verbose output (default: False)
+            session: Optional session to send the requests with, e.g. one
+                sharing a connection pool (default: a new requests.Session)
 
         Raises:
             ConfigurationError: If MitID BrowserClient is not available
@@ -99,7 +102,7 @@ class AulaLoginClient:
                 "MitID BrowserClient not found. Please install: pip install mitid-browserclient"
             )
 
-        self.session = requests.Session()
+        self.session = session or requests.Session()
         self.mitid_username = mitid_username
         self.mitid_password = mitid_password
         self.auth_method = auth_method
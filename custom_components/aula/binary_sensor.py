@@ -1,91 +1,76 @@
-from datetime import timedelta
 from homeassistant.components.binary_sensor import BinarySensorEntity
-from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant import config_entries, core
-#from homeassistant.util import Throttle
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 import logging
 
 from .const import DOMAIN
+from .entity import async_entry_unique_id
 
 _LOGGER = logging.getLogger(__name__)
-SCAN_INTERVAL = timedelta(seconds=300.0)
 
 async def async_setup_entry(hass: core.HomeAssistant, config_entry: config_entries.ConfigEntry, async_add_entities):
 
-    client = hass.data[DOMAIN]["client"]
-    if client.unread_messages == 1:
-        try:
-            subject = client.message["subject"]
-        except:
-            subject = ""
-        try:
-            text = client.message["text"]
-        except:
-            text = ""
-        try:
-            sender = client.message["sender"]
-        except:
-            sender = ""
-    else:
-        subject = ""
-        text = ""
-        sender= ""
+    config = hass.data[DOMAIN][config_entry.entry_id]
+    unique_id = async_entry_unique_id(
+        hass, "binary_sensor", config_entry, "aulamessage"
+    )
 
-    sensors = []
-    device = AulaBinarySensor(hass=hass, unread=client.unread_messages, subject=subject, text=text, sender=sender)
-    sensors.append(device)
-    async_add_entities(sensors, True)
+    async_add_entities(
+        [AulaBinarySensor(config["coordinator"], config["client"], unique_id)]
+    )
 
 
-class AulaBinarySensor(BinarySensorEntity, RestoreEntity):
-    def __init__(self,hass,unread,subject,text,sender):
-        self._hass = hass
-        self._unread = unread
-        self._subject = subject
-        self._text = text
-        self._sender = sender
-        self._client = self._hass.data[DOMAIN]["client"]
+class AulaBinarySensor(CoordinatorEntity, BinarySensorEntity):
+    """On while there is an unread message, with the latest one as attributes.
 
-    @property
-    def extra_state_attributes(self):
-        attributes = {}
-        attributes["subject"] = self._subject
-        attributes["text"] = self._text
-        attributes["sender"] = self._sender
-        attributes["friendly_name"] = "Aula message"
-        return attributes
+    The messages attribute lists the unread messages of the first page of
+    threads, newest first.
 
-    @property
-    def unique_id(self):
-        unique_id = "aulamessage"
-        return unique_id
+    Updated by the entry's coordinator, which also refreshes the messages, and
+    only written when the unread message changed.
+    """
 
-    @property
-    def icon(self):
-        return 'mdi:email'
+    # The message bodies can be large HTML, keep them out of the recorder database
+    _unrecorded_attributes = frozenset({"text", "messages"})
+    _attr_name = "Aula message"
+    _attr_icon = "mdi:email"
 
-    @property
-    def friendly_name(self):
-        return "Aula message"
+    def __init__(self, coordinator, client, unique_id):
+        super().__init__(coordinator)
+        self._client = client
+        self._attr_unique_id = unique_id
+        self._refresh()
 
-    @property
-    def is_on(self):
-        if self._state == 1:
-            return True
-        if self._state == 0:
-            return False
-
-    def update(self):
-        if self._client.unread_messages == 1:
+    def _refresh(self):
+        snapshot = self._client.snapshot
+        if snapshot.unread_messages == 1:
             _LOGGER.debug("There are unread message(s)")
-            #_LOGGER.debug("Latest message: "+str(self._client.message))
-            self._subject = self._client.message["subject"]
-            self._text = self._client.message["text"]
-            self._sender = self._client.message["sender"]
-            self._state = 1
+            #_LOGGER.debug("Latest message: "+str(snapshot.message))
+            self._attr_is_on = True
+            message = snapshot.message
+            messages = [dict(message) for message in snapshot.messages]
         else:
             _LOGGER.debug("There are NO unread messages")
-            self._state = 0
-            self._subject = ""
-            self._text = ""
-            self._sender = ""
\ No newline at end of file
+            self._attr_is_on = False
+            message = {}
+            messages = []
+        self._attr_extra_state_attributes = {
+            "subject": message.get("subject", ""),
+            "text": message.get("text", ""),
+            "sender": message.get("sender", ""),
+            "unread_count": snapshot.unread_count,
+            "messages": messages,
+            "friendly_name": "Aula message",
+        }
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        previous = (self.available, self._attr_is_on, self._attr_extra_state_attributes)
+        self._refresh()
+        if (
+            self.available,
+            self._attr_is_on,
+            self._attr_extra_state_attributes,
+        ) != previous:
+            self.async_write_ha_state()
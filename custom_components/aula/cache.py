@@ -0,0 +1,58 @@
+"""In-memory caches used by the Aula client."""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread safe mapping where every entry has its own time to live.
+
+    Entries stored with a ttl of None never expire. When max_entries is set,
+    the entry that was stored first is evicted once the cache is full.
+    Stored values may be None, so use ``key in cache`` to test for presence.
+    """
+
+    def __init__(self, max_entries=None):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key for ttl (a timedelta), or forever if ttl is None."""
+        expires = None if ttl is None else time.monotonic() + ttl.total_seconds()
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            if self._max_entries is not None:
+                while len(self._data) > self._max_entries:
+                    self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
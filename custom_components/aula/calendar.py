@@ -1,18 +1,18 @@
-from datetime import datetime, timedelta
-import logging, time
-from .const import DOMAIN, CONF_SCHOOLSCHEDULE, CONF_TEACHER_FULL_NAME
+from datetime import datetime
+import logging
+from .const import DOMAIN, CONF_SCHOOLSCHEDULE
+from .entity import async_entry_unique_id
 from homeassistant import config_entries, core
 from homeassistant.components.calendar import (
     CalendarEntity,
     CalendarEvent,
 )
-from homeassistant.util import Throttle
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
 
 _LOGGER = logging.getLogger(__name__)
 
-MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=10)
-PARALLEL_UPDATES = 1
-
 
 async def async_setup_entry(
     hass: core.HomeAssistant,
@@ -22,101 +22,57 @@ async def async_setup_entry(
     config = hass.data[DOMAIN][config_entry.entry_id]
     if config_entry.options:
         config.update(config_entry.options)
-    from .client import Client
 
     if not config[CONF_SCHOOLSCHEDULE] == True:
         async_add_entities([])
         return
-    client = hass.data[DOMAIN]["client"]
-    use_full_name = config.get(CONF_TEACHER_FULL_NAME, False)
+    client = config["client"]
     calendar_devices = []
-    calendar = []
-    for i, child in enumerate(client._children):
-        childid = child["id"]
-        name = child["name"]
-        calendar_devices.append(CalendarDevice(hass, calendar, name, childid, use_full_name))
+    for child in client.snapshot.children:
+        unique_id = async_entry_unique_id(
+            hass, "calendar", config_entry, "aulacalendar" + str(child["id"])
+        )
+        calendar_devices.append(
+            CalendarDevice(config["coordinator"], child["name"], child["id"], unique_id)
+        )
     async_add_entities(calendar_devices)
 
 
-class CalendarDevice(CalendarEntity):
-    def __init__(self, hass, calendar, name, childid, use_full_name=False):
-        self.data = CalendarData(hass, calendar, childid, use_full_name)
-        self._cal_data = {}
-        self._name = "Skoleskema " + name
-        self._childid = childid
-
-    @property
-    def event(self):
-        """Return the next upcoming event."""
-        return self.data.event
-
-    @property
-    def name(self):
-        """Return the name of the entity."""
-        return self._name
-
-    @property
-    def unique_id(self):
-        unique_id = "aulacalendar" + str(self._childid)
-        _LOGGER.debug("Unique ID for calendar " + str(self._childid) + " " + unique_id)
-        return unique_id
-
-    def update(self):
-        """Update all Calendars."""
-        self.data.update()
-
-    async def async_get_events(self, hass, start_date, end_date):
-        """Get all events in a specific time frame."""
-        return await self.data.async_get_events(hass, start_date, end_date)
-
+class CalendarDevice(CoordinatorEntity, CalendarEntity):
+    """School schedule of a child, from the lessons indexed at each refresh.
 
-class CalendarData:
-    def __init__(self, hass, calendar, childid, use_full_name=False):
-        self.event = None
+    The state is only written when a refresh changes the current or next
+    lesson; the calendar entity itself updates it when that lesson starts and
+    ends.
+    """
 
-        self._hass = hass
-        self._calendar = calendar
+    def __init__(self, coordinator, name, childid, unique_id):
+        super().__init__(coordinator)
+        self._attr_name = "Skoleskema " + name
+        self._attr_unique_id = unique_id
         self._childid = childid
-        self._use_full_name = use_full_name
+        self._written = (self.available, self.event)
 
-        self.all_events = []
-        self._client = hass.data[DOMAIN]["client"]
+    def _view(self):
+        return (self.coordinator.data or {}).get(self._childid)
 
-    def parseCalendarData(self, i=None):
-        import json
+    @property
+    def event(self):
+        """Return the lesson under way, or else the next one."""
+        view = self._view()
+        return view.next_lesson(dt_util.now()) if view else None
 
-        try:
-            with open("skoleskema.json", "r") as openfile:
-                _data = json.load(openfile)
-            data = json.loads(_data)
-        except:
-            _LOGGER.warn("Could not open and parse file skoleskema.json!")
-            return False
-        events = []
-        _LOGGER.debug("Parsing skoleskema.json...")
-        for c in data["data"]:
-            if c["type"] == "lesson" and c["belongsToProfiles"][0] == self._childid:
-                event = parseCalendarLesson(c, self._use_full_name)
-                events.append(event)
-        return events
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        written = (self.available, self.event)
+        if written != self._written:
+            self._written = written
+            self.async_write_ha_state()
 
     async def async_get_events(self, hass, start_date, end_date):
-        # Run file I/O in executor to avoid blocking the event loop
-        all_events = await hass.async_add_executor_job(self.parseCalendarData)
-        if not all_events:
-            return []
-
-        filtered_events = []
-        for event in all_events:
-            if event.end > start_date and event.start < end_date:
-                filtered_events.append(event)
-
-        return filtered_events
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        _LOGGER.debug("Updating calendars...")
-        self.parseCalendarData(self)
+        """Get all events in a specific time frame."""
+        view = self._view()
+        return view.lessons_between(start_date, end_date) if view else []
 
 
 def parseCalendarLesson(lesson, use_full_name=False):
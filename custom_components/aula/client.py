@@ -1,11 +1,13 @@
 import logging
-import requests
 import datetime
 import pytz
 import asyncio
+import collections
+import concurrent.futures
+import functools
 import threading
 from bs4 import BeautifulSoup
-import json, re
+import json
 from .const import (
     API,
     API_VERSION,
@@ -14,12 +16,33 @@ from .const import (
     SYSTEMATIC_API,
     EASYIQ_API,
     EASYIQ_NEW_API,
+    EASYIQ_LOGIN_TTL,
+    WEEKPLAN_TTL_CURRENT,
+    WEEKPLAN_TTL_FUTURE,
+    SHARED_CHILD_DATA_TTL,
+    DEFAULT_UGEPLAN_WEEKS,
+    DEFAULT_HUSKELISTEN_DAYS,
+    DEFAULT_CONTENT_PAGE_SIZE,
+    HUSKELISTEN_NEAR_DAYS,
+    HUSKELISTEN_FULL_SYNC_INTERVAL,
+    MAX_THREAD_PAGES,
+    MESSAGES_FULL_SYNC_INTERVAL,
     AulaWidgetId,
 )
 from homeassistant.exceptions import ConfigEntryNotReady, ConfigEntryAuthFailed
 from .aula_login_client.client import AulaLoginClient
 from .aula_login_client.exceptions import AulaAuthenticationError
-from dataclasses import dataclass
+from .metrics import RequestMetrics
+from .profiling import StageTimer
+from .transport import Transport
+from .render import (
+    render_easyiq_weekplan,
+    render_huskelisten_reminder,
+    render_meebook_weekplan,
+    render_mu_opgaver,
+    sanitize_html,
+)
+from dataclasses import asdict, dataclass, field, replace
 from typing import NewType
 
 _LOGGER = logging.getLogger(__name__)
@@ -35,23 +58,82 @@ class UgeplanCalendarEvent:
     description: str
 
 
+def thread_version(thread):
+    """Return what identifies the latest message of a thread, or None if unknown."""
+    latest = thread.get("latestMessage") or {}
+    return (
+        latest.get("id")
+        or latest.get("sendDateTime")
+        or thread.get("lastUpdatedDate")
+    )
+
+
+def weekplan_ttl(week_offset):
+    """Return how long weekly-plan content for a week is cached.
+
+    The current week changes now and then, while upcoming weeks are still
+    being written.
+    """
+    if week_offset == 0:
+        return WEEKPLAN_TTL_CURRENT
+    return WEEKPLAN_TTL_FUTURE
+
+
+@dataclass(frozen=True)
+class HuskelistenReminder:
+    due_date: datetime.datetime
+    fingerprint: tuple
+    html: str
+
+
 AulaChildUserId = NewType("AulaChildUserId", str)
 AulaChildFirstName = NewType("AulaChildFirstName", str)
 EasyIqApiLoginId = NewType("EasyIqApiLoginId", str)
 
 
-class Client:
-    huskeliste = {}
-    presence = {}
-    ugep_attr = {}
-    ugep_events: dict[AulaChildFirstName, list[UgeplanCalendarEvent]] = {}
-    ugepnext_attr = {}
-    ugepnext_events: dict[AulaChildFirstName, list[UgeplanCalendarEvent]] = {}
-    mu_opgaver_attr = {}
-    mu_opgaver_next_attr = {}
-    widgets = {}
-    tokens = {}
+@dataclass
+class EasyIqLogin:
+    login_id: EasyIqApiLoginId
+    base_activity: str | None
+    fetched_at: datetime.datetime
+
+
+@dataclass(frozen=True)
+class ClientSnapshot:
+    """The data of a client as of its latest refresh.
+
+    A refresh builds new containers for what it changes and publishes them in
+    a new snapshot, so a published snapshot is never modified. Readers on the
+    event loop take client.snapshot once and always see one whole refresh.
+    """
+
+    children: list = field(default_factory=list)
+    institutions: dict = field(default_factory=dict)
+    presence: dict = field(default_factory=dict)
+    daily_overview: dict = field(default_factory=dict)
+    unread_messages: int = 0
+    # The latest unread message, and those of all unread threads on the first
+    # page of threads, newest first
+    message: dict = field(default_factory=dict)
+    messages: list = field(default_factory=list)
+    unread_count: int = 0
+    # Raw calendar.getEventsByProfileIdsAndResourceIds response
+    schedule: str | None = None
+    huskeliste: dict = field(default_factory=dict)
+    ugep_attr: dict = field(default_factory=dict)
+    ugep_events: dict[AulaChildFirstName, list[UgeplanCalendarEvent]] = field(
+        default_factory=dict
+    )
+    ugepnext_attr: dict = field(default_factory=dict)
+    ugepnext_events: dict[AulaChildFirstName, list[UgeplanCalendarEvent]] = field(
+        default_factory=dict
+    )
+    mu_opgaver_attr: dict = field(default_factory=dict)
+    mu_opgaver_next_attr: dict = field(default_factory=dict)
+    ugep_weeks_attr: dict = field(default_factory=dict)
 
+
+class Client:
     def __init__(
         self,
         mitid_username,
@@ -65,12 +147,18 @@ class Client:
         mitid_identity=1,
         hass=None,
         config_entry=None,
+        ugeplan_weeks=DEFAULT_UGEPLAN_WEEKS,
+        huskelisten_days=DEFAULT_HUSKELISTEN_DAYS,
+        transport=None,
     ):
         self._mitid_username = mitid_username
         self._auth_method = auth_method
         self._mitid_password = mitid_password
         self._mitid_identity = mitid_identity
 
+        # Connection pool, rate limiter and fetch threads, shared between entries
+        self._transport = transport or Transport()
+
         # Store Home Assistant references for token persistence
         self._hass = hass
         self._config_entry = config_entry
@@ -82,6 +170,7 @@ class Client:
             auth_method=auth_method,
             verbose=False,
             debug=False,
+            session=self._transport.new_session(),
         )
 
         # Set up identity selector callback
@@ -104,6 +193,10 @@ class Client:
         self._schoolschedule = schoolschedule
         self._ugeplan = ugeplan
         self._mu_opgaver = mu_opgaver
+        # Number of weeks after the current one to fetch weekly plans for
+        self._ugeplan_weeks = ugeplan_weeks
+        # Number of days ahead to show Huskelisten reminders for
+        self._huskelisten_days = huskelisten_days
 
         # Token storage
         self._tokens = stored_tokens or {}
@@ -111,9 +204,46 @@ class Client:
         # Token refresh lock to prevent concurrent refresh attempts
         self._token_refresh_lock = threading.Lock()
 
+        # Weekly plans and MU opgaver keyed by (widget id, child user id, ISO week),
+        # shared with the other entries, so a child followed by two guardians
+        # is only fetched once
+        self._weekplan_cache = self._transport.weekplan_cache
+        # Child user id by first name, as the providers return plans by name
+        self._user_ids_by_name = {}
+        # How often presence and schedules fetched by another entry were reused
+        self.shared_reuse = collections.Counter()
+        # Marks the shared child data this client fetched, see _shared_child_data
+        self._fetcher = object()
+        # Requests made by this client's refreshes, see metrics.py
+        self.metrics = RequestMetrics()
+        # Seconds per stage of the last refresh, see update_data
+        self.stage_timings = {}
+        self._stages = StageTimer()
+
+        # Huskelisten reminders keyed by (child first name, reminder id)
+        self._reminders: dict[tuple[str, int], HuskelistenReminder] = {}
+        self._huskelisten_names = set()
+        self._huskelisten_synced_at = None
+
+        # Message threads by id, with the latest message they were seen with, in
+        # the order Aula lists them, and the content read per thread
+        self._threads = {}
+        self._thread_order = []
+        self._first_thread_page = []
+        self._thread_contents = {}
+        self._threads_synced_at = None
+
+        # EasyIQ logins per child, see EASYIQ_LOGIN_TTL
+        self._easyiq_logins: dict[AulaChildUserId, EasyIqLogin] = {}
+
+        # Widgets enabled in Aula, and widget tokens with the time they were issued
+        self.widgets = {}
+        self.tokens = {}
+
+        self.snapshot = ClientSnapshot(unread_messages=unread_messages)
+
         # HTTP session
         self._session = None
-        self.unread_messages = unread_messages
 
     def _get_access_token_param(self):
         if self._tokens and "access_token" in self._tokens:
@@ -241,7 +371,7 @@ class Client:
     def _apply_token_to_session(self, access_token):
         """Initialize session for API calls. Token is passed as query parameter, not header."""
         if not self._session:
-            self._session = requests.Session()
+            self._session = self._transport.new_session()
 
         # Don't set Authorization header - Aula API expects token as query parameter
         # Setting both causes 400 Bad Request errors
@@ -471,9 +601,397 @@ class Client:
             # Always release the lock
             self._token_refresh_lock.release()
 
+    def _fetch_concurrently(self, jobs):
+        """Run the given callables on the transport's bounded fetch threads.
+
+        Results are returned in the same order as the jobs. An exception raised
+        by a job is re-raised here, just as if the jobs had been run in sequence.
+        """
+        futures = [self._transport.submit(job) for job in jobs]
+        concurrent.futures.wait(futures)
+        return [future.result() for future in futures]
+
+    def _weeks(self, count):
+        """Return week offset -> ISO week for this week and the following weeks."""
+        today = datetime.datetime.now()
+        return {
+            offset: (today + datetime.timedelta(weeks=offset)).strftime("%G-W%V")
+            for offset in range(count)
+        }
+
+    def _week_key(self, widgetid, name, week):
+        """Return the weekly-plan cache key of a child's content for a week."""
+        return (widgetid, self._user_ids_by_name.get(name, name), week)
+
+    def _stale_weeks(self, widgetid, names, weeks):
+        """Return the week offsets where some child's content must be fetched."""
+        return [
+            offset
+            for offset, week in weeks.items()
+            if any(
+                self._week_key(widgetid, name, week) not in self._weekplan_cache
+                for name in names
+            )
+        ]
+
+    def _store_week(self, widgetid, week_offset, week, result, names):
+        """Cache a provider's content for a week, keyed by (widget, child, week).
+
+        Children in names without content in the result are cached as None, so
+        they are not refetched before the week's TTL runs out. The result must
+        be a successful answer: a failed fetch is not stored at all.
+        """
+        ttl = weekplan_ttl(week_offset)
+        for name in result.keys() | set(names):
+            self._weekplan_cache.set(
+                self._week_key(widgetid, name, week), result.get(name), ttl
+            )
+
+    def _cached_week(self, widgetid, week, names):
+        """Return child first name -> cached content for a provider week."""
+        cached = {}
+        for name in names:
+            value = self._weekplan_cache.get(self._week_key(widgetid, name, week))
+            if value is not None:
+                cached[name] = value
+        return cached
+
+    def _sync_reminders(self, data, first_day, last_day):
+        """Merge a Huskelisten response covering first_day..last_day into the cache.
+
+        Reminders are cached per child and id, and only new or changed ones are
+        rendered. A cached reminder due before last_day that is missing from the
+        response has been deleted, and reminders before first_day have expired.
+        Returns child first name -> HTML for every child seen so far.
+        """
+        local_timezone = (
+            datetime.datetime.now(datetime.timezone.utc).astimezone().tzinfo
+        )
+        seen = set()
+        for person in data:
+            name = person["userName"].split()[0]
+            _LOGGER.debug("Huskelisten for " + name)
+            self._huskelisten_names.add(name)
+            for reminder in person["teamReminders"]:
+                key = (name, reminder["id"])
+                fingerprint = tuple(
+                    reminder.get(field)
+                    for field in ("dueDate", "subjectName", "createdBy", "reminderText")
+                )
+                cached = self._reminders.get(key)
+                if cached is None or cached.fingerprint != fingerprint:
+                    due_date = (
+                        datetime.datetime.strptime(
+                            reminder["dueDate"], "%Y-%m-%dT%H:%M:%SZ"
+                        )
+                        .replace(tzinfo=datetime.timezone.utc)
+                        .astimezone(local_timezone)
+                    )
+                    self._reminders[key] = HuskelistenReminder(
+                        due_date=due_date,
+                        fingerprint=fingerprint,
+                        html=render_huskelisten_reminder(reminder, due_date),
+                    )
+                seen.add(key)
+
+        for key, reminder in list(self._reminders.items()):
+            due_day = reminder.due_date.date()
+            if due_day < first_day or (key not in seen and due_day < last_day):
+                del self._reminders[key]
+
+        reminders = {name: [] for name in self._huskelisten_names}
+        for (name, _), reminder in sorted(
+            self._reminders.items(), key=lambda item: item[1].due_date
+        ):
+            reminders[name].append(reminder.html)
+        result = {}
+        for name, parts in reminders.items():
+            if parts:
+                result[name] = "".join(parts)
+            else:
+                result[name] = str(name) + " har ingen påmindelser."
+        return result
+
+    def get_content(
+        self, kind, child, week, page=0, page_size=DEFAULT_CONTENT_PAGE_SIZE
+    ):
+        """Return a page of cached content of a kind for a child and ISO week.
+
+        Nothing is fetched from Aula, the content is what the last refresh left
+        in the caches. Plans and assignments are one item per source, reminders
+        one item per reminder due in the week, and the unread message is a
+        single item regardless of child and week.
+        """
+        items = []
+        if kind == "ugeplan":
+            for widgetid in ("0029", "0001", "0004", AulaWidgetId.EASYIQ_UGEPLAN):
+                value = self._weekplan_cache.get(self._week_key(widgetid, child, week))
+                if value is None:
+                    continue
+                if widgetid == AulaWidgetId.EASYIQ_UGEPLAN:
+                    html, events = value
+                    items.append(
+                        {
+                            "source": widgetid,
+                            "html": html,
+                            "events": [asdict(event) for event in events],
+                        }
+                    )
+                else:
+                    items.append({"source": widgetid, "html": value})
+        elif kind == "mu_opgaver":
+            value = self._weekplan_cache.get(self._week_key("0030", child, week))
+            if value:
+                items.append({"source": "0030", "html": value})
+        elif kind == "huskelisten":
+            reminders = sorted(
+                (
+                    reminder
+                    for (name, _), reminder in list(self._reminders.items())
+                    if name == child and reminder.due_date.strftime("%G-W%V") == week
+                ),
+                key=lambda reminder: reminder.due_date,
+            )
+            for reminder in reminders:
+                items.append(
+                    {"due_date": reminder.due_date.isoformat(), "html": reminder.html}
+                )
+        elif kind == "message":
+            items.extend(dict(message) for message in self.snapshot.messages)
+        start = page * page_size
+        return {
+            "child": child,
+            "week": week,
+            "kind": kind,
+            "page": page,
+            "page_size": page_size,
+            "total": len(items),
+            "items": items[start : start + page_size],
+        }
+
+    def _sync_threads(self):
+        """Bring the thread index up to date and return the unread thread ids.
+
+        Threads are listed with the latest activity first, so pages are read
+        until a page holds a thread that is indexed with the same latest
+        message, as the threads after it are unchanged. Reading a thread in
+        Aula does not change its latest message though, so pages are also read
+        until every indexed unread thread is listed again, and a thread read
+        elsewhere is shown as read on the next refresh. That is at most
+        MAX_THREAD_PAGES pages, and an unread thread that is no longer listed
+        is only forgotten by the periodic full sync, which reads all pages and
+        forgets threads no longer listed.
+        """
+        now = datetime.datetime.now()
+        full_sync = (
+            self._threads_synced_at is None
+            or now - self._threads_synced_at >= MESSAGES_FULL_SYNC_INTERVAL
+        )
+        unread_indexed = {
+            thread_id
+            for thread_id, thread in self._threads.items()
+            if not thread["read"]
+        }
+        listed = []
+        for page in range(MAX_THREAD_PAGES):
+            mesres = self._session.get(
+                self.apiurl
+                + "?method=messaging.getThreads&sortOn=date&orderDirection=desc&page="
+                + str(page)
+                + self._get_access_token_param(),
+                verify=True,
+            )
+            # _LOGGER.debug("mesres "+str(mesres.text))
+            mesres_json = mesres.json()
+            data = mesres_json.get("data") if mesres_json else None
+            threads = data.get("threads") if data else None
+            if not threads:
+                break
+            if page == 0:
+                self._first_thread_page = [thread["id"] for thread in threads]
+            reached_known = False
+            for thread in threads:
+                version = thread_version(thread)
+                known = self._threads.get(thread["id"])
+                if known and version is not None and known["version"] == version:
+                    reached_known = True
+                self._threads[thread["id"]] = {
+                    "version": version,
+                    "read": thread["read"],
+                }
+                listed.append(thread["id"])
+                unread_indexed.discard(thread["id"])
+            if not data.get("moreMessagesExist") or (
+                reached_known and not full_sync and not unread_indexed
+            ):
+                break
+        _LOGGER.debug("Message threads listed: " + str(len(listed)))
+
+        if full_sync:
+            self._threads = {
+                thread_id: self._threads[thread_id] for thread_id in listed
+            }
+            self._thread_order = listed
+            self._threads_synced_at = now
+        else:
+            listed_ids = set(listed)
+            self._thread_order = listed + [
+                thread_id
+                for thread_id in self._thread_order
+                if thread_id not in listed_ids
+            ]
+        unread = [
+            thread_id
+            for thread_id in self._thread_order
+            if not self._threads[thread_id]["read"]
+        ]
+        self._thread_contents = {
+            thread_id: content
+            for thread_id, content in self._thread_contents.items()
+            if thread_id in unread
+        }
+        return unread
+
+    def _thread_is_cached(self, threadid):
+        version = self._threads[threadid]["version"]
+        cached = self._thread_contents.get(threadid)
+        return bool(cached) and version is not None and cached[0] == version
+
+    def _read_thread(self, threadid):
+        """Return subject, sender and text of the latest message in a thread.
+
+        The content is cached per thread and only fetched again when the
+        thread has a new latest message. Returns None for a thread without an
+        actual message.
+        """
+        version = self._threads[threadid]["version"]
+        if self._thread_is_cached(threadid):
+            return self._thread_contents[threadid][1]
+
+        # _LOGGER.debug("tid "+str(threadid))
+        threadres = self._session.get(
+            self.apiurl
+            + "?method=messaging.getMessagesForThread&threadId="
+            + str(threadid)
+            + "&page=0"
+            + self._get_access_token_param(),
+            verify=True,
+        )
+        # _LOGGER.debug("threadres "+str(threadres.text))
+        threadres_json = threadres.json()
+        message_details = None
+        if threadres_json.get("status", {}).get("code") == 403:
+            message_details = {
+                "thread_id": threadid,
+                "text": "Log ind på Aula med MitID for at læse denne besked.",
+                "sender": "Ukendt afsender",
+                "subject": "Følsom besked",
+            }
+        elif threadres_json.get("data") and threadres_json["data"].get("messages"):
+            for message in threadres_json["data"]["messages"]:
+                if message["messageType"] == "Message":
+                    message_details = {"thread_id": threadid}
+                    try:
+                        message_details["text"] = sanitize_html(
+                            message["text"]["html"]
+                        )
+                    except:
+                        try:
+                            message_details["text"] = message["text"]
+                        except:
+                            message_details["text"] = "intet indhold..."
+                            _LOGGER.warning(
+                                "There is an unread message, but we cannot get the text."
+                            )
+                    try:
+                        message_details["sender"] = message["sender"]["fullName"]
+                    except:
+                        message_details["sender"] = "Ukendt afsender"
+                    try:
+                        message_details["subject"] = threadres_json["data"].get(
+                            "subject", ""
+                        )
+                    except:
+                        message_details["subject"] = ""
+                    break
+        self._thread_contents[threadid] = (version, message_details)
+        return message_details
+
+    def _unread_messages(self):
+        """Return the unread thread ids and the messages of those on the first page.
+
+        Threads with a new latest message are read concurrently on the fetch
+        threads, the others come from the thread cache.
+        """
+        unread_threads = self._sync_threads()
+        first_page = set(self._first_thread_page)
+        shown_threads = [
+            thread_id for thread_id in unread_threads if thread_id in first_page
+        ]
+        stale = [
+            thread_id
+            for thread_id in shown_threads
+            if not self._thread_is_cached(thread_id)
+        ]
+        fetched = dict(
+            zip(
+                stale,
+                self._fetch_concurrently(
+                    [
+                        functools.partial(self._read_thread, thread_id)
+                        for thread_id in stale
+                    ]
+                ),
+            )
+        )
+        messages = []
+        for thread_id in shown_threads:
+            if thread_id in fetched:
+                message_details = fetched[thread_id]
+            else:
+                message_details = self._thread_contents[thread_id][1]
+            if message_details:
+                messages.append(message_details)
+        return unread_threads, messages
+
     ###
 
     def update_data(self):
+        """Refresh the data from Aula and publish it as a new snapshot.
+
+        The refresh collects the snapshot fields it has rebuilt, which replace
+        the published snapshot in one assignment when it ends, also when it
+        returns early or fails half way. How long each stage of the refresh
+        took is kept in stage_timings.
+        """
+        changes = {}
+        self._stages = StageTimer()
+        try:
+            with self.metrics.recording():
+                return self._update_data(changes)
+        finally:
+            if changes:
+                self.snapshot = replace(self.snapshot, **changes)
+            self.stage_timings = self._stages.stages
+
+    def _shared_child_data(self, kind, key):
+        """Return the data another entry fetched under key this interval, or None.
+
+        Data this client fetched itself is never returned, so every entry
+        still refetches its own presence and schedule on each refresh.
+        """
+        entry = self._transport.child_data.get(key)
+        if entry is None or entry[1] is self._fetcher:
+            return None
+        self.shared_reuse[kind] += 1
+        return entry[0]
+
+    def _share_child_data(self, key, value):
+        self._transport.child_data.set(
+            key, (value, self._fetcher), SHARED_CHILD_DATA_TTL
+        )
+
+    def _update_data(self, changes):
         # Ensure valid token before making API calls
         self._ensure_valid_token()
 
@@ -491,6 +1009,7 @@ class Client:
 
         if not is_logged_in:
             self.login()
+        self._stages.mark("login")
 
         self._childnames = {}
         self._institutions = {}
@@ -522,94 +1041,53 @@ class Client:
         _LOGGER.debug("Child ids and names: " + str(self._childnames))
         _LOGGER.debug("Child ids and institution names: " + str(self._institutions))
         _LOGGER.debug("Institution codes: " + str(self._institutionProfiles))
-
-        self._daily_overview = {}
+        changes["children"] = self._children
+        changes["institutions"] = self._institutions
+        self._user_ids_by_name = {
+            name: user_id
+            for user_id, name in self._childrenFirstNamesAndUserIDs.items()
+        }
+
+        presence = {}
+        daily_overview = {}
         for i, child in enumerate(self._children):
-            response = self._session.get(
-                self.apiurl
-                + "?method=presence.getDailyOverview&childIds[]="
-                + str(child["id"])
-                + self._get_access_token_param(),
-                verify=True,
-            ).json()
-            response_data = response.get("data") if response else None
+            # Another entry with the same child may have fetched it this interval
+            response_data = self._shared_child_data(
+                "presence", ("presence", child["id"])
+            )
+            if response_data is None:
+                response = self._session.get(
+                    self.apiurl
+                    + "?method=presence.getDailyOverview&childIds[]="
+                    + str(child["id"])
+                    + self._get_access_token_param(),
+                    verify=True,
+                ).json()
+                response_data = response.get("data") if response else None
+                if response_data:
+                    self._share_child_data(("presence", child["id"]), response_data)
             if response_data and len(response_data) > 0:
-                self.presence[str(child["id"])] = 1
-                self._daily_overview[str(child["id"])] = response_data[0]
+                presence[str(child["id"])] = 1
+                daily_overview[str(child["id"])] = response_data[0]
             else:
                 _LOGGER.debug(
                     "Unable to retrieve presence data from Aula from child with id "
                     + str(child["id"])
                     + ". Some data will be missing from sensor entities."
                 )
-                self.presence[str(child["id"])] = 0
-        _LOGGER.debug("Child ids and presence data status: " + str(self.presence))
+                presence[str(child["id"])] = 0
+        _LOGGER.debug("Child ids and presence data status: " + str(presence))
+        changes["presence"] = presence
+        changes["daily_overview"] = daily_overview
+        self._stages.mark("presence")
 
         # Messages:
-        mesres = self._session.get(
-            self.apiurl
-            + "?method=messaging.getThreads&sortOn=date&orderDirection=desc&page=0"
-            + self._get_access_token_param(),
-            verify=True,
-        )
-        # _LOGGER.debug("mesres "+str(mesres.text))
-        self.unread_messages = 0
-        unread = 0
-        self.message = {}
-        mesres_json = mesres.json()
-        threads = mesres_json.get("data", {}).get("threads") if mesres_json else None
-        for mes in threads or []:
-            if not mes["read"]:
-                # self.unread_messages = 1
-#                print("unread mes "+str(mes))
-                unread = 1
-                threadid = mes["id"]
-                break
-        # if self.unread_messages == 1:
-        if unread == 1:
-            # _LOGGER.debug("tid "+str(threadid))
-            threadres = self._session.get(
-                self.apiurl
-                + "?method=messaging.getMessagesForThread&threadId="
-                + str(threadid)
-                + "&page=0"
-                + self._get_access_token_param(),
-                verify=True,
-            )
-            # _LOGGER.debug("threadres "+str(threadres.text))
-            threadres_json = threadres.json()
-            if threadres_json.get("status", {}).get("code") == 403:
-                self.message["text"] = (
-                    "Log ind på Aula med MitID for at læse denne besked."
-                )
-                self.message["sender"] = "Ukendt afsender"
-                self.message["subject"] = "Følsom besked"
-                self.unread_messages = 1
-            elif threadres_json.get("data") and threadres_json["data"].get("messages"):
-                for message in threadres_json["data"]["messages"]:
-                    if message["messageType"] == "Message":
-                        try:
-                            self.message["text"] = message["text"]["html"]
-                        except:
-                            try:
-                                self.message["text"] = message["text"]
-                            except:
-                                self.message["text"] = "intet indhold..."
-                                _LOGGER.warning(
-                                    "There is an unread message, but we cannot get the text."
-                                )
-                        try:
-                            self.message["sender"] = message["sender"]["fullName"]
-                        except:
-                            self.message["sender"] = "Ukendt afsender"
-                        try:
-                            self.message["subject"] = threadres_json["data"].get(
-                                "subject", ""
-                            )
-                        except:
-                            self.message["subject"] = ""
-                        self.unread_messages = 1
-                        break
+        unread_threads, messages = self._unread_messages()
+        changes["unread_count"] = len(unread_threads)
+        changes["messages"] = messages
+        changes["unread_messages"] = 1 if messages else 0
+        changes["message"] = messages[0] if messages else {}
+        self._stages.mark("messages")
 
         # Calendar:
         if self._schoolschedule is True:
@@ -634,25 +1112,35 @@ class Client:
                 + end
                 + '"}'
             )
-            _LOGGER.debug("Fetching calendars...")
-            # _LOGGER.debug("Calendar post-data: "+str(post_data))
-            res = self._session.post(
-                self.apiurl
-                + "?method=calendar.getEventsByProfileIdsAndResourceIds"
-                + self._get_access_token_param(),
-                data=post_data,
-                headers=headers,
-                verify=True,
-            )
-            try:
-                with open("skoleskema.json", "w") as skoleskema_json:
-                    json.dump(res.text, skoleskema_json)
-            except:
-                _LOGGER.warning(
-                    "Got the following reply when trying to fetch calendars: "
-                    + str(res.text)
+            # Guardians of the same children fetch the same schedule
+            schedule_key = ("schedule", tuple(sorted(self._childids)), start)
+            schedule = self._shared_child_data("schedule", schedule_key)
+            if schedule is not None:
+                changes["schedule"] = schedule
+            else:
+                _LOGGER.debug("Fetching calendars...")
+                # _LOGGER.debug("Calendar post-data: "+str(post_data))
+                res = self._session.post(
+                    self.apiurl
+                    + "?method=calendar.getEventsByProfileIdsAndResourceIds"
+                    + self._get_access_token_param(),
+                    data=post_data,
+                    headers=headers,
+                    verify=True,
                 )
+                # Kept in the snapshot rather than a shared file, so every account
+                # has its own schedule
+                try:
+                    res.json()["data"]
+                    changes["schedule"] = res.text
+                    self._share_child_data(schedule_key, res.text)
+                except:
+                    _LOGGER.warning(
+                        "Got the following reply when trying to fetch calendars: "
+                        + str(res.text)
+                    )
         # End of calendar
+        self._stages.mark("calendar")
         # MU Opgaver:
         if self._mu_opgaver is True:
             try:
@@ -676,62 +1164,66 @@ class Client:
                     "You have enabled Min Uddannelse Opgaver, but we cannot find any supported widgets (0030) in Aula."
                 )
 
-            def mu_opgaver(week, thisnext):
-                if "0030" in self.widgets:
-                    _LOGGER.debug("In the MU Opgaver flow")
+            def mu_opgaver(token, week):
+                get_payload = (
+                    "/opgaveliste?assuranceLevel=2&childFilter="
+                    + childUserIds
+                    + "&currentWeekNumber="
+                    + week
+                    + "&isMobileApp=false&placement=narrow&sessionUUID="
+                    + guardian
+                    + "&userProfile=guardian"
+                )
+                mu_opgaver = self._transport.get(
+                    MIN_UDDANNELSE_API + get_payload,
+                    headers={"Authorization": token, "accept": "application/json"},
+                    verify=True,
+                )
+                _LOGGER.debug("MU Opgaver status_code " + str(mu_opgaver.status_code))
+                _LOGGER.debug(
+                    "MU Opgaver response of " + str(len(mu_opgaver.content)) + " bytes"
+                )
+                mu_opgaver_json = mu_opgaver.json()
+                opgaver_list = mu_opgaver_json.get("opgaver", []) if mu_opgaver_json else []
+                result = {}
+                for full_name in self._childnames.items():
+                    name_parts = full_name[1].split()
+                    first_name = name_parts[0]
+                    opgaver = [
+                        i
+                        for i in opgaver_list
+                        if i["kuvertnavn"].split()[0] == first_name
+                    ]
+                    result[first_name] = render_mu_opgaver(opgaver)
+                    _LOGGER.debug("MU Opgaver result: " + str(result[first_name]))
+                return result
+
+            if "0030" in self.widgets:
+                _LOGGER.debug("In the MU Opgaver flow")
+                names = list(self._childrenFirstNamesAndUserIDs.values())
+                weeks = self._weeks(2)
+                stale = self._stale_weeks("0030", names, weeks)
+                if stale:
+                    # One widget token serves both weeks, which are fetched concurrently
                     token = self.get_token("0030")
-                    get_payload = (
-                        "/opgaveliste?assuranceLevel=2&childFilter="
-                        + childUserIds
-                        + "&currentWeekNumber="
-                        + week
-                        + "&isMobileApp=false&placement=narrow&sessionUUID="
-                        + guardian
-                        + "&userProfile=guardian"
-                    )
-                    mu_opgaver = requests.get(
-                        MIN_UDDANNELSE_API + get_payload,
-                        headers={"Authorization": token, "accept": "application/json"},
-                        verify=True,
-                    )
-                    _LOGGER.debug(
-                        "MU Opgaver status_code " + str(mu_opgaver.status_code)
+                    results = self._fetch_concurrently(
+                        [
+                            functools.partial(mu_opgaver, token, weeks[offset])
+                            for offset in stale
+                        ]
                     )
-                    _LOGGER.debug("MU Opgaver response " + str(mu_opgaver.text))
-                    mu_opgaver_json = mu_opgaver.json()
-                    opgaver_list = mu_opgaver_json.get("opgaver", []) if mu_opgaver_json else []
-                    for full_name in self._childnames.items():
-                        name_parts = full_name[1].split()
-                        first_name = name_parts[0]
-                        _ugep = ""
-                        for i in opgaver_list:
-                            _LOGGER.debug(
-                                "i kuvertnavn split " + str(i["kuvertnavn"].split()[0])
-                            )
-                            _LOGGER.debug("first_name " + first_name)
-                            if i["kuvertnavn"].split()[0] == first_name:
-                                _ugep = _ugep + "<h2>" + i["title"] + "</h2>"
-                                _ugep = _ugep + "<h3>" + i["kuvertnavn"] + "</h3>"
-                                _ugep = _ugep + "Ugedag: " + i["ugedag"] + "<br>"
-                                _ugep = _ugep + "Type: " + i["opgaveType"] + "<br>"
-                                for h in i["hold"]:
-                                    _ugep = _ugep + "Hold: " + h["navn"] + "<br>"
-                                try:
-                                    _ugep = _ugep + "Forløb: " + i["forloeb"]["navn"]
-                                except:
-                                    _LOGGER.debug("Did not find forloeb key: " + str(i))
-                        if thisnext == "this":
-                            self.mu_opgaver_attr[first_name] = _ugep
-                        elif thisnext == "next":
-                            self.mu_opgaver_next_attr[first_name] = _ugep
-                        _LOGGER.debug("MU Opgaver result: " + str(_ugep))
-
-            now = datetime.datetime.now() + datetime.timedelta(weeks=1)
-            thisweek = datetime.datetime.now().strftime("%Y-W%V")
-            nextweek = now.strftime("%Y-W%V")
-            mu_opgaver(thisweek, "this")
-            mu_opgaver(nextweek, "next")
+                    for offset, result in zip(stale, results):
+                        self._store_week("0030", offset, weeks[offset], result, names)
+                changes["mu_opgaver_attr"] = {
+                    **self.snapshot.mu_opgaver_attr,
+                    **self._cached_week("0030", weeks[0], names),
+                }
+                changes["mu_opgaver_next_attr"] = {
+                    **self.snapshot.mu_opgaver_next_attr,
+                    **self._cached_week("0030", weeks[1], names),
+                }
         # End of MU Opgaver
+        self._stages.mark("mu_opgaver")
 
         # Ugeplaner:
         if self._ugeplan is True:
@@ -765,531 +1257,520 @@ class Client:
                     "Multiple sources for ugeplaner is untested and might cause problems."
                 )
 
-            def ugeplan(week, thisnext):
-                if "0029" in self.widgets:
-                    token = self.get_token("0029")
-                    get_payload = (
-                        "/ugebrev?assuranceLevel=2&childFilter="
-                        + childUserIds
-                        + "&currentWeekNumber="
-                        + week
-                        + "&isMobileApp=false&placement=narrow&sessionUUID="
-                        + guardian
-                        + "&userProfile=guardian"
+            def min_uddannelse_ugeplan(token, week):
+                get_payload = (
+                    "/ugebrev?assuranceLevel=2&childFilter="
+                    + childUserIds
+                    + "&currentWeekNumber="
+                    + week
+                    + "&isMobileApp=false&placement=narrow&sessionUUID="
+                    + guardian
+                    + "&userProfile=guardian"
+                )
+                ugeplaner = self._transport.get(
+                    MIN_UDDANNELSE_API + get_payload,
+                    headers={"Authorization": token, "accept": "application/json"},
+                    verify=True,
+                )
+                # _LOGGER.debug("ugeplaner status_code "+str(ugeplaner.status_code))
+                # _LOGGER.debug("ugeplaner response "+str(ugeplaner.text))
+                try:
+                    if ugeplaner.status_code != 200:
+                        raise ValueError("status " + str(ugeplaner.status_code))
+                    personer = ugeplaner.json()["personer"]
+                except (ValueError, KeyError, TypeError) as e:
+                    # Failed, rather than without plans, so nothing is cached
+                    _LOGGER.debug(f"Cannot fetch ugeplaner: {e}")
+                    _LOGGER.debug("ugeplaner response " + str(ugeplaner.text))
+                    return None
+                result = {}
+                for person in personer:
+                    try:
+                        ugeplan = person["institutioner"][0]["ugebreve"][0]["indhold"]
+                    except (KeyError, IndexError):
+                        _LOGGER.debug("No ugeplan for " + str(person.get("navn")))
+                        continue
+                    result[person["navn"].split()[0]] = sanitize_html(ugeplan)
+                return result
+
+            def easyiq_ugeplan(token, week):
+                _LOGGER.debug("In the EasyIQ flow")
+                csrf_token = self._get_csrf_token()
+
+                easyiq_headers = {
+                    "x-aula-institutionfilter": str(self._institutionProfiles[0]),
+                    "x-aula-userprofile": "guardian",
+                    "Authorization": token,
+                    "accept": "application/json",
+                    "origin": "https://www.aula.dk",
+                    "referer": "https://www.aula.dk/",
+                    "authority": "api.easyiqcloud.dk",
+                }
+                if csrf_token:
+                    easyiq_headers["csrfp-token"] = csrf_token
+
+                result = {}
+                for child in self._childrenFirstNamesAndUserIDs.items():
+                    userid = child[0]
+                    first_name = child[1]
+
+                    _LOGGER.debug("EasyIQ headers " + str(easyiq_headers))
+                    post_data = {
+                        "sessionId": guardian,
+                        "currentWeekNr": week,
+                        "userProfile": "guardian",
+                        "institutionFilter": self._institutionProfiles,
+                        "childFilter": [userid],
+                    }
+                    _LOGGER.debug("EasyIQ post data " + str(post_data))
+                    ugeplaner = self._transport.post(
+                        EASYIQ_API + "/weekplaninfo",
+                        json=post_data,
+                        headers=easyiq_headers,
+                        verify=True,
+                    )
+                    # _LOGGER.debug(
+                    #    "EasyIQ Opgaver status_code " + str(ugeplaner.status_code)
+                    # )
+                    ugeplaner_json = ugeplaner.json()
+                    _LOGGER.debug("EasyIQ Opgaver response " + str(ugeplaner_json))
+                    _ugep = render_easyiq_weekplan(
+                        week, ugeplaner_json.get("Events", [])
                     )
-                    ugeplaner = requests.get(
-                        MIN_UDDANNELSE_API + get_payload,
-                        headers={"Authorization": token, "accept": "application/json"},
+
+                    result[first_name] = _ugep
+                    _LOGGER.debug("EasyIQ result: " + str(_ugep))
+                return result
+
+            def huskelisten(token):
+                huskelisten_headers = {
+                    "Accept": "application/json, text/plain, */*",
+                    "Accept-Encoding": "gzip, deflate, br",
+                    "Accept-Language": "en-US,en;q=0.9,da;q=0.8",
+                    "Aula-Authorization": token,
+                    "Origin": "https://www.aula.dk",
+                    "Referer": "https://www.aula.dk/",
+                    "Sec-Fetch-Dest": "empty",
+                    "Sec-Fetch-Mode": "cors",
+                    "Sec-Fetch-Site": "cross-site",
+                    "User-Agent": "Mozilla/5.0 (X11; CrOS x86_64 15183.51.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
+                    "zone": "Europe/Copenhagen",
+                }
+
+                # Reminders due soon are synced on every refresh, the rest of the
+                # configured window only on the periodic full sync
+                now = datetime.datetime.now()
+                full_sync = (
+                    self._huskelisten_synced_at is None
+                    or now - self._huskelisten_synced_at
+                    >= HUSKELISTEN_FULL_SYNC_INTERVAL
+                )
+                if full_sync:
+                    days = self._huskelisten_days
+                else:
+                    days = min(self._huskelisten_days, HUSKELISTEN_NEAR_DAYS)
+                children = "&children=".join(self._childuserids)
+                institutions = "&institutions=".join(self._institutionProfiles)
+                timedelta = now + datetime.timedelta(days=days)
+                From = now.strftime("%Y-%m-%d")
+                dueNoLaterThan = timedelta.strftime("%Y-%m-%d")
+                get_payload = (
+                    "/reminders/v1?children="
+                    + children
+                    + "&from="
+                    + From
+                    + "&dueNoLaterThan="
+                    + dueNoLaterThan
+                    + "&widgetVersion=1.10&userProfile=guardian&sessionId="
+                    + self._mitid_username
+                    + "&institutions="
+                    + institutions
+                )
+                _LOGGER.debug("Huskelisten get_payload: " + SYSTEMATIC_API + get_payload)
+                #
+                mock_huskelisten = 0
+                #
+                if mock_huskelisten == 1:
+                    _LOGGER.warning("Using mock data for Huskelisten.")
+                    mock_huskelisten = '[{"userName":"Emilie efternavn","userId":164625,"courseReminders":[],"assignmentReminders":[],"teamReminders":[{"id":76169,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-11-29T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Onsdagslektie: Matematikfessor.dk: Sænk skibet med plus.","createdBy":"Peter ","lastEditBy":"Peter ","subjectName":"Matematik"},{"id":76598,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-06T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter ","lastEditBy":"Peter Riis","subjectName":"Matematik"},{"id":76599,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-13T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter ","lastEditBy":"Peter ","subjectName":"Matematik"},{"id":76600,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-20T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter Riis","lastEditBy":"Peter Riis","subjectName":"Matematik"}]},{"userName":"Karla","userId":77882,"courseReminders":[],"assignmentReminders":[{"id":0,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-08T11:00:00Z","courseId":297469,"teamNames":["5A","5B"],"teamIds":[65271,65258],"courseSubjects":[],"assignmentId":5027904,"assignmentText":"Skriv en novelle"}],"teamReminders":[{"id":76367,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-11-30T23:00:00Z","teamId":65258,"teamName":"5A","reminderText":"Læse resten af kap.1 fra Ternet Ninja ( kopiark) Læs det hele højt eller vælg et afsnit. ","createdBy":"Christina ","lastEditBy":"Christina ","subjectName":"Dansk"}]},{"userName":"Vega  ","userId":206597,"courseReminders":[],"assignmentReminders":[],"teamReminders":[]}]'
+                    data = json.loads(mock_huskelisten, strict=False)
+                else:
+                    response = self._transport.get(
+                        SYSTEMATIC_API + get_payload,
+                        headers=huskelisten_headers,
                         verify=True,
                     )
-                    # _LOGGER.debug("ugeplaner status_code "+str(ugeplaner.status_code))
-                    # _LOGGER.debug("ugeplaner response "+str(ugeplaner.text))
                     try:
-                        for person in ugeplaner.json()["personer"]:
-                            ugeplan = person["institutioner"][0]["ugebreve"][0][
-                                "indhold"
-                            ]
-                            if thisnext == "this":
-                                self.ugep_attr[person["navn"].split()[0]] = ugeplan
-                            elif thisnext == "next":
-                                self.ugepnext_attr[person["navn"].split()[0]] = ugeplan
+                        data = json.loads(response.text, strict=False)
                     except:
-                        _LOGGER.debug("Cannot fetch ugeplaner, so setting as empty")
-                        _LOGGER.debug("ugeplaner response " + str(ugeplaner.text))
-                if "0001" in self.widgets:
-                    import calendar
-
-                    _LOGGER.debug("In the EasyIQ flow")
-                    token = self.get_token("0001")
-                    csrf_token = self._get_csrf_token()
-
-                    easyiq_headers = {
-                        "x-aula-institutionfilter": str(self._institutionProfiles[0]),
-                        "x-aula-userprofile": "guardian",
-                        "Authorization": token,
-                        "accept": "application/json",
-                        "origin": "https://www.aula.dk",
-                        "referer": "https://www.aula.dk/",
-                        "authority": "api.easyiqcloud.dk",
-                    }
-                    if csrf_token:
-                        easyiq_headers["csrfp-token"] = csrf_token
-
-                    for child in self._childrenFirstNamesAndUserIDs.items():
-                        userid = child[0]
-                        first_name = child[1]
-
-                        _LOGGER.debug("EasyIQ headers " + str(easyiq_headers))
-                        post_data = {
-                            "sessionId": guardian,
-                            "currentWeekNr": week,
-                            "userProfile": "guardian",
-                            "institutionFilter": self._institutionProfiles,
-                            "childFilter": [userid],
-                        }
-                        _LOGGER.debug("EasyIQ post data " + str(post_data))
-                        ugeplaner = requests.post(
-                            EASYIQ_API + "/weekplaninfo",
-                            json=post_data,
-                            headers=easyiq_headers,
-                            verify=True,
+                        _LOGGER.error(
+                            "Could not parse the response from Huskelisten as json."
                         )
-                        # _LOGGER.debug(
-                        #    "EasyIQ Opgaver status_code " + str(ugeplaner.status_code)
-                        # )
-                        _LOGGER.debug(
-                            "EasyIQ Opgaver response " + str(ugeplaner.json())
-                        )
-                        _ugep = (
-                            "<h2>"
-                            # + ugeplaner.json()["Weekplan"]["ActivityName"]
-                            + " Uge "
-                            + week.split("-W")[1]
-                            # + ugeplaner.json()["Weekplan"]["WeekNo"]
-                            + "</h2>"
-                        )
-                        # from datetime import datetime
-
-                        def findDay(date):
-                            day, month, year = (int(i) for i in date.split(" "))
-                            dayNumber = calendar.weekday(year, month, day)
-                            days = [
-                                "Mandag",
-                                "Tirsdag",
-                                "Onsdag",
-                                "Torsdag",
-                                "Fredag",
-                                "Lørdag",
-                                "Søndag",
-                            ]
-                            return days[dayNumber]
-
-                        def is_correct_format(date_string, format):
-                            try:
-                                datetime.datetime.strptime(date_string, format)
-                                return True
-                            except ValueError:
-                                _LOGGER.debug(
-                                    "Could not parse timestamp: " + str(date_string)
-                                )
-                                return False
-
-                        try:
-                            for i in ugeplaner.json()["Events"]:
-                                if is_correct_format(i["start"], "%Y/%m/%d %H:%M"):
-                                    _LOGGER.debug("No Event")
-                                    start_datetime = datetime.datetime.strptime(
-                                        i["start"], "%Y/%m/%d %H:%M"
-                                    )
-                                    _LOGGER.debug(start_datetime)
-                                    end_datetime = datetime.datetime.strptime(
-                                        i["end"], "%Y/%m/%d %H:%M"
-                                    )
-                                    if start_datetime.date() == end_datetime.date():
-                                        formatted_day = findDay(
-                                            start_datetime.strftime("%d %m %Y")
-                                        )
-                                        formatted_start = start_datetime.strftime(
-                                            " %H:%M"
-                                        )
-                                        formatted_end = end_datetime.strftime("- %H:%M")
-                                        dresult = f"{formatted_day} {formatted_start} {formatted_end}"
-                                    else:
-                                        formatted_start = findDay(
-                                            start_datetime.strftime("%d %m %Y")
-                                        )
-                                        formatted_end = findDay(
-                                            end_datetime.strftime("%d %m %Y")
-                                        )
-                                        dresult = f"{formatted_start} {formatted_end}"
-                                    _ugep = _ugep + "<br><b>" + dresult + "</b><br>"
-                                    if i["itemType"] == "5":
-                                        _ugep = (
-                                            _ugep
-                                            + "<br><b>"
-                                            + str(i["title"])
-                                            + "</b><br>"
-                                        )
-                                    else:
-                                        _ugep = (
-                                            _ugep
-                                            + "<br><b>"
-                                            + str(i["ownername"])
-                                            + "</b><br>"
-                                        )
-                                    _ugep = _ugep + str(i["description"]) + "<br>"
-                                else:
-                                    _LOGGER.debug("None")
-                        except KeyError:
-                            _LOGGER.debug("None")
-
-                        if thisnext == "this":
-                            self.ugep_attr[first_name] = _ugep
-                        elif thisnext == "next":
-                            self.ugepnext_attr[first_name] = _ugep
-                        _LOGGER.debug("EasyIQ result: " + str(_ugep))
-
-                if "0062" in self.widgets:
-                    _LOGGER.debug("In the Huskelisten flow...")
-                    token = self.get_token("0062", False)
-                    huskelisten_headers = {
-                        "Accept": "application/json, text/plain, */*",
-                        "Accept-Encoding": "gzip, deflate, br",
-                        "Accept-Language": "en-US,en;q=0.9,da;q=0.8",
-                        "Aula-Authorization": token,
-                        "Origin": "https://www.aula.dk",
-                        "Referer": "https://www.aula.dk/",
-                        "Sec-Fetch-Dest": "empty",
-                        "Sec-Fetch-Mode": "cors",
-                        "Sec-Fetch-Site": "cross-site",
-                        "User-Agent": "Mozilla/5.0 (X11; CrOS x86_64 15183.51.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
-                        "zone": "Europe/Copenhagen",
-                    }
+                        return {}
+                    # _LOGGER.debug("Huskelisten raw response: "+str(response.text))
+
+                if full_sync:
+                    self._huskelisten_synced_at = now
+                return self._sync_reminders(data, now.date(), timedelta.date())
+
+            def meebook_ugeplan(token, week):
+                # _LOGGER.debug("Token "+token)
+                headers = {
+                    "authority": "app.meebook.com",
+                    "accept": "application/json",
+                    "authorization": token,
+                    "dnt": "1",
+                    "origin": "https://www.aula.dk",
+                    "referer": "https://www.aula.dk/",
+                    "sessionuuid": self._mitid_username,
+                    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
+                    "x-version": "1.0",
+                }
+                childFilter = "&childFilter[]=".join(self._childuserids)
+                institutionFilter = "&institutionFilter[]=".join(
+                    self._institutionProfiles
+                )
+                get_payload = (
+                    "/relatedweekplan/all?currentWeekNumber="
+                    + week
+                    + "&userProfile=guardian&childFilter[]="
+                    + childFilter
+                    + "&institutionFilter[]="
+                    + institutionFilter
+                )
 
-                    children = "&children=".join(self._childuserids)
-                    institutions = "&institutions=".join(self._institutionProfiles)
-                    timedelta = datetime.datetime.now() + datetime.timedelta(days=7)
-                    From = datetime.datetime.now().strftime("%Y-%m-%d")
-                    dueNoLaterThan = timedelta.strftime("%Y-%m-%d")
-                    get_payload = (
-                        "/reminders/v1?children="
-                        + children
-                        + "&from="
-                        + From
-                        + "&dueNoLaterThan="
-                        + dueNoLaterThan
-                        + "&widgetVersion=1.10&userProfile=guardian&sessionId="
-                        + self._mitid_username
-                        + "&institutions="
-                        + institutions
-                    )
-                    _LOGGER.debug(
-                        "Huskelisten get_payload: " + SYSTEMATIC_API + get_payload
-                    )
-                    #
-                    mock_huskelisten = 0
-                    #
-                    if mock_huskelisten == 1:
-                        _LOGGER.warning("Using mock data for Huskelisten.")
-                        mock_huskelisten = '[{"userName":"Emilie efternavn","userId":164625,"courseReminders":[],"assignmentReminders":[],"teamReminders":[{"id":76169,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-11-29T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Onsdagslektie: Matematikfessor.dk: Sænk skibet med plus.","createdBy":"Peter ","lastEditBy":"Peter ","subjectName":"Matematik"},{"id":76598,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-06T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter ","lastEditBy":"Peter Riis","subjectName":"Matematik"},{"id":76599,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-13T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter ","lastEditBy":"Peter ","subjectName":"Matematik"},{"id":76600,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-20T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter Riis","lastEditBy":"Peter Riis","subjectName":"Matematik"}]},{"userName":"Karla","userId":77882,"courseReminders":[],"assignmentReminders":[{"id":0,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-08T11:00:00Z","courseId":297469,"teamNames":["5A","5B"],"teamIds":[65271,65258],"courseSubjects":[],"assignmentId":5027904,"assignmentText":"Skriv en novelle"}],"teamReminders":[{"id":76367,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-11-30T23:00:00Z","teamId":65258,"teamName":"5A","reminderText":"Læse resten af kap.1 fra Ternet Ninja ( kopiark) Læs det hele højt eller vælg et afsnit. ","createdBy":"Christina ","lastEditBy":"Christina ","subjectName":"Dansk"}]},{"userName":"Vega  ","userId":206597,"courseReminders":[],"assignmentReminders":[],"teamReminders":[]}]'
-                        data = json.loads(mock_huskelisten, strict=False)
-                    else:
-                        response = requests.get(
-                            SYSTEMATIC_API + get_payload,
-                            headers=huskelisten_headers,
-                            verify=True,
-                        )
-                        try:
-                            data = json.loads(response.text, strict=False)
-                        except:
-                            _LOGGER.error(
-                                "Could not parse the response from Huskelisten as json."
-                            )
-                        # _LOGGER.debug("Huskelisten raw response: "+str(response.text))
-
-                    for person in data:
-                        name = person["userName"].split()[0]
-                        _LOGGER.debug("Huskelisten for " + name)
-                        huskel = ""
-                        reminders = person["teamReminders"]
-                        if len(reminders) > 0:
-                            for reminder in reminders:
-                                local_timezone = (
-                                    datetime.datetime.now(datetime.timezone.utc)
-                                    .astimezone()
-                                    .tzinfo
-                                )
-                                due_date = datetime.datetime.strptime(
-                                    reminder["dueDate"], "%Y-%m-%dT%H:%M:%SZ"
-                                )
-                                local_due_date = (
-                                    due_date.replace(tzinfo=datetime.timezone.utc)
-                                    .astimezone(local_timezone)
-                                    .strftime("%A %d. %B")
-                                )
-                                huskel = huskel + "<h3>" + local_due_date + "</h3>"
-                                subjectName = (
-                                    reminder["subjectName"]
-                                    if "subjectName" in reminder
-                                    else ""
-                                )
-                                huskel = huskel + "<b>" + subjectName + "</b><br>"
-                                huskel = (
-                                    huskel + "af " + reminder["createdBy"] + "<br><br>"
-                                )
-                                content = re.sub(
-                                    r"([0-9]+)(\.)", r"\1\.", reminder["reminderText"]
-                                )
-                                huskel = huskel + content + "<br><br>"
-                        else:
-                            huskel = huskel + str(name) + " har ingen påmindelser."
-                        self.huskeliste[name] = huskel
-
-                # End Huskelisten
-                if "0004" in self.widgets:
-                    # Try Meebook:
-                    _LOGGER.debug("In the Meebook flow...")
-                    token = self.get_token("0004")
-                    # _LOGGER.debug("Token "+token)
-                    headers = {
-                        "authority": "app.meebook.com",
-                        "accept": "application/json",
-                        "authorization": token,
-                        "dnt": "1",
-                        "origin": "https://www.aula.dk",
-                        "referer": "https://www.aula.dk/",
-                        "sessionuuid": self._mitid_username,
-                        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
-                        "x-version": "1.0",
-                    }
-                    childFilter = "&childFilter[]=".join(self._childuserids)
-                    institutionFilter = "&institutionFilter[]=".join(
-                        self._institutionProfiles
-                    )
-                    get_payload = (
-                        "/relatedweekplan/all?currentWeekNumber="
-                        + week
-                        + "&userProfile=guardian&childFilter[]="
-                        + childFilter
-                        + "&institutionFilter[]="
-                        + institutionFilter
+                mock_meebook = 0
+                if mock_meebook == 1:
+                    _LOGGER.warning("Using mock data for Meebook ugeplaner.")
+                    mock_meebook = '[{"id":490000,"name":"Emilie efternavn","unilogin":"lud...","weekPlan":[{"date":"mandag 28. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"I denne uge er der omlagt uge p\u00e5 hele skolen.\n\nMandag har vi \nKlippeklistredag:\n\nMan m\u00e5 gerne have nissehuer p\u00e5 :)\n\nMedbring gerne en god saks, limstift, skabeloner mm. \n\nB\u00f8rnene skal ogs\u00e5 medbringe et vasket syltet\u00f8jsglas eller lign., som vi skal male p\u00e5. S\u00f8rg gerne for at der ikke er m\u00e6rker p\u00e5:-)\n\n1. lektion: Morgenb\u00e5nd med l\u00e6sning/opgaver\n\n2. lektion: \nVi laver f\u00e6lles julenisser efter en bestemt skabelon.\n\n3. - 5. lektion: \nVi julehygger med musik og kreative projekter. Vi pynter vores f\u00e6lles juletr\u00e6, og synger julesange. \n\n6. lektion:\nAfslutning og oprydning.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"tirsdag 29. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver.\n\n2. lektion\nVi starter p\u00e5 storylineforl\u00f8b om jul. Vi taler om nisser og danner nissefamilier i klassen.\n\n3.-5. lektion\nVi lave et juleprojekt med filt...\n\n6. lektion\nVi arbejder med en kreativ opgave om v\u00e5benskold.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"onsdag 30. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. -2. lektion\nVi skal til foredrag med SOS B\u00f8rnebyerne om omvendt julekalender.\n\n3-4. lektion\nVi skriver nissehistorier om nissefamilierne.\n\n5.-6. lektion\nVi laver jule-postel\u00f8b, hvor posterne skal l\u00e6ses med en kodel\u00e6ser.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"torsdag 1. dec.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver. \nVi arbejder med l\u00e6s og forst\u00e5 i en julehistorie.\n\n2.-5. lektion\nVi skal arbejde med et kreativt juleprojekt, hvor der laves huse til nisserne.\n\n6. lektion\nSe SOS b\u00f8rnebyernes julekalender og afrunding af dagen.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"fredag 2. dec.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver samt julehygge, hvor vi l\u00e6ser julehistorie \n\n2. lektion:\nVi skal lave et julerim og skrive det ind p\u00e5 en flot julenisse samt tegne nissen. \n\n3.-4. lektion\nVi skal lave jule-postel\u00f8b p\u00e5 skolen. \n\n5.. lektion\nVi skal l\u00f8se et hemmeligt kodebrev ved hj\u00e6lp af en kodel\u00e6ser. \n\nVi evaluerer og afrunder ugen.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]}]},{"id":630000,"name":"Ann...","unilogin":"ann...","weekPlan":[{"date":"mandag 28. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi h\u00f8re om jul i Norge og lave Norsk julepynt.\nEfter 12 pausen skal vi h\u00f8re om julen i Danmark f\u00f8r juletr\u00e6et og andestegen.\nVi skal farvel\u00e6gge g\u00e5rdnisserne der passede p\u00e5 g\u00e5rdene i gamle dage.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"tirsdag 29. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi arbejde med julen i Gr\u00f8nland og lave gr\u00f8nlandske julehuse.\nEfter 12 pausen skal vi h\u00f8re om JUletr\u00e6et der flytter ind i de danske stuer. Vi skal tale om hvor det stammer fra og hvad der var p\u00e5 juletr\u00e6et i gamle dage . Blandt andet den spiselige pynt.\nVi taler om Peters jul og at der ikke altid har v\u00e6ret en stjerne i toppen. Vi klipper storke til juletr\u00e6stoppen","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"onsdag 30. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag st\u00e5r den p\u00e5 Jul i Finland og finske juletraditioner. Vi klipper finske julestjerner.\nEfter pausen skal vi arbejde videre med jul og julepynt gennem tiden i dk. \nVi skal tale om hvorfor der er flag, trompeter og trommer p\u00e5 tr\u00e6et (krigen i 1864) og vi skal lave gammeldags silkeroser og musetrapper til tr\u00e6et","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"torsdag 1. dec.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi p\u00e5 en juletur med hygge og posl\u00f8b til trylleskoven \nBussen k\u00f8rer os derud kl 10 og vi er senest tilbage n\u00e5r skoledagen slutter .\nHusk at f\u00e5 varmt praktisk t\u00f8j p\u00e5 og en turtaske med en let tilg\u00e6ngelig madpakke der kan spises i det fri. Regnbukser eller overtr\u00e6ksbukser s\u00e5 man kan sidde p\u00e5 jorden.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"fredag 2. dec.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"Klippe/ klistre dag .\nHusk at tage lim, saks og kaffe m.m., kop og tallerkner med hjemmefra. Hvis i tager kage med er det til en buffet i klassen.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]}]}]'
+                    data = json.loads(mock_meebook, strict=False)
+                else:
+                    response = self._transport.get(
+                        MEEBOOK_API + get_payload, headers=headers, verify=True
                     )
-
-                    mock_meebook = 0
-                    if mock_meebook == 1:
-                        _LOGGER.warning("Using mock data for Meebook ugeplaner.")
-                        mock_meebook = '[{"id":490000,"name":"Emilie efternavn","unilogin":"lud...","weekPlan":[{"date":"mandag 28. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"I denne uge er der omlagt uge p\u00e5 hele skolen.\n\nMandag har vi \nKlippeklistredag:\n\nMan m\u00e5 gerne have nissehuer p\u00e5 :)\n\nMedbring gerne en god saks, limstift, skabeloner mm. \n\nB\u00f8rnene skal ogs\u00e5 medbringe et vasket syltet\u00f8jsglas eller lign., som vi skal male p\u00e5. S\u00f8rg gerne for at der ikke er m\u00e6rker p\u00e5:-)\n\n1. lektion: Morgenb\u00e5nd med l\u00e6sning/opgaver\n\n2. lektion: \nVi laver f\u00e6lles julenisser efter en bestemt skabelon.\n\n3. - 5. lektion: \nVi julehygger med musik og kreative projekter. Vi pynter vores f\u00e6lles juletr\u00e6, og synger julesange. \n\n6. lektion:\nAfslutning og oprydning.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"tirsdag 29. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver.\n\n2. lektion\nVi starter p\u00e5 storylineforl\u00f8b om jul. Vi taler om nisser og danner nissefamilier i klassen.\n\n3.-5. lektion\nVi lave et juleprojekt med filt...\n\n6. lektion\nVi arbejder med en kreativ opgave om v\u00e5benskold.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"onsdag 30. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. -2. lektion\nVi skal til foredrag med SOS B\u00f8rnebyerne om omvendt julekalender.\n\n3-4. lektion\nVi skriver nissehistorier om nissefamilierne.\n\n5.-6. lektion\nVi laver jule-postel\u00f8b, hvor posterne skal l\u00e6ses med en kodel\u00e6ser.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"torsdag 1. dec.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver. \nVi arbejder med l\u00e6s og forst\u00e5 i en julehistorie.\n\n2.-5. lektion\nVi skal arbejde med et kreativt juleprojekt, hvor der laves huse til nisserne.\n\n6. lektion\nSe SOS b\u00f8rnebyernes julekalender og afrunding af dagen.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"fredag 2. dec.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver samt julehygge, hvor vi l\u00e6ser julehistorie \n\n2. lektion:\nVi skal lave et julerim og skrive det ind p\u00e5 en flot julenisse samt tegne nissen. \n\n3.-4. lektion\nVi skal lave jule-postel\u00f8b p\u00e5 skolen. \n\n5.. lektion\nVi skal l\u00f8se et hemmeligt kodebrev ved hj\u00e6lp af en kodel\u00e6ser. \n\nVi evaluerer og afrunder ugen.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]}]},{"id":630000,"name":"Ann...","unilogin":"ann...","weekPlan":[{"date":"mandag 28. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi h\u00f8re om jul i Norge og lave Norsk julepynt.\nEfter 12 pausen skal vi h\u00f8re om julen i Danmark f\u00f8r juletr\u00e6et og andestegen.\nVi skal farvel\u00e6gge g\u00e5rdnisserne der passede p\u00e5 g\u00e5rdene i gamle dage.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"tirsdag 29. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi arbejde med julen i Gr\u00f8nland og lave gr\u00f8nlandske julehuse.\nEfter 12 pausen skal vi h\u00f8re om JUletr\u00e6et der flytter ind i de danske stuer. Vi skal tale om hvor det stammer fra og hvad der var p\u00e5 juletr\u00e6et i gamle dage . Blandt andet den spiselige pynt.\nVi taler om Peters jul og at der ikke altid har v\u00e6ret en stjerne i toppen. Vi klipper storke til juletr\u00e6stoppen","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"onsdag 30. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag st\u00e5r den p\u00e5 Jul i Finland og finske juletraditioner. Vi klipper finske julestjerner.\nEfter pausen skal vi arbejde videre med jul og julepynt gennem tiden i dk. \nVi skal tale om hvorfor der er flag, trompeter og trommer p\u00e5 tr\u00e6et (krigen i 1864) og vi skal lave gammeldags silkeroser og musetrapper til tr\u00e6et","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"torsdag 1. dec.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi p\u00e5 en juletur med hygge og posl\u00f8b til trylleskoven \nBussen k\u00f8rer os derud kl 10 og vi er senest tilbage n\u00e5r skoledagen slutter .\nHusk at f\u00e5 varmt praktisk t\u00f8j p\u00e5 og en turtaske med en let tilg\u00e6ngelig madpakke der kan spises i det fri. Regnbukser eller overtr\u00e6ksbukser s\u00e5 man kan sidde p\u00e5 jorden.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"fredag 2. dec.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"Klippe/ klistre dag .\nHusk at tage lim, saks og kaffe m.m., kop og tallerkner med hjemmefra. Hvis i tager kage med er det til en buffet i klassen.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]}]}]'
-                        data = json.loads(mock_meebook, strict=False)
-                    else:
-                        response = requests.get(
-                            MEEBOOK_API + get_payload, headers=headers, verify=True
-                        )
+                    try:
                         data = json.loads(response.text, strict=False)
-                        # _LOGGER.debug("Meebook ugeplan raw response from week "+week+": "+str(response.text))
-
-                    if "exceptionMessage" in data:
+                    except ValueError:
+                        data = None
+                    if response.status_code != 200 or data is None:
                         _LOGGER.warning(
-                            "Ignoring error in fetching data from Meebook. Error exception message: "
-                            + data["exceptionMessage"]
+                            "Could not fetch Meebook ugeplaner, status "
+                            + str(response.status_code)
                         )
-                    else:
-                        for person in data:
-                            _LOGGER.debug("Meebook ugeplan for " + person["name"])
-                            ugep = ""
-                            ugeplan = person["weekPlan"]
-                            for day in ugeplan:
-                                ugep = ugep + "<h3>" + day["date"] + "</h3>"
-                                if len(day["tasks"]) > 0:
-                                    for task in day["tasks"]:
-                                        if not task["pill"] == "Ingen fag tilknyttet":
-                                            ugep = (
-                                                ugep + "<b>" + task["pill"] + "</b><br>"
-                                            )
-                                        author = task.get("author")
-                                        if author:
-                                            ugep = ugep + author + "<br><br>"
-                                        if (
-                                            task["type"] == "comment"
-                                            or task["type"] == "task"
-                                        ):
-                                            content = re.sub(
-                                                r"([0-9]+)(\.)",
-                                                r"\1\.",
-                                                task["content"],
-                                            )
-                                        elif task["type"] == "assignment":
-                                            content = re.sub(
-                                                r"([0-9]+)(\.)", r"\1\.", task["title"]
-                                            )
-                                        ugep = ugep + content + "<br><br>"
-                                else:
-                                    ugep = ugep + "-"
-                            try:
-                                name = person["name"].split()[0]
-                            except:
-                                name = person["name"]
-                            if thisnext == "this":
-                                self.ugep_attr[name] = ugep
-                            elif thisnext == "next":
-                                self.ugepnext_attr[name] = ugep
-
-                # New EasyIQ Ugeplan
-                if AulaWidgetId.EASYIQ_UGEPLAN in self.widgets:
-                    import calendar, uuid
-                    from pyquery import PyQuery as pq
-
-                    # scraper = cloudscraper.create_scraper()
-
-                    _LOGGER.debug("In the New EasyIQ flow")
-                    token = self.get_token(AulaWidgetId.EASYIQ_UGEPLAN)
-                    csrf_token = self._session.cookies.get_dict()["Csrfp-Token"]
-
-                    widget_instance_id = uuid.uuid4()
-
-                    easyiq_headers = {
-                        "X-InstitutionFilter": str(self._institutionProfiles[0]),
-                        "X-Login": guardian,
-                        "X-UserProfile": "guardian",
-                        "X-ChildFilter": childUserIds,
-                        "X-WidgetInstanceId": str(widget_instance_id),
-                        "X-Requested-With": "XMLHttpRequest",
-                        # "Authorization": token,
-                        # "Accept": "application/json",
-                        # "Origin": "https://skoleportal.easyiqcloud.dk",
-                        # "Referer": "https://skoleportal.easyiqcloud.dk/",
-                        "accept": "*/*",
-                        "accept-language": "en-US,en;q=0.9,da;q=0.8",
-                        "authorization": token,
-                        "content-length": "0",
-                        "origin": "https://skoleportal.easyiqcloud.dk",
-                        "pragma": "no-cache",
-                        "priority": "u=1, i",
-                        "referer": "https://skoleportal.easyiqcloud.dk/UgeplanWidget",
-                        "request-id": "",
-                        "sec-ch-ua": '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
-                        "sec-ch-ua-mobile": "?0",
-                        "sec-ch-ua-platform": '"Windows"',
-                        "sec-fetch-dest": "empty",
-                        "sec-fetch-mode": "cors",
-                        "sec-fetch-site": "same-origin",
-                        "sec-fetch-storage-access": "active",
-                        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
-                    }
-
-                    this_week = datetime.datetime.now().strftime(
-                        "%Y-%m-%dT00:00:00.000Z"
+                        return None
+                    # _LOGGER.debug("Meebook ugeplan raw response from week "+week+": "+str(response.text))
+
+                result = {}
+                if "exceptionMessage" in data:
+                    # A failure, so nothing is cached and the week is fetched again
+                    _LOGGER.warning(
+                        "Ignoring error in fetching data from Meebook. Error exception message: "
+                        + data["exceptionMessage"]
                     )
-                    next_week = (
-                        datetime.datetime.now() + datetime.timedelta(weeks=1)
-                    ).strftime("%Y-%m-%dT00:00:00.000Z")
+                    return None
+                for person in data:
+                    _LOGGER.debug("Meebook ugeplan for " + person["name"])
+                    ugep = render_meebook_weekplan(person["weekPlan"])
+                    try:
+                        name = person["name"].split()[0]
+                    except:
+                        name = person["name"]
+                    result[name] = ugep
+                return result
 
-                    def process_easyiq_event(easyiq_json):
-                        EASYIQ_DATETIME_FORMAT = "%Y/%m/%d %H:%M"
+            # New EasyIQ Ugeplan
+            def process_easyiq_event(easyiq_json):
+                EASYIQ_DATETIME_FORMAT = "%Y/%m/%d %H:%M"
 
-                        start_datetime = datetime.datetime.strptime(
-                            easyiq_json["start"], EASYIQ_DATETIME_FORMAT
-                        )
+                start_datetime = datetime.datetime.strptime(
+                    easyiq_json["start"], EASYIQ_DATETIME_FORMAT
+                )
 
-                        end_datetime = datetime.datetime.strptime(
-                            easyiq_json["end"], EASYIQ_DATETIME_FORMAT
-                        )
+                end_datetime = datetime.datetime.strptime(
+                    easyiq_json["end"], EASYIQ_DATETIME_FORMAT
+                )
 
-                        return UgeplanCalendarEvent(
-                            start=start_datetime,
-                            weekday=start_datetime.weekday(),
-                            end=end_datetime,
-                            course=easyiq_json["courses"],
-                            description=easyiq_json["description"],
-                            group=easyiq_json["activities"],
-                        )
+                return UgeplanCalendarEvent(
+                    start=start_datetime,
+                    weekday=start_datetime.weekday(),
+                    end=end_datetime,
+                    course=easyiq_json["courses"],
+                    description=sanitize_html(str(easyiq_json["description"])),
+                    group=easyiq_json["activities"],
+                )
 
-                    def retrieve_week_details(login_id: EasyIqApiLoginId, date: str):
-                        # Retrieving the base class for the student
-                        content_response = requests.get(
-                            EASYIQ_NEW_API + "/Dashboard/Content",
-                            headers=child_easyid_headers,
+            def new_easyiq_login(token):
+                """Return the EasyIQ login for every child, shared by both weeks.
+
+                The loginId and the student's base class only change when the
+                child changes class, so they are cached per child for
+                EASYIQ_LOGIN_TTL instead of being looked up on every refresh.
+                """
+                import uuid
+                from pyquery import PyQuery as pq
+
+                # scraper = cloudscraper.create_scraper()
+
+                widget_instance_id = uuid.uuid4()
+
+                easyiq_headers = {
+                    "X-InstitutionFilter": str(self._institutionProfiles[0]),
+                    "X-Login": guardian,
+                    "X-UserProfile": "guardian",
+                    "X-ChildFilter": childUserIds,
+                    "X-WidgetInstanceId": str(widget_instance_id),
+                    "X-Requested-With": "XMLHttpRequest",
+                    # "Authorization": token,
+                    # "Accept": "application/json",
+                    # "Origin": "https://skoleportal.easyiqcloud.dk",
+                    # "Referer": "https://skoleportal.easyiqcloud.dk/",
+                    "accept": "*/*",
+                    "accept-language": "en-US,en;q=0.9,da;q=0.8",
+                    "authorization": token,
+                    "content-length": "0",
+                    "origin": "https://skoleportal.easyiqcloud.dk",
+                    "pragma": "no-cache",
+                    "priority": "u=1, i",
+                    "referer": "https://skoleportal.easyiqcloud.dk/UgeplanWidget",
+                    "request-id": "",
+                    "sec-ch-ua": '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
+                    "sec-ch-ua-mobile": "?0",
+                    "sec-ch-ua-platform": '"Windows"',
+                    "sec-fetch-dest": "empty",
+                    "sec-fetch-mode": "cors",
+                    "sec-fetch-site": "same-origin",
+                    "sec-fetch-storage-access": "active",
+                    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
+                }
+
+                logins = {}
+                for child in self._childrenFirstNamesAndUserIDs.items():
+                    child_user_id = AulaChildUserId(child[0])
+                    first_name = AulaChildFirstName(child[1])
+
+                    child_easyid_headers = easyiq_headers | {"X-Child": child_user_id}
+
+                    login = self._easyiq_logins.get(child_user_id)
+                    current_time = datetime.datetime.now(pytz.utc)
+                    if login and current_time - login.fetched_at < EASYIQ_LOGIN_TTL:
+                        _LOGGER.debug(
+                            "Reusing EasyIQ login for child " + str(child_user_id)
                         )
+                        logins[first_name] = (child_user_id, child_easyid_headers, login)
+                        continue
 
-                        content_response_html = pq(content_response.text)
-                        base_activity = content_response_html("#StudentBaseClass").attr(
-                            "value"
-                        )
+                    # Authenticate AULA user
+                    _LOGGER.debug(
+                        f"Authenticating AULA user with headers {child_easyid_headers}"
+                    )
+                    post_data = {}
 
-                        # Retrieving week plan for the week
-                        week_plan_params = {
-                            "loginId": login_id,
-                            "date": date,
-                            "activityFilter": base_activity,
-                        }
+                    auth_info_response = self._transport.post(
+                        EASYIQ_NEW_API + "/Aula/AuthenticateAulaUser",
+                        headers=child_easyid_headers,
+                        json=post_data,
+                    )
 
-                        week_plan_response = requests.get(
-                            EASYIQ_NEW_API + "/Calendar/WeekPlan",
-                            headers=child_easyid_headers,
-                            params=week_plan_params,
-                        )
+                    _LOGGER.debug(
+                        f"AuthenticateAulaUser response: {auth_info_response.status_code} of {len(auth_info_response.content)} bytes"
+                    )
 
-                        _LOGGER.debug(
-                            f"GetWeekPlan response: {week_plan_response.status_code} {week_plan_response.text}"
-                        )
+                    login_id = EasyIqApiLoginId(auth_info_response.json()["loginId"])
 
-                        week_plan_response_json = week_plan_response.json()
+                    # Retrieving the base class for the student
+                    content_response = self._transport.get(
+                        EASYIQ_NEW_API + "/Dashboard/Content",
+                        headers=child_easyid_headers,
+                    )
 
-                        if len(week_plan_response_json["weekPlans"]) > 0:
-                            week_plan_text = str(
-                                week_plan_response_json["weekPlans"][0]["text"]
-                            )
-                        else:
-                            week_plan_text = ""
-
-                        # Retrieving events for the week
-                        get_weekplan_events_params = {
-                            "loginId": login_id,
-                            "date": date,
-                            "courseFilter": -1,
-                            "textFilter": "",
-                            "ownWeekPlan": "false",
-                            "activityFilter": base_activity,
-                        }
+                    content_response_html = pq(content_response.text)
+                    base_activity = content_response_html("#StudentBaseClass").attr(
+                        "value"
+                    )
 
-                        week_plan_events_response = requests.get(
-                            EASYIQ_NEW_API + "/Calendar/CalendarGetWeekplanEvents",
-                            headers=child_easyid_headers,
-                            params=get_weekplan_events_params,
-                        )
+                    login = EasyIqLogin(
+                        login_id=login_id,
+                        base_activity=base_activity,
+                        fetched_at=current_time,
+                    )
+                    self._easyiq_logins[child_user_id] = login
+                    logins[first_name] = (child_user_id, child_easyid_headers, login)
+                return logins
+
+            def retrieve_week_details(
+                child_user_id: AulaChildUserId,
+                child_easyid_headers,
+                login: EasyIqLogin,
+                date: str,
+            ):
+                login_id = login.login_id
+                base_activity = login.base_activity
+
+                # Retrieving week plan for the week
+                week_plan_params = {
+                    "loginId": login_id,
+                    "date": date,
+                    "activityFilter": base_activity,
+                }
+
+                week_plan_response = self._transport.get(
+                    EASYIQ_NEW_API + "/Calendar/WeekPlan",
+                    headers=child_easyid_headers,
+                    params=week_plan_params,
+                )
 
-                        _LOGGER.debug(
-                            f"GetWeekplanEvents response: {week_plan_events_response.status_code} {week_plan_events_response.text}"
-                        )
+                _LOGGER.debug(
+                    f"GetWeekPlan response: {week_plan_response.status_code} of {len(week_plan_response.content)} bytes"
+                )
 
-                        raw_events = week_plan_events_response.json()
+                if week_plan_response.status_code != 200:
+                    # The cached login is no longer accepted, authenticate again
+                    # on the next refresh. The week is left out of the result,
+                    # so it is not cached and is fetched with the new login.
+                    self._easyiq_logins.pop(child_user_id, None)
+                    return None
 
-                        return week_plan_text, [
-                            process_easyiq_event(event) for event in raw_events
-                        ]
+                week_plan_response_json = week_plan_response.json()
 
-                    for child in self._childrenFirstNamesAndUserIDs.items():
-                        child_user_id = AulaChildUserId(child[0])
-                        first_name = AulaChildFirstName(child[1])
+                if len(week_plan_response_json["weekPlans"]) > 0:
+                    week_plan_text = sanitize_html(
+                        str(week_plan_response_json["weekPlans"][0]["text"])
+                    )
+                else:
+                    week_plan_text = ""
+
+                # Retrieving events for the week
+                get_weekplan_events_params = {
+                    "loginId": login_id,
+                    "date": date,
+                    "courseFilter": -1,
+                    "textFilter": "",
+                    "ownWeekPlan": "false",
+                    "activityFilter": base_activity,
+                }
+
+                week_plan_events_response = self._transport.get(
+                    EASYIQ_NEW_API + "/Calendar/CalendarGetWeekplanEvents",
+                    headers=child_easyid_headers,
+                    params=get_weekplan_events_params,
+                )
 
-                        child_easyid_headers = easyiq_headers | {
-                            "X-Child": child_user_id
-                        }
+                _LOGGER.debug(
+                    f"GetWeekplanEvents response: {week_plan_events_response.status_code} of {len(week_plan_events_response.content)} bytes"
+                )
 
-                        # Authenticate AULA user
-                        _LOGGER.debug(
-                            f"Authenticating AULA user with headers {child_easyid_headers}"
-                        )
-                        post_data = {}
+                raw_events = week_plan_events_response.json()
 
-                        auth_info_response = requests.post(
-                            EASYIQ_NEW_API + "/Aula/AuthenticateAulaUser",
-                            headers=child_easyid_headers,
-                            json=post_data,
-                        )
+                return week_plan_text, [process_easyiq_event(event) for event in raw_events]
 
-                        _LOGGER.debug(
-                            f"AuthenticateAulaUser response: {auth_info_response.status_code} {auth_info_response.text}"
-                        )
+            def new_easyiq_ugeplan(logins, date):
+                result = {}
+                for first_name, (child_user_id, child_easyid_headers, login) in logins.items():
+                    details = retrieve_week_details(
+                        child_user_id, child_easyid_headers, login, date
+                    )
+                    if details is not None:
+                        result[first_name] = details
+                return result
+
+            names = list(self._childrenFirstNamesAndUserIDs.values())
+            weeks = self._weeks(self._ugeplan_weeks + 1)
+            week_providers = {
+                "0029": min_uddannelse_ugeplan,
+                "0001": easyiq_ugeplan,
+                "0004": meebook_ugeplan,
+            }
 
-                        login_id = EasyIqApiLoginId(
-                            auth_info_response.json()["loginId"]
+            # Only provider weeks with missing or expired content are fetched.
+            # Widget tokens and EasyIQ logins are obtained once per provider and
+            # shared by all weeks, and the requests are issued as one concurrent
+            # batch.
+            jobs = {}
+            for widgetid, fetch in week_providers.items():
+                if widgetid in self.widgets:
+                    stale = self._stale_weeks(widgetid, names, weeks)
+                    if stale:
+                        token = self.get_token(widgetid)
+                    for offset in stale:
+                        jobs[widgetid, offset] = functools.partial(
+                            fetch, token, weeks[offset]
                         )
+            if "0062" in self.widgets:
+                # Huskelisten is not week based, so it is only fetched once
+                _LOGGER.debug("In the Huskelisten flow...")
+                token = self.get_token("0062", False)
+                jobs["0062", None] = functools.partial(huskelisten, token)
+            if AulaWidgetId.EASYIQ_UGEPLAN in self.widgets:
+                _LOGGER.debug("In the New EasyIQ flow")
+                # EasyIQ is fetched per child, so only the stale children are asked for
+                stale = {
+                    offset: [
+                        name
+                        for name in names
+                        if self._week_key(AulaWidgetId.EASYIQ_UGEPLAN, name, week)
+                        not in self._weekplan_cache
+                    ]
+                    for offset, week in weeks.items()
+                }
+                stale = {
+                    offset: stale_names
+                    for offset, stale_names in stale.items()
+                    if stale_names
+                }
+                if stale:
+                    token = self.get_token(AulaWidgetId.EASYIQ_UGEPLAN)
+                    logins = new_easyiq_login(token)
+                for offset, stale_names in stale.items():
+                    date = (
+                        datetime.datetime.now() + datetime.timedelta(weeks=offset)
+                    ).strftime("%Y-%m-%dT00:00:00.000Z")
+                    jobs[AulaWidgetId.EASYIQ_UGEPLAN, offset] = functools.partial(
+                        new_easyiq_ugeplan,
+                        {name: logins[name] for name in stale_names if name in logins},
+                        date,
+                    )
 
-                        if thisnext == "this":
-                            self.ugep_attr[child[1]], self.ugep_events[child[1]] = (
-                                retrieve_week_details(login_id, this_week)
-                            )
+            results = self._fetch_concurrently(list(jobs.values()))
+            for (widgetid, offset), result in zip(jobs, results):
+                if widgetid == "0062":
+                    changes["huskeliste"] = {**self.snapshot.huskeliste, **result}
+                elif result is None:
+                    # A failed fetch is not cached, so the week is fetched again
+                    # on the next refresh and the last plans are kept until then
+                    continue
+                elif widgetid == AulaWidgetId.EASYIQ_UGEPLAN:
+                    self._store_week(widgetid, offset, weeks[offset], result, ())
+                else:
+                    self._store_week(widgetid, offset, weeks[offset], result, names)
+
+            # Plans are applied in provider order, so a child with more than one
+            # source ends up with the same plan as when they were fetched in sequence
+            later_weeks = {}
+            for offset, week in weeks.items():
+                plans = {}
+                events = {}
+                for widgetid in (*week_providers, AulaWidgetId.EASYIQ_UGEPLAN):
+                    if widgetid not in self.widgets:
+                        continue
+                    for name, value in self._cached_week(widgetid, week, names).items():
+                        if widgetid == AulaWidgetId.EASYIQ_UGEPLAN:
+                            plans[name], events[name] = value
                         else:
-                            (
-                                self.ugepnext_attr[child[1]],
-                                self.ugepnext_events[child[1]],
-                            ) = retrieve_week_details(login_id, next_week)
-
-            now = datetime.datetime.now() + datetime.timedelta(weeks=1)
-            thisweek = datetime.datetime.now().strftime("%Y-W%V")
-            nextweek = now.strftime("%Y-W%V")
-            ugeplan(thisweek, "this")
-            ugeplan(nextweek, "next")
-            # _LOGGER.debug("End result of ugeplan object: "+str(self.ugep_attr))
+                            plans[name] = value
+                if offset == 0:
+                    changes["ugep_attr"] = {**self.snapshot.ugep_attr, **plans}
+                    changes["ugep_events"] = {**self.snapshot.ugep_events, **events}
+                elif offset == 1:
+                    changes["ugepnext_attr"] = {**self.snapshot.ugepnext_attr, **plans}
+                    changes["ugepnext_events"] = {
+                        **self.snapshot.ugepnext_events,
+                        **events,
+                    }
+                else:
+                    for name, plan in plans.items():
+                        later_weeks.setdefault(name, {})[week] = plan
+            changes["ugep_weeks_attr"] = later_weeks
+            # _LOGGER.debug("End result of ugeplan object: "+str(changes["ugep_attr"]))
         # End of Ugeplaner
+        self._stages.mark("ugeplaner")
         return True
@@ -18,6 +18,12 @@ from .const import (
     CONF_UGEPLAN,
     CONF_MU_OPGAVER,
     CONF_TEACHER_FULL_NAME,
+    CONF_UGEPLAN_WEEKS,
+    DEFAULT_UGEPLAN_WEEKS,
+    MAX_UGEPLAN_WEEKS,
+    CONF_HUSKELISTEN_DAYS,
+    DEFAULT_HUSKELISTEN_DAYS,
+    MAX_HUSKELISTEN_DAYS,
     CONF_MITID_USERNAME,
     CONF_MITID_PASSWORD,
     CONF_AUTH_METHOD,
@@ -42,6 +48,12 @@ AUTH_SCHEMA = vol.Schema(
         vol.Optional("ugeplan", default=True): cv.boolean,
         vol.Optional("mu_opgaver", default=True): cv.boolean,
         vol.Optional("teacher_full_name", default=False): cv.boolean,
+        vol.Optional("ugeplan_weeks", default=DEFAULT_UGEPLAN_WEEKS): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_UGEPLAN_WEEKS)
+        ),
+        vol.Optional("huskelisten_days", default=DEFAULT_HUSKELISTEN_DAYS): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_HUSKELISTEN_DAYS)
+        ),
     }
 )
 
@@ -76,6 +88,12 @@ class AulaCustomConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 CONF_UGEPLAN: user_input.get("ugeplan", True),
                 CONF_MU_OPGAVER: user_input.get("mu_opgaver", True),
                 CONF_TEACHER_FULL_NAME: user_input.get("teacher_full_name", False),
+                CONF_UGEPLAN_WEEKS: user_input.get(
+                    "ugeplan_weeks", DEFAULT_UGEPLAN_WEEKS
+                ),
+                CONF_HUSKELISTEN_DAYS: user_input.get(
+                    "huskelisten_days", DEFAULT_HUSKELISTEN_DAYS
+                ),
             }
 
             # Proceed to authentication
@@ -309,6 +327,12 @@ class AulaCustomConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             CONF_UGEPLAN: self._reauth_entry.data.get(CONF_UGEPLAN, True),
             CONF_MU_OPGAVER: self._reauth_entry.data.get(CONF_MU_OPGAVER, True),
             CONF_TEACHER_FULL_NAME: self._reauth_entry.data.get(CONF_TEACHER_FULL_NAME, False),
+            CONF_UGEPLAN_WEEKS: self._reauth_entry.data.get(
+                CONF_UGEPLAN_WEEKS, DEFAULT_UGEPLAN_WEEKS
+            ),
+            CONF_HUSKELISTEN_DAYS: self._reauth_entry.data.get(
+                CONF_HUSKELISTEN_DAYS, DEFAULT_HUSKELISTEN_DAYS
+            ),
         }
 
         # Start authentication process
@@ -352,6 +376,12 @@ class AulaCustomConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             CONF_UGEPLAN: self._reauth_entry.data.get(CONF_UGEPLAN, True),
             CONF_MU_OPGAVER: self._reauth_entry.data.get(CONF_MU_OPGAVER, True),
             CONF_TEACHER_FULL_NAME: self._reauth_entry.data.get(CONF_TEACHER_FULL_NAME, False),
+            CONF_UGEPLAN_WEEKS: self._reauth_entry.data.get(
+                CONF_UGEPLAN_WEEKS, DEFAULT_UGEPLAN_WEEKS
+            ),
+            CONF_HUSKELISTEN_DAYS: self._reauth_entry.data.get(
+                CONF_HUSKELISTEN_DAYS, DEFAULT_HUSKELISTEN_DAYS
+            ),
         }
 
         # Start authentication process
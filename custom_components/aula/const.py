@@ -1,4 +1,5 @@
 from collections import namedtuple
+from datetime import timedelta
 from enum import StrEnum
 
 STARTUP = r"""
@@ -23,10 +24,64 @@ MEEBOOK_API = "https://app.meebook.com/aulaapi"
 SYSTEMATIC_API = "https://systematic-momo.dk/api/aula"
 EASYIQ_API = "https://api.easyiqcloud.dk/api/aula"
 EASYIQ_NEW_API = "https://skoleportal.easyiqcloud.dk"
+# Weekly plans are cached per week, with a TTL depending on the week's distance
+WEEKPLAN_TTL_CURRENT = timedelta(minutes=30)
+WEEKPLAN_TTL_FUTURE = timedelta(minutes=10)
+WEEKPLAN_CACHE_MAX_ENTRIES = 512
+# Huskelisten reminders due within HUSKELISTEN_NEAR_DAYS are synced on every
+# refresh, the whole configured window every HUSKELISTEN_FULL_SYNC_INTERVAL
+HUSKELISTEN_NEAR_DAYS = 2
+HUSKELISTEN_FULL_SYNC_INTERVAL = timedelta(hours=1)
+# Message threads are read page by page until an unchanged thread is reached
+# and every unread thread is listed, and all MAX_THREAD_PAGES pages every
+# MESSAGES_FULL_SYNC_INTERVAL
+MAX_THREAD_PAGES = 5
+MESSAGES_FULL_SYNC_INTERVAL = timedelta(hours=1)
+# Rendered plans kept per renderer, keyed by a hash of their content
+RENDER_CACHE_MAX_ENTRIES = 256
+# Content served by the aula/content websocket command
+CONTENT_KINDS = ("ugeplan", "mu_opgaver", "huskelisten", "message")
+DEFAULT_CONTENT_PAGE_SIZE = 10
+MAX_CONTENT_PAGE_SIZE = 50
+# Longest HTML attribute put on an entity, in characters
+MAX_HTML_ATTRIBUTE_LENGTH = 65536
+# How long an EasyIQ loginId and student base class are reused per child
+EASYIQ_LOGIN_TTL = timedelta(hours=1)
 CONF_SCHOOLSCHEDULE = "schoolschedule"
 CONF_UGEPLAN = "ugeplan"
 CONF_MU_OPGAVER = "mu_opgaver"
 CONF_TEACHER_FULL_NAME = "teacher_full_name"
+CONF_UGEPLAN_WEEKS = "ugeplan_weeks"
+DEFAULT_UGEPLAN_WEEKS = 1
+MAX_UGEPLAN_WEEKS = 8
+CONF_HUSKELISTEN_DAYS = "huskelisten_days"
+DEFAULT_HUSKELISTEN_DAYS = 7
+MAX_HUSKELISTEN_DAYS = 60
+
+# Upper bound on provider requests (weeks, widgets) issued at the same time
+MAX_CONCURRENT_FETCHES = 4
+# Shared by the clients of all config entries: pooled connections per host,
+# and requests per second per host with the burst allowed on top
+TRANSPORT_POOL_SIZE = 10
+TRANSPORT_RATE = 10
+TRANSPORT_BURST = 20
+# Presence and schedules fetched by one entry are reused by the other entries
+# following the same children for this long, less than the two minutes between
+# refreshes around arrivals and pick-ups, so presence is never a poll behind.
+# An entry always refetches what it fetched itself.
+SHARED_CHILD_DATA_TTL = timedelta(minutes=1)
+SHARED_CHILD_DATA_MAX_ENTRIES = 256
+
+# Profile pictures cached on disk for all entries, and the largest one cached
+PROFILE_PICTURE_CACHE_MAX_BYTES = 20 * 1024 * 1024
+PROFILE_PICTURE_MAX_BYTES = 2 * 1024 * 1024
+
+# Events fired when a refresh finds changes, see events.py
+EVENT_PRESENCE_CHANGED = "aula_presence_changed"
+EVENT_NEW_MESSAGE = "aula_new_message"
+EVENT_WEEKPLAN_CHANGED = "aula_weekplan_changed"
+EVENT_SUBSTITUTE_TEACHER = "aula_substitute_teacher"
+EVENT_NEW_REMINDER = "aula_new_reminder"
 
 # Authentication method constants
 CONF_MITID_USERNAME = "mitid_username"
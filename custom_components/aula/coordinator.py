@@ -0,0 +1,205 @@
+"""Data update coordinators and the refresh scheduler shared by all entries."""
+
+import asyncio
+import datetime
+import functools
+import logging
+from datetime import timedelta
+
+from homeassistant import config_entries, core
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import dt as dt_util
+
+from .const import CONF_TEACHER_FULL_NAME
+from .events import diff_events
+from .model import build_child_views
+from .pictures import profile_pictures
+from .profiling import RefreshProfile, StageTimer, current_profile
+
+_LOGGER = logging.getLogger(__name__)
+
+UPDATE_INTERVAL = timedelta(minutes=5)
+# Around expected arrivals, pick-ups and the first and last lesson of the day
+TRANSITION_WINDOW = timedelta(minutes=20)
+TRANSITION_UPDATE_INTERVAL = timedelta(minutes=2)
+# When no child is expected at school or in day care
+IDLE_UPDATE_INTERVAL = timedelta(minutes=30)
+# How long a refresh keeps the other entries waiting, see RefreshScheduler
+REFRESH_TURN_TIMEOUT = timedelta(seconds=60)
+
+# Daily overview times marking when a child arrives or leaves
+TRANSITION_FIELDS = ("entryTime", "exitTime", "checkInTime")
+
+
+def _transitions(views, now):
+    """Return the times at which some child is expected to arrive or leave.
+
+    These are today's times from the daily overview, which are local times
+    without a zone, and the start of the first and the end of the last lesson
+    of every day in the schedule, all in the local time zone, as is now.
+    """
+    transitions = []
+    for view in views.values():
+        for attribute in TRANSITION_FIELDS:
+            value = view.presence_attributes.get(attribute)
+            try:
+                time = datetime.datetime.strptime(value, "%H:%M").time()
+            except (TypeError, ValueError):
+                continue
+            # The zone rather than now's offset, which differs on a DST change day
+            transitions.append(
+                datetime.datetime.combine(now.date(), time, dt_util.DEFAULT_TIME_ZONE)
+            )
+        days = {}
+        for lesson in view.lessons:
+            day = days.setdefault(dt_util.as_local(lesson.start).date(), [])
+            day.append(lesson)
+        for lessons in days.values():
+            transitions.append(dt_util.as_local(min(lesson.start for lesson in lessons)))
+            transitions.append(dt_util.as_local(max(lesson.end for lesson in lessons)))
+    return transitions
+
+
+def next_update_interval(views, now):
+    """Return how long to wait before the next refresh, given the child views.
+
+    Refreshes come every TRANSITION_UPDATE_INTERVAL around expected arrivals
+    and pick-ups, every UPDATE_INTERVAL during the rest of the day, and every
+    IDLE_UPDATE_INTERVAL when school and day care are out, waking up in time
+    for the next expected arrival.
+    """
+    now = dt_util.as_local(now)
+    transitions = _transitions(views, now)
+    if any(abs(now - transition) <= TRANSITION_WINDOW for transition in transitions):
+        return TRANSITION_UPDATE_INTERVAL
+    today = [
+        transition
+        for transition in transitions
+        if transition.date() == now.date()
+    ]
+    if today and min(today) < now < max(today):
+        return UPDATE_INTERVAL
+    upcoming = [
+        transition - TRANSITION_WINDOW - now
+        for transition in transitions
+        if transition > now
+    ]
+    return max(
+        TRANSITION_UPDATE_INTERVAL, min([IDLE_UPDATE_INTERVAL, *upcoming])
+    )
+
+
+class RefreshScheduler:
+    """Runs the refreshes of all config entries on the executor, one at a time.
+
+    Each refresh already fetches its providers concurrently on the shared
+    transport, so refreshing several accounts at once would only compete for
+    the same connections and fetch threads. A refresh has its turn for at
+    most REFRESH_TURN_TIMEOUT though, after which the next one starts while
+    it finishes, so an account waiting on a MitID login or a slow provider
+    does not hold up the others.
+    """
+
+    def __init__(self, hass: core.HomeAssistant) -> None:
+        self._hass = hass
+        self._turn = asyncio.Semaphore()
+
+    async def async_run(self, func):
+        await self._turn.acquire()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._turn.release()
+
+        timeout = asyncio.get_running_loop().call_later(
+            REFRESH_TURN_TIMEOUT.total_seconds(), release
+        )
+        try:
+            return await self._hass.async_add_executor_job(func)
+        finally:
+            timeout.cancel()
+            release()
+
+
+def create_coordinator(
+    hass: core.HomeAssistant,
+    entry: config_entries.ConfigEntry,
+    client,
+    scheduler: RefreshScheduler,
+    pictures=None,
+) -> DataUpdateCoordinator:
+    """Return the coordinator refreshing client, with child id -> ChildView as data.
+
+    The refresh interval adapts to the children's day, see next_update_interval,
+    and the changes found by each refresh are fired as events, see events.py.
+    Profile pictures are served from pictures, a ProfilePictureCache, if given.
+    A refresh requested while a RefreshProfile is current, see
+    async_profile_refresh, runs under that profile.
+    """
+    use_full_name = {**entry.data, **entry.options}.get(CONF_TEACHER_FULL_NAME, False)
+    # The snapshot and views of the previous refresh
+    previous = []
+
+    def refresh():
+        client.update_data()
+        stages = StageTimer()
+        snapshot = client.snapshot
+        picture_urls = pictures.update(profile_pictures(snapshot)) if pictures else None
+        stages.mark("pictures")
+        views = build_child_views(client, use_full_name, picture_urls)
+        stages.mark("views")
+        events = diff_events(*previous, snapshot, views) if previous else []
+        stages.mark("events")
+        previous[:] = [snapshot, views]
+        return views, events, {**client.stage_timings, **stages.stages}
+
+    async def async_update_data():
+        profile = current_profile()
+        if profile is None:
+            views, events, _ = await scheduler.async_run(refresh)
+        else:
+            views, events, profile.stages = await scheduler.async_run(
+                functools.partial(profile.run, refresh)
+            )
+        for event_type, event_data in events:
+            hass.bus.async_fire(
+                event_type, {"config_entry_id": entry.entry_id, **event_data}
+            )
+        coordinator.update_interval = next_update_interval(views, dt_util.now())
+        _LOGGER.debug(
+            "Next refresh of " + entry.title + " in " + str(coordinator.update_interval)
+        )
+        return views
+
+    coordinator = DataUpdateCoordinator(
+        hass,
+        _LOGGER,
+        name="aula " + entry.title,
+        update_method=async_update_data,
+        update_interval=UPDATE_INTERVAL,
+    )
+    return coordinator
+
+
+async def async_profile_refresh(coordinator: DataUpdateCoordinator, count: int) -> dict:
+    """Refresh coordinator under the profiler and return what took the time.
+
+    Returns the duration of the refresh, the seconds per stage and the count
+    functions with the most cumulative time, summed over the fetch threads.
+    """
+    profile = RefreshProfile()
+    with profile.requested():
+        await coordinator.async_refresh()
+    if not coordinator.last_update_success or profile.duration is None:
+        raise HomeAssistantError(
+            "The profiled refresh failed: " + str(coordinator.last_exception)
+        )
+    return {
+        "duration": round(profile.duration, 4),
+        "stages": {stage: round(seconds, 4) for stage, seconds in profile.stages.items()},
+        "functions": profile.functions(count),
+    }
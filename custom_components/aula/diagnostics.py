@@ -0,0 +1,38 @@
+"""Diagnostics support for Aula."""
+
+from homeassistant import config_entries, core
+
+from . import loaded_entries
+
+
+async def async_get_config_entry_diagnostics(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> dict:
+    """Return diagnostics for a config entry.
+
+    Children are listed by id only. For every other entry following some of
+    the same children, the shared child ids are listed, as their presence,
+    schedule and weekly plans are fetched once for both entries. The requests
+    of the entry's refreshes are counted per Aula API method or host.
+    """
+    entries = loaded_entries(hass)
+    client = entries[entry.entry_id]["client"]
+    child_ids = {child["id"] for child in client.snapshot.children}
+
+    shared_with = {}
+    for entry_id, data in entries.items():
+        if entry_id == entry.entry_id:
+            continue
+        overlap = child_ids & {
+            child["id"] for child in data["client"].snapshot.children
+        }
+        if overlap:
+            shared_with[entry_id] = sorted(overlap)
+
+    return {
+        "children": sorted(child_ids),
+        "widgets": sorted(client.widgets),
+        "children_shared_with_entries": shared_with,
+        "shared_data_reused": dict(client.shared_reuse),
+        "requests": client.metrics.as_dict(),
+    }
@@ -0,0 +1,24 @@
+"""Unique ids of the entities, shared by the platforms."""
+
+from homeassistant.helpers import entity_registry as er
+
+from .const import DOMAIN
+
+
+def async_entry_unique_id(hass, platform, config_entry, legacy_unique_id):
+    """Return the unique id of an entity of config_entry.
+
+    The unique ids used to be the same for every entry, so the entities of a
+    child with two guardians set up as two entries collided. They now end with
+    the entry id, and an entity registered under the old one is moved to it
+    when it belongs to this entry, keeping its entity id and history.
+    """
+    unique_id = legacy_unique_id + "_" + config_entry.entry_id
+    registry = er.async_get(hass)
+    entity_id = registry.async_get_entity_id(platform, DOMAIN, legacy_unique_id)
+    if (
+        entity_id
+        and registry.async_get(entity_id).config_entry_id == config_entry.entry_id
+    ):
+        registry.async_update_entity(entity_id, new_unique_id=unique_id)
+    return unique_id
@@ -0,0 +1,119 @@
+"""Events fired when a refresh finds changes.
+
+Automations can trigger on these instead of templates over the sensor
+attributes, which are evaluated again on every state write.
+"""
+
+import datetime
+
+from .const import (
+    EVENT_NEW_MESSAGE,
+    EVENT_NEW_REMINDER,
+    EVENT_PRESENCE_CHANGED,
+    EVENT_SUBSTITUTE_TEACHER,
+    EVENT_WEEKPLAN_CHANGED,
+)
+
+# Marks the lessons of a substitute teacher, see calendar.parseCalendarLesson
+SUBSTITUTE_MARKER = "VIKAR: "
+
+
+def _message_key(message):
+    return (message.get("thread_id"), message.get("sender"), message.get("text"))
+
+
+def _weekplans(snapshot, view):
+    """Return ISO week -> weekly plan HTML of a child, as of the view's week."""
+    monday = datetime.datetime.strptime(view.week + "-1", "%G-W%V-%u")
+    weeks = {}
+    for offset, plans in ((0, snapshot.ugep_attr), (1, snapshot.ugepnext_attr)):
+        if view.first_name in plans:
+            week = (monday + datetime.timedelta(weeks=offset)).strftime("%G-W%V")
+            weeks[week] = plans[view.first_name]
+    weeks.update(snapshot.ugep_weeks_attr.get(view.first_name) or {})
+    return weeks
+
+
+def _substitute_lessons(view):
+    return {
+        (lesson.start, lesson.summary): lesson
+        for lesson in view.lessons
+        if SUBSTITUTE_MARKER in lesson.summary
+    }
+
+
+def diff_events(old_snapshot, old_views, snapshot, views):
+    """Return (event type, event data) for every change between two refreshes.
+
+    Changes for a child are only reported when the previous refresh also had
+    the child, so adding an entry or a child does not fire a burst of events.
+    """
+    events = []
+
+    old_messages = {_message_key(message) for message in old_snapshot.messages}
+    for message in snapshot.messages:
+        if _message_key(message) not in old_messages:
+            events.append(
+                (
+                    EVENT_NEW_MESSAGE,
+                    {
+                        "thread_id": message.get("thread_id"),
+                        "subject": message.get("subject", ""),
+                        "sender": message.get("sender", ""),
+                    },
+                )
+            )
+
+    for child_id, view in views.items():
+        old_view = old_views.get(child_id)
+        if old_view is None:
+            continue
+        child = {"child_id": child_id, "child": view.first_name}
+
+        if view.presence != old_view.presence:
+            events.append(
+                (
+                    EVENT_PRESENCE_CHANGED,
+                    {**child, "from": old_view.presence, "to": view.presence},
+                )
+            )
+
+        old_plans = _weekplans(old_snapshot, old_view)
+        for week, html in _weekplans(snapshot, view).items():
+            if old_plans.get(week) != html:
+                events.append(
+                    (
+                        EVENT_WEEKPLAN_CHANGED,
+                        {**child, "week": week, "new": week not in old_plans},
+                    )
+                )
+
+        old_substitutes = _substitute_lessons(old_view)
+        for key, lesson in _substitute_lessons(view).items():
+            if key not in old_substitutes:
+                events.append(
+                    (
+                        EVENT_SUBSTITUTE_TEACHER,
+                        {
+                            **child,
+                            "summary": lesson.summary,
+                            "start": lesson.start.isoformat(),
+                            "end": lesson.end.isoformat(),
+                            "location": lesson.location,
+                        },
+                    )
+                )
+
+        for reminder_id, due_date in view.reminders.items():
+            if reminder_id not in old_view.reminders:
+                events.append(
+                    (
+                        EVENT_NEW_REMINDER,
+                        {
+                            **child,
+                            "reminder_id": reminder_id,
+                            "due_date": due_date.isoformat(),
+                        },
+                    )
+                )
+    return events
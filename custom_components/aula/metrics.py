@@ -0,0 +1,172 @@
+"""Latency, size and error metrics of the requests to Aula and the providers.
+
+Requests are labelled by their Aula API method, such as
+messaging.getThreads, or else by host. The transport records every request
+in its own metrics, and also in those of the client whose refresh made it,
+see RequestMetrics.recording.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+from aiohttp import web
+from homeassistant.components.http import HomeAssistantView
+
+from .const import DOMAIN
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_current = contextvars.ContextVar("aula_request_metrics", default=None)
+
+
+def request_label(url):
+    """Return the method parameter of an Aula API url, or else its host."""
+    parts = urlsplit(url)
+    method = parse_qs(parts.query).get("method")
+    return method[0] if method else parts.hostname or ""
+
+
+class EndpointMetrics:
+    """Counters of the requests with one label."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.statuses = {}
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        # Requests per latency bucket, the last one for slower requests
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "statuses": dict(sorted(self.statuses.items())),
+            "latency_sum": round(self.latency_sum, 3),
+            "latency_mean": round(self.latency_sum / self.requests, 3)
+            if self.requests
+            else None,
+            "latency_max": round(self.latency_max, 3),
+            "latency_buckets": dict(
+                zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.latency_buckets)
+            ),
+        }
+
+
+class RequestMetrics:
+    """Metrics per request label, safe to record from the fetch threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    @contextlib.contextmanager
+    def recording(self):
+        """Also record the requests made in this block, and its fetch jobs, here."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def record(self, url, seconds, status=None, size=0):
+        """Record a request, with status None when it raised an exception."""
+        label = request_label(url)
+        with self._lock:
+            endpoint = self._endpoints.get(label)
+            if endpoint is None:
+                endpoint = self._endpoints[label] = EndpointMetrics()
+            endpoint.requests += 1
+            endpoint.bytes += size
+            endpoint.latency_sum += seconds
+            endpoint.latency_max = max(endpoint.latency_max, seconds)
+            endpoint.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if status is None or status >= 400:
+                endpoint.errors += 1
+            key = str(status) if status is not None else "exception"
+            endpoint.statuses[key] = endpoint.statuses.get(key, 0) + 1
+
+    def totals(self):
+        """Return the number of requests and errors, and the mean latency."""
+        with self._lock:
+            requests = sum(e.requests for e in self._endpoints.values())
+            errors = sum(e.errors for e in self._endpoints.values())
+            latency = sum(e.latency_sum for e in self._endpoints.values())
+        return requests, errors, latency / requests if requests else None
+
+    def as_dict(self):
+        """Return label -> counters, for diagnostics."""
+        with self._lock:
+            return {
+                label: endpoint.as_dict()
+                for label, endpoint in sorted(self._endpoints.items())
+            }
+
+    def as_text(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        endpoints = {
+            'endpoint="' + label.replace("\\", "\\\\").replace('"', '\\"') + '"': endpoint
+            for label, endpoint in self.as_dict().items()
+        }
+        lines = []
+        for name, kind, field in (
+            ("aula_requests_total", "counter", "requests"),
+            ("aula_request_errors_total", "counter", "errors"),
+            ("aula_response_bytes_total", "counter", "bytes"),
+        ):
+            lines.append("# TYPE " + name + " " + kind)
+            for labels, endpoint in endpoints.items():
+                lines.append(name + "{" + labels + "} " + str(endpoint[field]))
+
+        lines.append("# TYPE aula_request_duration_seconds histogram")
+        for labels, endpoint in endpoints.items():
+            cumulative = 0
+            for bound, count in endpoint["latency_buckets"].items():
+                cumulative += count
+                lines.append(
+                    "aula_request_duration_seconds_bucket{"
+                    + labels
+                    + ',le="'
+                    + bound
+                    + '"} '
+                    + str(cumulative)
+                )
+            lines.append(
+                "aula_request_duration_seconds_sum{"
+                + labels
+                + "} "
+                + str(endpoint["latency_sum"])
+            )
+            lines.append(
+                "aula_request_duration_seconds_count{"
+                + labels
+                + "} "
+                + str(endpoint["requests"])
+            )
+        return "\n".join(lines) + "\n"
+
+
+def current_metrics():
+    """Return the metrics of the refresh this request is made for, if any."""
+    return _current.get()
+
+
+class MetricsView(HomeAssistantView):
+    """Serves the metrics of all entries' requests, for Prometheus to scrape."""
+
+    url = "/api/aula/metrics"
+    name = "api:aula:metrics"
+
+    async def get(self, request: web.Request) -> web.Response:
+        transport = request.app["hass"].data.get(DOMAIN, {}).get("transport")
+        return web.Response(
+            text=transport.metrics.as_text() if transport else "",
+            content_type="text/plain",
+        )
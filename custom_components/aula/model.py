@@ -0,0 +1,253 @@
+"""Per-child view models for the sensors.
+
+The coordinator builds one ChildView per child after every refresh, so parsing
+presence times, capping HTML, looking up names and indexing the school
+schedule happens once per refresh instead of on every state write.
+"""
+
+import bisect
+import datetime
+import functools
+import json
+import logging
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from .const import MAX_HTML_ATTRIBUTE_LENGTH, AulaWidgetId
+from .render import truncate_html
+
+_LOGGER = logging.getLogger(__name__)
+
+# Plans, assignments and reminders can be many kilobytes of HTML. They are kept
+# out of the recorder database and are summarized by their length in the
+# recorded content_summary.
+CONTENT_ATTRIBUTES = frozenset(
+    {
+        "ugeplan",
+        "ugeplan_next",
+        "ugeplan_weeks",
+        "ugeplan_events",
+        "ugeplan_events_next",
+        "mu_opgaver",
+        "mu_opgaver_next",
+        "huskelisten",
+    }
+)
+
+PRESENCE_STATES = [
+    "Ikke kommet",
+    "Syg",
+    "Ferie/Fri",
+    "Kommet/Til stede",
+    "På tur",
+    "Sover",
+    "6",
+    "7",
+    "Gået",
+    "9",
+    "10",
+    "11",
+    "12",
+    "13",
+    "14",
+    "15",
+]
+
+PRESENCE_FIELDS = [
+    "location",
+    "sleepIntervals",
+    "checkInTime",
+    "checkOutTime",
+    "activityType",
+    "entryTime",
+    "exitTime",
+    "exitWith",
+    "comment",
+    "spareTimeActivity",
+    "selfDeciderStartTime",
+    "selfDeciderEndTime",
+]
+
+
+@dataclass(frozen=True, slots=True)
+class ChildView:
+    """What the sensors of one child show, as of the latest refresh."""
+
+    child_id: int
+    first_name: str
+    institution: str
+    week: str
+    presence: str
+    presence_attributes: Mapping[str, Any]
+    ugeplan_attributes: Mapping[str, Any]
+    mu_opgaver_attributes: Mapping[str, Any]
+    huskelisten_count: int
+    huskelisten_attributes: Mapping[str, Any]
+    # The child's lessons in the school schedule, ordered by start
+    lessons: tuple = ()
+    # Huskelisten reminder id -> due date
+    reminders: Mapping[int, datetime.datetime] = field(
+        default_factory=lambda: MappingProxyType({})
+    )
+
+    def next_lesson(self, now):
+        """Return the lesson under way at now, or else the next one, or None."""
+        index = bisect.bisect_right(self.lessons, now, key=lambda lesson: lesson.start)
+        if index and self.lessons[index - 1].end > now:
+            return self.lessons[index - 1]
+        if index < len(self.lessons):
+            return self.lessons[index]
+        return None
+
+    def lessons_between(self, start, end):
+        """Return the lessons overlapping the time span from start to end."""
+        index = bisect.bisect_left(self.lessons, end, key=lambda lesson: lesson.start)
+        return [lesson for lesson in self.lessons[:index] if lesson.end > start]
+
+
+def content_attributes(attributes):
+    """Cap the HTML in attributes and add the content_summary attribute."""
+    content_summary = {}
+    for attribute in CONTENT_ATTRIBUTES & attributes.keys():
+        value = attributes[attribute]
+        if isinstance(value, str):
+            content_summary[attribute] = len(value)
+            attributes[attribute] = truncate_html(value, MAX_HTML_ATTRIBUTE_LENGTH)
+        elif isinstance(value, dict):
+            content_summary[attribute] = sum(len(html) for html in value.values())
+            attributes[attribute] = {
+                week: truncate_html(html, MAX_HTML_ATTRIBUTE_LENGTH)
+                for week, html in value.items()
+            }
+        else:
+            content_summary[attribute] = len(value or ())
+    attributes["content_summary"] = dict(sorted(content_summary.items()))
+    return MappingProxyType(attributes)
+
+
+def _presence(snapshot, child, picture_urls):
+    """
+    0 = IKKE KOMMET
+    1 = SYG
+    2 = FERIE/FRI
+    3 = KOMMET/TIL STEDE
+    4 = PÅ TUR
+    5 = SOVER
+    8 = HENTET/GÅET
+    """
+    if snapshot.presence.get(str(child["id"])) != 1:
+        return "n/a", MappingProxyType({})
+
+    daily_info = snapshot.daily_overview[str(child["id"])]
+    try:
+        profilePicture = daily_info["institutionProfile"]["profilePicture"]["url"]
+    except:
+        profilePicture = None
+    attributes = {}
+    for attribute in PRESENCE_FIELDS:
+        if attribute == "exitTime" and daily_info[attribute] == "23:59:00":
+            attributes[attribute] = None
+        else:
+            try:
+                attributes[attribute] = datetime.datetime.strptime(
+                    daily_info[attribute], "%H:%M:%S"
+                ).strftime("%H:%M")
+            except:
+                attributes[attribute] = daily_info[attribute]
+    attributes["profilePicture"] = picture_urls.get(
+        daily_info["institutionProfile"]["id"], profilePicture
+    )
+    attributes["institutionProfileId"] = daily_info["institutionProfile"]["id"]
+    return PRESENCE_STATES[daily_info["status"]], MappingProxyType(attributes)
+
+
+@functools.lru_cache(maxsize=8)
+def _lessons_by_child(schedule, use_full_name):
+    """Return child id -> lessons ordered by start for a raw schedule.
+
+    Cached, so a schedule that did not change since the previous refresh, or
+    that is shared with another entry, is only parsed once.
+    """
+    from .calendar import parseCalendarLesson
+
+    if not schedule:
+        return {}
+    try:
+        data = json.loads(schedule)
+    except ValueError:
+        _LOGGER.warning("Could not parse the school schedule!")
+        return {}
+    lessons = {}
+    for c in data.get("data") or ():
+        if c["type"] == "lesson":
+            lessons.setdefault(c["belongsToProfiles"][0], []).append(
+                parseCalendarLesson(c, use_full_name)
+            )
+    return {
+        child_id: tuple(sorted(events, key=lambda lesson: lesson.start))
+        for child_id, events in lessons.items()
+    }
+
+
+def build_child_views(client, use_full_name=False, picture_urls=None):
+    """Return child id -> ChildView for every child of the client.
+
+    use_full_name shows teachers by full name instead of initials in lessons,
+    and picture_urls replaces the Aula URLs of profile pictures, by institution
+    profile id, with those of the local picture cache.
+    """
+    snapshot = client.snapshot
+    lessons = _lessons_by_child(snapshot.schedule, use_full_name)
+    week = datetime.datetime.now().strftime("%G-W%V")
+    reminders = {}
+    for (name, reminder_id), reminder in list(client._reminders.items()):
+        reminders.setdefault(name, {})[reminder_id] = reminder.due_date
+
+    views = {}
+    for child in snapshot.children:
+        first_name = child["name"].split()[0]
+        presence, presence_attributes = _presence(snapshot, child, picture_urls or {})
+
+        ugeplan = {
+            "ugeplan": snapshot.ugep_attr.get(first_name, "Not available"),
+            "ugeplan_next": snapshot.ugepnext_attr.get(first_name, "Not available"),
+        }
+        # Weeks after next, keyed by ISO week, when more look-ahead is configured
+        later_weeks = snapshot.ugep_weeks_attr.get(first_name)
+        if later_weeks:
+            ugeplan["ugeplan_weeks"] = later_weeks
+        if AulaWidgetId.EASYIQ_UGEPLAN in client.widgets:
+            ugeplan["ugeplan_events"] = snapshot.ugep_events.get(
+                first_name, "Not available"
+            )
+            ugeplan["ugeplan_events_next"] = snapshot.ugepnext_events.get(
+                first_name, "Not available"
+            )
+
+        views[child["id"]] = ChildView(
+            child_id=child["id"],
+            first_name=first_name,
+            institution=snapshot.institutions[child["id"]],
+            week=week,
+            presence=presence,
+            presence_attributes=presence_attributes,
+            ugeplan_attributes=content_attributes(ugeplan),
+            mu_opgaver_attributes=content_attributes(
+                {
+                    "mu_opgaver": snapshot.mu_opgaver_attr.get(
+                        first_name, "Min Uddannelse Opgaver not available"
+                    ),
+                    "mu_opgaver_next": snapshot.mu_opgaver_next_attr.get(
+                        first_name, "Not available"
+                    ),
+                }
+            ),
+            huskelisten_count=len(reminders.get(first_name, ())),
+            huskelisten_attributes=content_attributes(
+                {"huskelisten": snapshot.huskeliste.get(first_name, "Not available")}
+            ),
+            lessons=lessons.get(child["id"], ()),
+            reminders=MappingProxyType(reminders.get(first_name, {})),
+        )
+    return views
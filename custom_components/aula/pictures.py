@@ -0,0 +1,185 @@
+"""Local cache of the children's profile pictures, served by a view.
+
+Aula's picture URLs are signed and expire, and every dashboard on every
+device would download them from Aula again. The pictures are instead fetched
+once into a size-bounded directory and served from a stable local URL with
+an ETag, until the picture's URL, without its signature, changes.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from aiohttp import hdrs, web
+from homeassistant.components.http import HomeAssistantView
+
+from .const import (
+    DOMAIN,
+    PROFILE_PICTURE_CACHE_MAX_BYTES,
+    PROFILE_PICTURE_MAX_BYTES,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+PICTURE_URL = "/api/aula/profile_picture/{token}"
+INDEX_FILE = "index.json"
+
+
+def _source(url):
+    """Return url without its query, which holds the expiring signature."""
+    parts = urlsplit(url)
+    return parts.scheme + "://" + parts.netloc + parts.path
+
+
+class ProfilePictureCache:
+    """Pictures by institution profile id, least recently fetched dropped first.
+
+    The local URL of a picture contains a token derived from a secret kept
+    with the cache, so it can be served without authentication, as browsers
+    load it in an img tag, while only users who can read the sensor
+    attributes know the URL.
+    """
+
+    def __init__(self, directory, transport, max_bytes=PROFILE_PICTURE_CACHE_MAX_BYTES):
+        self._directory = directory
+        self._transport = transport
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, INDEX_FILE)) as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            index = {}
+        self._secret = index.get("secret") or secrets.token_hex(16)
+        # Profile id -> source, etag, content type and size, oldest first
+        self._pictures = collections.OrderedDict(index.get("pictures", {}))
+        self._tokens = {self._token(key): key for key in self._pictures}
+
+    def _token(self, key):
+        return hashlib.sha256((self._secret + key).encode()).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self._directory, key)
+
+    def _save_index(self):
+        with open(os.path.join(self._directory, INDEX_FILE), "w") as index_file:
+            json.dump(
+                {"secret": self._secret, "pictures": self._pictures}, index_file
+            )
+
+    def _fetch(self, key, url):
+        response = self._transport.get(url, timeout=30)
+        response.raise_for_status()
+        if len(response.content) > PROFILE_PICTURE_MAX_BYTES:
+            _LOGGER.debug("Profile picture of " + key + " is too large to cache")
+            return False
+        with open(self._path(key), "wb") as picture_file:
+            picture_file.write(response.content)
+        self._pictures.pop(key, None)
+        self._pictures[key] = {
+            "source": _source(url),
+            "etag": '"' + hashlib.sha256(response.content).hexdigest()[:32] + '"',
+            "content_type": response.headers.get("content-type", "image/jpeg")
+            .split(";")[0]
+            .strip(),
+            "size": len(response.content),
+        }
+        self._tokens[self._token(key)] = key
+        while (
+            sum(picture["size"] for picture in self._pictures.values())
+            > self._max_bytes
+        ):
+            evicted, _ = self._pictures.popitem(last=False)
+            self._tokens.pop(self._token(evicted), None)
+            try:
+                os.remove(self._path(evicted))
+            except OSError:
+                pass
+        return key in self._pictures
+
+    def update(self, pictures):
+        """Cache the pictures given as profile id -> Aula URL.
+
+        Returns profile id -> local URL for the pictures in the cache. A
+        picture is only downloaded when its URL changed apart from the
+        signature. Pictures that cannot be cached keep their Aula URL.
+        """
+        urls = {}
+        changed = False
+        with self._lock:
+            for profile_id, url in pictures.items():
+                key = str(profile_id)
+                cached = self._pictures.get(key)
+                if cached is None or cached["source"] != _source(url):
+                    try:
+                        if not self._fetch(key, url):
+                            urls[profile_id] = url
+                            continue
+                    except Exception as err:
+                        _LOGGER.debug(
+                            "Could not fetch the profile picture of " + key + ": " + str(err)
+                        )
+                        urls[profile_id] = url
+                        continue
+                    changed = True
+                urls[profile_id] = PICTURE_URL.format(token=self._token(key))
+            if changed:
+                self._save_index()
+        return urls
+
+    def lookup(self, token):
+        """Return the file path, ETag and content type of a picture, or None."""
+        with self._lock:
+            key = self._tokens.get(token)
+            picture = self._pictures.get(key) if key else None
+            if picture is None:
+                return None
+            return self._path(key), picture["etag"], picture["content_type"]
+
+
+def profile_pictures(snapshot):
+    """Return institution profile id -> Aula picture URL of the present children."""
+    pictures = {}
+    for daily_info in snapshot.daily_overview.values():
+        try:
+            profile = daily_info["institutionProfile"]
+            pictures[profile["id"]] = profile["profilePicture"]["url"]
+        except (KeyError, TypeError):
+            continue
+    return pictures
+
+
+class ProfilePictureView(HomeAssistantView):
+    """Serves the cached profile pictures."""
+
+    url = PICTURE_URL
+    name = "api:aula:profile_picture"
+    requires_auth = False
+
+    async def get(self, request: web.Request, token: str) -> web.StreamResponse:
+        hass = request.app["hass"]
+        cache = hass.data.get(DOMAIN, {}).get("pictures")
+        picture = cache.lookup(token) if cache else None
+        if picture is None:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+        path, etag, content_type = picture
+        headers = {hdrs.ETAG: etag, hdrs.CACHE_CONTROL: "private, max-age=3600"}
+        if request.headers.get(hdrs.IF_NONE_MATCH) == etag:
+            return web.Response(status=HTTPStatus.NOT_MODIFIED, headers=headers)
+        try:
+            body = await hass.async_add_executor_job(_read, path)
+        except OSError:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+        return web.Response(body=body, content_type=content_type, headers=headers)
+
+
+def _read(path):
+    with open(path, "rb") as picture_file:
+        return picture_file.read()
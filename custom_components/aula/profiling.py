@@ -0,0 +1,132 @@
+"""Profiling of a single refresh, for the profile_refresh service.
+
+A RefreshProfile runs one refresh under cProfile, including the fetch jobs
+the refresh submits to the transport's threads, and the refresh records how
+long each of its stages took in a StageTimer. Nothing is logged, so a slow
+refresh can be looked into without turning on debug logging.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import os
+import pstats
+import threading
+import time
+
+_current = contextvars.ContextVar("aula_refresh_profile", default=None)
+
+
+class StageTimer:
+    """Seconds per stage of a refresh, each stage ending where the next starts."""
+
+    def __init__(self):
+        self.stages = {}
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        """End stage, adding to its time if it already ran."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+class RefreshProfile:
+    """The profile of the refresh run by run, merged across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = None
+        self.duration = None
+        # Stage -> seconds, set by the refresh
+        self.stages = {}
+
+    def _add(self, profiler):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    @contextlib.contextmanager
+    def requested(self):
+        """Profile the refresh that is run from this block, see current_profile."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def run(self, func):
+        """Call func under the profiler, in the calling thread, and return its result."""
+        token = _current.set(self)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            return func()
+        finally:
+            profiler.disable()
+            self.duration = time.perf_counter() - start
+            _current.reset(token)
+            self._add(profiler)
+
+    def functions(self, count):
+        """Return the count functions with the most cumulative time, most first."""
+        if self._stats is None:
+            return []
+        rows = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in (
+            self._stats.stats.items()
+        ):
+            if filename == "~":
+                # Built-in functions, such as socket and ssl calls
+                function = name
+            else:
+                # With the directory, as in aula/client.py and http/client.py
+                path = os.path.join(
+                    os.path.basename(os.path.dirname(filename)),
+                    os.path.basename(filename),
+                )
+                function = path + ":" + str(line) + "(" + name + ")"
+            rows.append((cumulative, total, calls, function))
+        rows.sort(reverse=True)
+        return [
+            {
+                "function": function,
+                "calls": calls,
+                "total_time": round(total, 4),
+                "cumulative_time": round(cumulative, 4),
+            }
+            for cumulative, total, calls, function in rows[:count]
+        ]
+
+
+def current_profile():
+    """Return the profile of the refresh running in this context, if any."""
+    return _current.get()
+
+
+def profiled(job):
+    """Return job, profiled as part of the current refresh's profile if any.
+
+    Python 3.12 and later profile all threads from the refresh's profiler
+    and refuse a second one, so then the job runs as is.
+    """
+    profile = _current.get()
+    if profile is None:
+        return job
+
+    def run():
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return job()
+        try:
+            return job()
+        finally:
+            profiler.disable()
+            profile._add(profiler)
+
+    return run
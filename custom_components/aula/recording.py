@@ -0,0 +1,582 @@
+"""Recording of the requests to Aula and the providers, and their replay.
+
+A RecordingAdapter, given to Transport(adapter=...), records the requests of
+every client using the transport, including the login client's, and the
+responses, into an Archive. Tokens and personal data are redacted when the
+archive is saved, as a gzipped file of one JSON exchange per line, which
+happens now and then while recording and when it ends. A ReplayAdapter
+answers the same requests from a saved archive, without the network, so a
+user's slow refresh can be profiled and benchmarked offline.
+
+Names are replaced by pseudonyms that are the same wherever the name occurs,
+as the client matches children across providers by name. The MitID app
+login of mitid_browserclient uses a session of its own and is not recorded.
+"""
+
+import collections
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+_LOGGER = logging.getLogger(__name__)
+
+# Environment variables naming the archive to record to or replay
+RECORD_ENV = "AULA_RECORD"
+REPLAY_ENV = "AULA_REPLAY"
+# Set to replay with the recorded latencies
+REPLAY_DELAY_ENV = "AULA_REPLAY_DELAY"
+
+REDACTED = "REDACTED"
+# Stands in for the values that requests are not matched by on replay
+MATCHED = "*"
+# Response headers kept in the archive
+KEPT_HEADERS = ("content-type", "location")
+# The exchanges a recording keeps, dropping the oldest, about a day of
+# refreshes of one entry, and how often it is saved while recording
+MAX_RECORDED_EXCHANGES = 20000
+SAVE_EVERY_EXCHANGES = 500
+# Query parameters, JSON keys and form fields whose values are always redacted
+SECRET_PATTERN = re.compile(
+    r"token|password|secret|csrf|cookie|saml|relaystate|nonce|code_verifier"
+    r"|code_challenge|assertion|ticket|email|phone|cpr|ssn|street",
+    re.IGNORECASE,
+)
+# The OAuth parameters of the login, redacted in query strings and forms only,
+# as Aula's JSON has a status code
+OAUTH_PARAMS = frozenset({"code", "state", "session_state"})
+# JSON keys whose values are names, replaced word by word by pseudonyms
+NAME_KEYS = frozenset(
+    {
+        "name",
+        "fullName",
+        "firstName",
+        "lastName",
+        "shortName",
+        "displayName",
+        "navn",
+        "kuvertnavn",
+        "userName",
+        "mainGroup",
+        "institutionName",
+    }
+)
+# Query parameters and JSON keys identifying the guardian or a child, such as
+# the MitID username, replaced as a whole by pseudonyms
+IDENTITY_KEYS = frozenset({"userId", "sessionId", "sessionUUID"})
+# Dates and ISO weeks, matched on replay by their distance from the day of the
+# request, as the client asks for today's calendar, reminders and weekly plans
+DATE_PATTERN = re.compile(r"(?<!\d)(\d{4})-(?:(\d{2})-(\d{2})|W(\d{2}))(?!\d)")
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+INPUT_PATTERN = re.compile(r"<input\b[^>]*>", re.IGNORECASE)
+INPUT_NAME_PATTERN = re.compile(r'\b(?:name|id)="([^"]*)"', re.IGNORECASE)
+INPUT_VALUE_PATTERN = re.compile(r'(\bvalue=")[^"]*(")', re.IGNORECASE)
+
+
+def _is_secret(key):
+    return bool(SECRET_PATTERN.search(key))
+
+
+def _redact_params(params):
+    return [
+        (key, REDACTED if key in OAUTH_PARAMS or _is_secret(key) else value)
+        for key, value in params
+    ]
+
+
+def _redact_url(url):
+    """Return url with the values of its secret query parameters redacted."""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = _redact_params(parse_qsl(parts.query, keep_blank_values=True))
+    return urlunsplit(parts._replace(query=urlencode(query, safe="[],")))
+
+
+def _body_text(body):
+    if isinstance(body, bytes):
+        return body.decode("utf-8", "replace")
+    return body or ""
+
+
+def _today():
+    return datetime.datetime.now().date()
+
+
+def _match_dates(text, day):
+    """Return text with its dates and ISO weeks relative to day."""
+
+    def relative(match):
+        year, month, mday, week = match.groups()
+        try:
+            if week:
+                monday = datetime.date.fromisocalendar(int(year), int(week), 1)
+                this_monday = day - datetime.timedelta(days=day.weekday())
+                return "week" + str((monday - this_monday).days // 7)
+            date = datetime.date(int(year), int(month), int(mday))
+        except ValueError:
+            return match.group()
+        return "day" + str((date - day).days)
+
+    return DATE_PATTERN.sub(relative, text)
+
+
+def _match_url(url, day):
+    """Return url as it is matched on replay, see ReplayAdapter."""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [
+        (key, MATCHED if key in IDENTITY_KEYS else _match_dates(value, day))
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query, safe="[],")))
+
+
+def _match_json(value):
+    if isinstance(value, dict):
+        return {
+            key: MATCHED if key in IDENTITY_KEYS else _match_json(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_match_json(item) for item in value]
+    return value
+
+
+def _body_key(body, day):
+    """Return a short hash of a request body made on day, as it is matched on replay.
+
+    Secrets are redacted, ids, which are pseudonyms in the archive, left out
+    and dates made relative to day.
+    """
+    body = _body_text(body)
+    if not body:
+        return ""
+    try:
+        body = _match_dates(
+            json.dumps(_match_json(_redact_json(json.loads(body))), sort_keys=True),
+            day,
+        )
+    except ValueError:
+        if "=" in body and " " not in body:
+            # A form, such as the SAML responses of the login
+            body = urlencode(_redact_params(parse_qsl(body, keep_blank_values=True)))
+    return hashlib.sha256(body.encode()).hexdigest()[:16]
+
+
+def _redact_json(value):
+    if isinstance(value, dict):
+        return {
+            key: REDACTED
+            if _is_secret(key) and isinstance(value[key], (str, int))
+            else _redact_json(value[key])
+            for key in value
+        }
+    if isinstance(value, list):
+        return [_redact_json(item) for item in value]
+    return value
+
+
+class Exchange:
+    """A request and the response to it, as recorded."""
+
+    __slots__ = (
+        "method",
+        "url",
+        "body",
+        "status",
+        "headers",
+        "content",
+        "elapsed",
+        "day",
+    )
+
+    def __init__(self, method, url, body, status, headers, content, elapsed, day=None):
+        self.method = method
+        self.url = url
+        # The request body when recorded, its hash in a redacted archive
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.elapsed = elapsed
+        # The day the request was made, which its dates are matched relative to
+        self.day = day or _today()
+
+
+class Archive:
+    """The exchanges of a recording, in the order they were made.
+
+    With max_exchanges, only the latest max_exchanges exchanges are kept.
+    """
+
+    def __init__(self, exchanges=(), max_exchanges=None):
+        self.exchanges = collections.deque(exchanges, max_exchanges)
+        self._lock = threading.Lock()
+
+    def add(self, exchange):
+        with self._lock:
+            self.exchanges.append(exchange)
+
+    def redacted(self):
+        """Return a copy with tokens and personal data redacted."""
+        with self._lock:
+            exchanges = list(self.exchanges)
+        pseudonyms = _Pseudonyms()
+        bodies = [_parse(exchange) for exchange in exchanges]
+        for exchange, body in zip(exchanges, bodies):
+            pseudonyms.collect_url(exchange.url)
+            pseudonyms.collect_request(_body_text(exchange.body))
+            if isinstance(body, (dict, list)):
+                pseudonyms.collect(body)
+        redacted = []
+        for exchange, body in zip(exchanges, bodies):
+            if isinstance(body, (dict, list)):
+                body = pseudonyms.replace(_redact_json(_redact_token_data(exchange, body)))
+                content = json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+            elif isinstance(body, str):
+                content = pseudonyms.replace(_redact_html(body))
+            else:
+                # Binary responses are the children's profile pictures
+                content = ""
+            redacted.append(
+                Exchange(
+                    exchange.method,
+                    pseudonyms.replace_url(_redact_url(exchange.url)),
+                    _body_key(
+                        pseudonyms.replace(_body_text(exchange.body)), exchange.day
+                    ),
+                    exchange.status,
+                    {
+                        name: pseudonyms.replace_url(_redact_url(value))
+                        if name == "location"
+                        else value
+                        for name, value in exchange.headers.items()
+                    },
+                    content,
+                    exchange.elapsed,
+                    exchange.day,
+                )
+            )
+        return Archive(redacted)
+
+    def save(self, path):
+        """Redact the archive and write it to path, replacing it in one go."""
+        partial = str(path) + ".partial"
+        with gzip.open(partial, "wt", encoding="utf-8") as archive_file:
+            for exchange in self.redacted().exchanges:
+                record = {
+                    "method": exchange.method,
+                    "url": exchange.url,
+                    "body": exchange.body,
+                    "status": exchange.status,
+                    "headers": exchange.headers,
+                    "elapsed": exchange.elapsed,
+                    "content": exchange.content,
+                    "day": exchange.day.isoformat(),
+                }
+                archive_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        """Return the archive saved to path."""
+        exchanges = []
+        with gzip.open(path, "rt", encoding="utf-8") as archive_file:
+            for line in archive_file:
+                record = json.loads(line)
+                exchanges.append(
+                    Exchange(
+                        record["method"],
+                        record["url"],
+                        record["body"],
+                        record["status"],
+                        record["headers"],
+                        record["content"],
+                        record["elapsed"],
+                        datetime.date.fromisoformat(record["day"]),
+                    )
+                )
+        return cls(exchanges)
+
+
+def _parse(exchange):
+    """Return the content as JSON if it is, else as text if it is, else bytes."""
+    content = exchange.content
+    if isinstance(content, bytes):
+        try:
+            content = content.decode("utf-8")
+        except UnicodeDecodeError:
+            return content
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content
+
+
+def _redact_token_data(exchange, body):
+    """Redact the data of Aula methods answering with a bare token."""
+    method = dict(parse_qsl(urlsplit(exchange.url).query)).get("method", "")
+    if _is_secret(method) and isinstance(body, dict) and "data" in body:
+        return {**body, "data": REDACTED}
+    return body
+
+
+def _redact_html(text):
+    """Redact e-mail addresses, and the values of secret form fields."""
+
+    def redact_input(match):
+        tag = match.group(0)
+        name = INPUT_NAME_PATTERN.search(tag)
+        if name and (name.group(1) in OAUTH_PARAMS or _is_secret(name.group(1))):
+            return INPUT_VALUE_PATTERN.sub(r"\1" + REDACTED + r"\2", tag)
+        return tag
+
+    return INPUT_PATTERN.sub(redact_input, EMAIL_PATTERN.sub(REDACTED, text))
+
+
+class _Pseudonyms:
+    """The same pseudonym for every occurrence of a word of a name or an id."""
+
+    def __init__(self):
+        self._words = {}
+        self._identities = 0
+        self._pattern = None
+
+    def _identity(self, value):
+        if value and value not in self._words:
+            self._identities += 1
+            # Numeric ids stay numeric
+            self._words[value] = (
+                str(900000000 + self._identities)
+                if value.isdigit()
+                else "bruger" + str(self._identities)
+            )
+            self._pattern = None
+
+    def collect(self, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key in NAME_KEYS and isinstance(item, str):
+                    for word in re.findall(r"\w{2,}", item):
+                        if word not in self._words:
+                            self._words[word] = "Navn" + str(len(self._words) + 1)
+                elif key in IDENTITY_KEYS and isinstance(item, str):
+                    self._identity(item)
+                else:
+                    self.collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                self.collect(item)
+        self._pattern = None
+
+    def collect_url(self, url):
+        for key, value in parse_qsl(urlsplit(url).query, keep_blank_values=True):
+            if key in IDENTITY_KEYS:
+                self._identity(value)
+
+    def collect_request(self, body):
+        """Collect the ids in a JSON request body."""
+        try:
+            self.collect(json.loads(body))
+        except ValueError:
+            pass
+
+    def _replace_text(self, text):
+        if not self._words:
+            return text
+        if self._pattern is None:
+            # Longest first, so a word is not replaced by part of another
+            words = sorted(self._words, key=len, reverse=True)
+            self._pattern = re.compile(
+                r"\b(" + "|".join(map(re.escape, words)) + r")\b"
+            )
+        return EMAIL_PATTERN.sub(
+            REDACTED, self._pattern.sub(lambda m: self._words[m.group(1)], text)
+        )
+
+    def replace(self, value):
+        if isinstance(value, str):
+            return self._replace_text(value)
+        if isinstance(value, dict):
+            return {key: self.replace(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.replace(item) for item in value]
+        return value
+
+    def replace_url(self, url):
+        parts = urlsplit(url)
+        if not parts.query:
+            return url
+        query = [
+            (key, self._replace_text(value))
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        ]
+        return urlunsplit(parts._replace(query=urlencode(query, safe="[],")))
+
+
+def _recorded_content(response):
+    """Return the content of response to record, empty for a binary one.
+
+    Binary content is the children's profile pictures, which are left out of
+    the archive anyway, so they are not kept in memory until it is saved.
+    """
+    content = response.content
+    if response.headers.get("content-type", "").startswith("image/"):
+        return b""
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        return b""
+    return content
+
+
+class RecordingAdapter(BaseAdapter):
+    """Sends requests through adapter and records them.
+
+    The archive keeps the latest MAX_RECORDED_EXCHANGES exchanges, and is
+    saved to path every SAVE_EVERY_EXCHANGES exchanges and on close, so a
+    crash loses at most the exchanges since the last save.
+    """
+
+    def __init__(self, path=None, adapter=None, max_exchanges=MAX_RECORDED_EXCHANGES):
+        super().__init__()
+        self.archive = Archive(max_exchanges=max_exchanges)
+        self._path = path
+        self._adapter = adapter or HTTPAdapter()
+        self._recorded = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        url = request.url
+        started = time.monotonic()
+        response = self._adapter.send(request, **kwargs)
+        # Reads streamed responses too, which are then kept in memory
+        self.archive.add(
+            Exchange(
+                request.method,
+                url,
+                request.body,
+                response.status_code,
+                {
+                    name: response.headers[name]
+                    for name in KEPT_HEADERS
+                    if name in response.headers
+                },
+                _recorded_content(response),
+                round(time.monotonic() - started, 3),
+            )
+        )
+        with self._lock:
+            self._recorded += 1
+            due = self._recorded % SAVE_EVERY_EXCHANGES == 0
+        if due:
+            self.save()
+        return response
+
+    def save(self):
+        with self._save_lock:
+            if self._path:
+                self.archive.save(self._path)
+
+    def close(self):
+        self.save()
+        # Saved once, not again by a later save of a closed transport
+        self._path = None
+        self._adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answers requests with the responses recorded in archive, in order.
+
+    Requests are matched by method, redacted URL and request body, apart
+    from the ids of the guardian and children, as the replaying client
+    sends its own MitID username rather than the pseudonym, and with dates
+    and ISO weeks relative to the day, so an archive replays on any later
+    day. The calendar, which asks for UTC dates, finds no response if it was
+    recorded or is replayed near midnight, when the UTC and local dates
+    differ. Repeated requests get the recorded responses in turn, and the
+    last one after that, so a refresh can be replayed several times. With
+    delay, every response takes as long as it did when recorded.
+    """
+
+    def __init__(self, archive, delay=False):
+        super().__init__()
+        self._delay = delay
+        self._lock = threading.Lock()
+        self._responses = collections.defaultdict(collections.deque)
+        for exchange in archive.exchanges:
+            key = (
+                exchange.method,
+                _match_url(exchange.url, exchange.day),
+                exchange.body,
+            )
+            self._responses[key].append(exchange)
+
+    def send(self, request, **kwargs):
+        today = _today()
+        key = (
+            request.method,
+            _match_url(_redact_url(request.url), today),
+            _body_key(request.body, today),
+        )
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                raise requests.ConnectionError(
+                    "No recorded response to " + request.method + " " + key[1],
+                    request=request,
+                )
+            exchange = responses.popleft() if len(responses) > 1 else responses[0]
+        if self._delay:
+            time.sleep(exchange.elapsed)
+        content = exchange.content
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        response = requests.Response()
+        response.status_code = exchange.status
+        response.headers = CaseInsensitiveDict(exchange.headers)
+        response.encoding = get_encoding_from_headers(response.headers) or "utf-8"
+        response.raw = io.BytesIO(content)
+        response._content = content
+        response.url = request.url
+        response.request = request
+        try:
+            response.reason = HTTPStatus(exchange.status).phrase
+        except ValueError:
+            response.reason = ""
+        return response
+
+    def close(self):
+        pass
+
+
+def adapter_from_environment(environ=os.environ):
+    """Return a replaying or recording adapter if the environment asks for one.
+
+    Reads the archive to replay, so call it from the executor.
+    """
+    if environ.get(REPLAY_ENV):
+        _LOGGER.warning("Replaying the requests to Aula from " + environ[REPLAY_ENV])
+        return ReplayAdapter(
+            Archive.load(environ[REPLAY_ENV]), delay=bool(environ.get(REPLAY_DELAY_ENV))
+        )
+    if environ.get(RECORD_ENV):
+        _LOGGER.warning("Recording the requests to Aula to " + environ[RECORD_ENV])
+        return RecordingAdapter(environ[RECORD_ENV])
+    return None
@@ -0,0 +1,232 @@
+"""HTML rendering of weekly plans, assignments and reminders.
+
+The renderers build their output from a list of fragments joined once, and
+the ones rendering whole plans are memoized by a hash of their input, so an
+unchanged plan is only rendered once no matter how often it is fetched.
+HTML written by teachers is passed through sanitize_html before it is stored.
+"""
+
+import datetime
+import functools
+import hashlib
+import json
+import logging
+import re
+
+from bs4 import BeautifulSoup, Comment
+
+from .cache import TTLCache
+from .const import RENDER_CACHE_MAX_ENTRIES
+
+_LOGGER = logging.getLogger(__name__)
+
+EASYIQ_DATETIME_FORMAT = "%Y/%m/%d %H:%M"
+WEEKDAYS = ["Mandag", "Tirsdag", "Onsdag", "Torsdag", "Fredag", "Lørdag", "Søndag"]
+# "1." at the start of a line would otherwise become a markdown list
+_NUMBERED = re.compile(r"([0-9]+)(\.)")
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+_LINE_BREAKS = re.compile(r" ?\n\s*")
+# The end of a truncated entity and word
+_PARTIAL_ENTITY = re.compile(r"&#?\w*$")
+_PARTIAL_WORD = re.compile(r"[^\s>]+$")
+
+# Markup the markdown card renders, other tags are replaced by their content
+ALLOWED_TAGS = frozenset(
+    {
+        "a", "b", "blockquote", "br", "div", "em", "h1", "h2", "h3", "h4", "h5",
+        "h6", "hr", "i", "img", "li", "ol", "p", "pre", "s", "span", "strong",
+        "sub", "sup", "table", "tbody", "td", "th", "thead", "tr", "u", "ul",
+    }
+)
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+# Removed together with their content
+DROPPED_TAGS = ["script", "style", "meta", "link", "noscript", "iframe", "object"]
+# Removed when they contain neither text nor an image or line break
+DROPPED_WHEN_EMPTY = frozenset({"a", "b", "div", "em", "i", "p", "span", "strong", "u"})
+
+
+def escape_numbering(text):
+    """Escape numbers followed by a dot, so markdown renders them as text."""
+    return _NUMBERED.sub(r"\1\.", text)
+
+
+def content_hash(*args):
+    """Return a stable hash of JSON serializable arguments."""
+    return hashlib.sha1(
+        json.dumps(args, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def memoize_by_content(func):
+    """Cache a renderer's output by a hash of its arguments."""
+    cache = TTLCache(max_entries=RENDER_CACHE_MAX_ENTRIES)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = content_hash(*args, kwargs)
+        html = cache.get(key)
+        if html is None:
+            html = func(*args, **kwargs)
+            cache.set(key, html)
+        return html
+
+    wrapper.cache = cache
+    return wrapper
+
+
+def minify_text(text):
+    """Collapse runs of whitespace, keeping line breaks and paragraph breaks."""
+    return _LINE_BREAKS.sub(
+        lambda match: "\n\n" if match.group().count("\n") > 1 else "\n",
+        _SPACES.sub(" ", text),
+    )
+
+
+@memoize_by_content
+def sanitize_html(html, escape_numbers=False):
+    """Strip styling, scripts, tracking pixels and empty elements from html.
+
+    Only tags and attributes the markdown card renders are kept, and whitespace
+    is collapsed. Plain text is only minified. With escape_numbers, numbering
+    in the text is escaped, see escape_numbering, leaving the markup and its
+    URLs as they are.
+    """
+    if "<" not in html:
+        text = minify_text(html)
+        return escape_numbering(text) if escape_numbers else text
+    soup = BeautifulSoup(html, "html.parser")
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    for tag in soup.find_all(DROPPED_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.name not in ALLOWED_TAGS:
+            tag.unwrap()
+            continue
+        allowed = ALLOWED_ATTRIBUTES.get(tag.name, ())
+        tag.attrs = {name: value for name, value in tag.attrs.items() if name in allowed}
+        if tag.name == "img" and "1" in (tag.get("width"), tag.get("height")):
+            tag.decompose()
+    # Children come after their parent, so reversed visits the innermost first
+    for tag in reversed(soup.find_all(DROPPED_WHEN_EMPTY)):
+        if not tag.get_text(strip=True) and tag.find(["img", "br"]) is None:
+            tag.decompose()
+    for text in soup.find_all(string=True):
+        if text.parent.name != "pre":
+            minified = minify_text(text)
+            text.replace_with(escape_numbering(minified) if escape_numbers else minified)
+    return str(soup).strip()
+
+
+@memoize_by_content
+def render_mu_opgaver(opgaver):
+    """Render a child's assignments from Min Uddannelse."""
+    parts = []
+    for opgave in opgaver:
+        parts.append("<h2>" + opgave["title"] + "</h2>")
+        parts.append("<h3>" + opgave["kuvertnavn"] + "</h3>")
+        parts.append("Ugedag: " + opgave["ugedag"] + "<br>")
+        parts.append("Type: " + opgave["opgaveType"] + "<br>")
+        for hold in opgave["hold"]:
+            parts.append("Hold: " + hold["navn"] + "<br>")
+        try:
+            parts.append("Forløb: " + opgave["forloeb"]["navn"])
+        except (KeyError, TypeError):
+            _LOGGER.debug("Did not find forloeb key: " + str(opgave))
+    return "".join(parts)
+
+
+@memoize_by_content
+def render_easyiq_weekplan(week, events):
+    """Render a child's week from the old EasyIQ weekplaninfo events."""
+    parts = ["<h2> Uge " + week.split("-W")[1] + "</h2>"]
+    try:
+        for event in events:
+            try:
+                start = datetime.datetime.strptime(
+                    event["start"], EASYIQ_DATETIME_FORMAT
+                )
+            except ValueError:
+                _LOGGER.debug("Could not parse timestamp: " + str(event["start"]))
+                continue
+            end = datetime.datetime.strptime(event["end"], EASYIQ_DATETIME_FORMAT)
+            if start.date() == end.date():
+                when = (
+                    f"{WEEKDAYS[start.weekday()]} "
+                    f"{start.strftime(' %H:%M')} {end.strftime('- %H:%M')}"
+                )
+            else:
+                when = f"{WEEKDAYS[start.weekday()]} {WEEKDAYS[end.weekday()]}"
+            parts.append("<br><b>" + when + "</b><br>")
+            if event["itemType"] == "5":
+                parts.append("<br><b>" + str(event["title"]) + "</b><br>")
+            else:
+                parts.append("<br><b>" + str(event["ownername"]) + "</b><br>")
+            parts.append(sanitize_html(str(event["description"])) + "<br>")
+    except KeyError:
+        _LOGGER.debug("None")
+    return "".join(parts)
+
+
+@memoize_by_content
+def render_meebook_weekplan(week_plan):
+    """Render a child's weekPlan from Meebook."""
+    parts = []
+    for day in week_plan:
+        parts.append("<h3>" + day["date"] + "</h3>")
+        if not day["tasks"]:
+            parts.append("-")
+            continue
+        for task in day["tasks"]:
+            if not task["pill"] == "Ingen fag tilknyttet":
+                parts.append("<b>" + task["pill"] + "</b><br>")
+            author = task.get("author")
+            if author:
+                parts.append(author + "<br><br>")
+            if task["type"] == "comment" or task["type"] == "task":
+                parts.append(
+                    sanitize_html(task["content"], escape_numbers=True) + "<br><br>"
+                )
+            elif task["type"] == "assignment":
+                parts.append(escape_numbering(task["title"]) + "<br><br>")
+    return "".join(parts)
+
+
+def truncate_html(html, max_length):
+    """Cap html at about max_length characters, marking that it was cut.
+
+    The cut is moved back out of a tag, an entity or a word, and the tags
+    still open there are closed, so the markdown card renders what is left.
+    """
+    if len(html) <= max_length:
+        return html
+    cut = html[:max_length]
+    start = cut.rfind("<")
+    if start > cut.rfind(">"):
+        cut = cut[:start]
+    cut = _PARTIAL_ENTITY.sub("", cut)
+    if html[len(cut)] not in "< \t\r\n":
+        cut = _PARTIAL_WORD.sub("", cut)
+    return str(BeautifulSoup(cut.rstrip(), "html.parser")) + " …"
+
+
+def render_huskelisten_reminder(reminder, due_date):
+    """Render a single Huskelisten team reminder due at the local due_date."""
+    return "".join(
+        (
+            "<h3>",
+            due_date.strftime("%A %d. %B"),
+            "</h3><b>",
+            reminder.get("subjectName") or "",
+            "</b><br>af ",
+            reminder["createdBy"],
+            "<br><br>",
+            escape_numbering(reminder["reminderText"]),
+            "<br><br>",
+        )
+    )
@@ -1,8 +1,13 @@
-from .const import DOMAIN, AulaWidgetId
+from .const import DOMAIN
+from .coordinator import async_profile_refresh
+from .entity import async_entry_unique_id
+from .model import CONTENT_ATTRIBUTES
 import logging
-from datetime import datetime, timedelta
-from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant import config_entries, core
 from homeassistant.helpers import entity_platform
 
@@ -12,6 +17,7 @@ from homeassistant.core import (
     ServiceCall,
     ServiceResponse,
     SupportsResponse,
+    callback,
 )
 import homeassistant.helpers.config_validation as cv
 
@@ -33,6 +39,16 @@ API_CALL_SCHEMA = vol.Schema(
     {
         vol.Required("uri"): cv.string,
         vol.Optional("post_data"): cv.string,
+        vol.Optional("config_entry_id"): cv.string,
+    }
+)
+PROFILE_REFRESH_SERVICE_NAME = "profile_refresh"
+PROFILE_REFRESH_SCHEMA = vol.Schema(
+    {
+        vol.Optional("config_entry_id"): cv.string,
+        vol.Optional("functions", default=25): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=200)
+        ),
     }
 )
 
@@ -57,59 +73,75 @@ async def async_setup_entry(
     mitid_identity = config.get(CONF_MITID_IDENTITY, 1)
     stored_tokens = config.get("stored_tokens")
 
-    client = hass.data[DOMAIN]["client"]
-
-    async def async_update_data():
-        await hass.async_add_executor_job(client.update_data)
-
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name="sensor",
-        update_method=async_update_data,
-        update_interval=timedelta(minutes=5),
-    )
-
-    # Immediate refresh
-    await coordinator.async_request_refresh()
+    client = config["client"]
+    # Refreshed for the first time when the entry was set up
+    coordinator = config["coordinator"]
 
     entities = []
     # Ensure data is updated before creating entities
-    # (coordinator refresh above handles this, but we need data for entity creation loop)
-    if not client.presence:
-        await hass.async_add_executor_job(client.update_data)
-
-    for i, child in enumerate(client._children):
-        # _LOGGER.debug("Presence data for child "+str(child["id"])+" : "+str(client.presence[str(child["id"])]))
-        if client.presence[str(child["id"])] == 1:
-            if str(child["id"]) in client._daily_overview:
+    if not client.snapshot.presence or coordinator.data is None:
+        await coordinator.async_refresh()
+
+    def child_sensor(sensor, child_id):
+        unique_id = async_entry_unique_id(
+            hass, "sensor", config_entry, "aula" + str(child_id) + sensor._key
+        )
+        return sensor(coordinator, child_id, unique_id)
+
+    snapshot = client.snapshot
+    for i, child in enumerate(snapshot.children):
+        # _LOGGER.debug("Presence data for child "+str(child["id"])+" : "+str(snapshot.presence[str(child["id"])]))
+        if snapshot.presence[str(child["id"])] == 1:
+            if str(child["id"]) in snapshot.daily_overview:
                 _LOGGER.debug(
                     "Found presence data for childid "
                     + str(child["id"])
                     + " adding sensor entity."
                 )
-                entities.append(AulaSensor(hass, coordinator, child))
+                entities.append(child_sensor(AulaPresenceSensor, child["id"]))
         else:
-            entities.append(AulaSensor(hass, coordinator, child))
+            entities.append(child_sensor(AulaPresenceSensor, child["id"]))
+        if config.get(CONF_MU_OPGAVER, True):
+            entities.append(child_sensor(AulaMuOpgaverSensor, child["id"]))
+        if config[CONF_UGEPLAN]:
+            entities.append(child_sensor(AulaUgeplanSensor, child["id"]))
+            if "0062" in client.widgets:
+                entities.append(child_sensor(AulaHuskelistenSensor, child["id"]))
+    entities.extend(
+        sensor(coordinator, client, config_entry)
+        for sensor in (
+            AulaRequestsSensor,
+            AulaRequestErrorsSensor,
+            AulaRequestLatencySensor,
+        )
+    )
     # We have data and can now set up the calendar platform:
     if config[CONF_SCHOOLSCHEDULE]:
         hass.async_create_task(
             hass.config_entries.async_forward_entry_setups(config_entry, ["calendar"])
         )
 
-    global ugeplan
-    global mu_opgaver
-    if config[CONF_UGEPLAN]:
-        ugeplan = True
-    else:
-        ugeplan = False
-    if config.get(CONF_MU_OPGAVER, True):
-        mu_opgaver = True
-    else:
-        mu_opgaver = False
-    async_add_entities(entities, update_before_add=True)
+    async_add_entities(entities)
+
+    def service_entry(call: ServiceCall) -> dict:
+        """Return the runtime data of the entry a service call is for."""
+        from . import loaded_entries
+
+        entries = loaded_entries(hass)
+        if "config_entry_id" in call.data:
+            if call.data["config_entry_id"] not in entries:
+                raise HomeAssistantError(
+                    "No loaded Aula entry " + call.data["config_entry_id"]
+                )
+            return entries[call.data["config_entry_id"]]
+        if len(entries) == 1:
+            return next(iter(entries.values()))
+        raise HomeAssistantError(
+            "Several Aula accounts are set up, choose one with config_entry_id"
+        )
 
     def custom_api_call_service(call: ServiceCall) -> ServiceResponse:
+        client = service_entry(call)["client"]
         if "post_data" in call.data and len(call.data["post_data"]) > 0:
             data = client.custom_api_call(call.data["uri"], call.data["post_data"])
         else:
@@ -124,192 +156,162 @@ async def async_setup_entry(
         supports_response=SupportsResponse.ONLY,
     )
 
+    async def profile_refresh_service(call: ServiceCall) -> ServiceResponse:
+        return await async_profile_refresh(
+            service_entry(call)["coordinator"], call.data["functions"]
+        )
 
-class AulaSensor(Entity):
-    def __init__(self, hass, coordinator, child) -> None:
-        self._hass = hass
-        self._coordinator = coordinator
-        self._child = child
-        self._client = hass.data[DOMAIN]["client"]
-
-    @property
-    def name(self):
-        childname = self._client._childnames[self._child["id"]].split()[0]
-        institution = self._client._institutions[self._child["id"]]
-        return institution + " " + childname
-
-    @property
-    def state(self):
-        """
-        0 = IKKE KOMMET
-        1 = SYG
-        2 = FERIE/FRI
-        3 = KOMMET/TIL STEDE
-        4 = PÅ TUR
-        5 = SOVER
-        8 = HENTET/GÅET
-        """
-        if self._client.presence[str(self._child["id"])] == 1:
-            states = [
-                "Ikke kommet",
-                "Syg",
-                "Ferie/Fri",
-                "Kommet/Til stede",
-                "På tur",
-                "Sover",
-                "6",
-                "7",
-                "Gået",
-                "9",
-                "10",
-                "11",
-                "12",
-                "13",
-                "14",
-                "15",
-            ]
-            daily_info = self._client._daily_overview[str(self._child["id"])]
-            return states[daily_info["status"]]
-        else:
-            _LOGGER.debug("Setting state to n/a for child " + str(self._child["id"]))
-            return "n/a"
-
-    @property
-    def extra_state_attributes(self):
-        if self._client.presence[str(self._child["id"])] == 1:
-            daily_info = self._client._daily_overview[str(self._child["id"])]
-            try:
-                profilePicture = daily_info["institutionProfile"]["profilePicture"][
-                    "url"
-                ]
-            except:
-                profilePicture = None
-
-        fields = [
-            "location",
-            "sleepIntervals",
-            "checkInTime",
-            "checkOutTime",
-            "activityType",
-            "entryTime",
-            "exitTime",
-            "exitWith",
-            "comment",
-            "spareTimeActivity",
-            "selfDeciderStartTime",
-            "selfDeciderEndTime",
-        ]
-        attributes = {}
-        # _LOGGER.debug("Dump of ugep_attr: "+str(self._client.ugep_attr))
-        # _LOGGER.debug("Dump of ugepnext_attr: "+str(self._client.ugepnext_attr))
-        if mu_opgaver:
-            #
-            try:
-                attributes["mu_opgaver"] = self._client.mu_opgaver_attr[
-                    self._child["name"].split()[0]
-                ]
-            except:
-                attributes["mu_opgaver"] = "Min Uddannelse Opgaver not available"
-            try:
-                attributes["mu_opgaver_next"] = self._client.mu_opgavernext_attr[
-                    self._child["name"].split()[0]
-                ]
-            except:
-                attributes["mu_opgaver_next"] = "Not available"
-                _LOGGER.debug(
-                    "Could not get Min Uddannelse Opgaver for next week for child "
-                    + str(self._child["name"].split()[0])
-                    + ". Perhaps not available yet."
-                )
-        if ugeplan:
-            if "0062" in self._client.widgets:
-                try:
-                    attributes["huskelisten"] = self._client.huskeliste[
-                        self._child["name"].split()[0]
-                    ]
-                except:
-                    attributes["huskelisten"] = "Not available"
-
-            try:
-                attributes["ugeplan"] = self._client.ugep_attr[
-                    self._child["name"].split()[0]
-                ]
-            except:
-                attributes["ugeplan"] = "Not available"
-
-            try:
-                attributes["ugeplan_next"] = self._client.ugepnext_attr[
-                    self._child["name"].split()[0]
-                ]
-            except:
-                attributes["ugeplan_next"] = "Not available"
-                _LOGGER.debug(
-                    "Could not get ugeplan for next week for child "
-                    + str(self._child["name"].split()[0])
-                    + ". Perhaps not available yet."
-                )
+    hass.services.async_register(
+        DOMAIN,
+        PROFILE_REFRESH_SERVICE_NAME,
+        profile_refresh_service,
+        schema=PROFILE_REFRESH_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+
+class AulaChildSensor(CoordinatorEntity, SensorEntity):
+    """Base for the sensors of one child, grouped under a device per child.
+
+    Every sensor shows one part of the child's ChildView, which the coordinator
+    builds after each refresh, named by _value and _attributes. The state is
+    only written when that part changed, so new presence data does not write
+    the weekly plans again and vice versa.
+    """
+
+    _attr_has_entity_name = True
+    # ChildView fields of the state and of the state attributes
+    _value = "week"
+    _attributes: str
+    # Follows "aula" and the child id in the unique id
+    _key = ""
+
+    def __init__(self, coordinator, child_id, unique_id) -> None:
+        super().__init__(coordinator)
+        self._child_id = child_id
+        self._attr_unique_id = unique_id
+        view = coordinator.data[child_id]
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, str(child_id))},
+            name=view.institution + " " + view.first_name,
+            manufacturer="Aula",
+            model=view.institution,
+        )
+        self._apply(view)
+
+    def _apply(self, view):
+        self._attr_native_value = getattr(view, self._value)
+        self._attr_extra_state_attributes = getattr(view, self._attributes)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        previous = (
+            self.available,
+            self._attr_native_value,
+            self._attr_extra_state_attributes,
+        )
+        view = self.coordinator.data.get(self._child_id)
+        if view is not None:
+            self._apply(view)
+        if (
+            self.available,
+            self._attr_native_value,
+            self._attr_extra_state_attributes,
+        ) != previous:
+            self.async_write_ha_state()
+
+
+class AulaPresenceSensor(AulaChildSensor):
+    """Presence of a child, named after the device like the sensor it replaces."""
+
+    _attr_name = None
+    _attr_icon = "mdi:account-school"
+    _value = "presence"
+    _attributes = "presence_attributes"
+
+
+class AulaUgeplanSensor(AulaChildSensor):
+    """Weekly plans of a child, the state is the ISO week of the current plan."""
+
+    _attr_name = "Ugeplan"
+    _attr_icon = "mdi:notebook-outline"
+    _unrecorded_attributes = CONTENT_ATTRIBUTES
+    _attributes = "ugeplan_attributes"
+    _key = "_ugeplan"
+
+
+class AulaMuOpgaverSensor(AulaChildSensor):
+    """Min Uddannelse assignments of a child, the state is the current ISO week."""
+
+    _attr_name = "MU opgaver"
+    _attr_icon = "mdi:clipboard-text-outline"
+    _unrecorded_attributes = CONTENT_ATTRIBUTES
+    _attributes = "mu_opgaver_attributes"
+    _key = "_mu_opgaver"
+
+
+class AulaHuskelistenSensor(AulaChildSensor):
+    """Huskelisten reminders of a child, the state is the number of reminders."""
+
+    _attr_name = "Huskelisten"
+    _attr_icon = "mdi:bell-outline"
+    _unrecorded_attributes = CONTENT_ATTRIBUTES
+    _value = "huskelisten_count"
+    _attributes = "huskelisten_attributes"
+    _key = "_huskelisten"
 
-            if AulaWidgetId.EASYIQ_UGEPLAN in self._client.widgets:
-                try:
-                    attributes["ugeplan_events"] = self._client.ugep_events[
-                        self._child["name"].split()[0]
-                    ]
-                except:
-                    attributes["ugeplan_events"] = "Not available"
-
-                try:
-                    attributes["ugeplan_events_next"] = self._client.ugepnext_events[
-                        self._child["name"].split()[0]
-                    ]
-                except:
-                    attributes["ugeplan_events_next"] = "Not available"
-                    _LOGGER.debug(
-                        "Could not get EasyIQ ugeplan for next week for child "
-                        + str(self._child["name"].split()[0])
-                        + ". Perhaps not available yet."
-                    )
-
-        if self._client.presence[str(self._child["id"])] == 1:
-            for attribute in fields:
-                if attribute == "exitTime" and daily_info[attribute] == "23:59:00":
-                    attributes[attribute] = None
-                else:
-                    try:
-                        attributes[attribute] = datetime.strptime(
-                            daily_info[attribute], "%H:%M:%S"
-                        ).strftime("%H:%M")
-                    except:
-                        attributes[attribute] = daily_info[attribute]
-            attributes["profilePicture"] = profilePicture
-            attributes["institutionProfileId"] = daily_info["institutionProfile"]["id"]
-        return attributes
-
-    @property
-    def should_poll(self):
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def available(self):
-        """Return if entity is available."""
-        return self._coordinator.last_update_success
-
-    @property
-    def unique_id(self):
-        unique_id = "aula" + str(self._child["id"])
-        _LOGGER.debug("Unique ID for child " + str(self._child["id"]) + " " + unique_id)
-        return unique_id
-
-    @property
-    def icon(self):
-        return "mdi:account-school"
-
-    async def async_update(self):
-        """Update the entity. Only used by the generic entity update service."""
-        await self._coordinator.async_request_refresh()
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self._coordinator.async_add_listener(self.async_write_ha_state)
+
+class AulaRequestMetricsSensor(CoordinatorEntity, SensorEntity):
+    """Diagnostic sensor over the requests of an entry's refreshes.
+
+    Disabled by default. The per-endpoint counters are in the diagnostics
+    download, and for all entries in the /api/aula/metrics endpoint.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    # Index into RequestMetrics.totals()
+    _total = 0
+
+    def __init__(self, coordinator, client, config_entry) -> None:
+        super().__init__(coordinator)
+        self._client = client
+        self._attr_name = "Aula " + config_entry.title + " " + self._kind
+        self._attr_unique_id = (
+            "aula_" + self._kind.replace(" ", "_") + "_" + config_entry.entry_id
         )
+        self._apply()
+
+    def _apply(self):
+        self._attr_native_value = self._client.metrics.totals()[self._total]
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._apply()
+        self.async_write_ha_state()
+
+
+class AulaRequestsSensor(AulaRequestMetricsSensor):
+    _kind = "requests"
+    _attr_icon = "mdi:swap-vertical"
+
+
+class AulaRequestErrorsSensor(AulaRequestMetricsSensor):
+    _kind = "request errors"
+    _attr_icon = "mdi:alert-circle-outline"
+    _total = 1
+
+
+class AulaRequestLatencySensor(AulaRequestMetricsSensor):
+    """Mean request latency since the entry was set up."""
+
+    _kind = "request latency"
+    _attr_icon = "mdi:timer-outline"
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _total = 2
+
+    def _apply(self):
+        latency = self._client.metrics.totals()[self._total]
+        self._attr_native_value = round(latency * 1000) if latency is not None else None
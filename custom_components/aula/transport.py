@@ -0,0 +1,158 @@
+"""HTTP transport shared by the clients of all config entries.
+
+Every client sends its requests through one Transport, so several accounts
+on one Home Assistant instance share a connection pool, a per-host rate limit
+and the worker threads used to fetch providers concurrently.
+"""
+
+import concurrent.futures
+import contextvars
+import http.cookiejar
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .cache import TTLCache
+from .metrics import RequestMetrics, current_metrics
+from .profiling import profiled
+from .const import (
+    MAX_CONCURRENT_FETCHES,
+    SHARED_CHILD_DATA_MAX_ENTRIES,
+    WEEKPLAN_CACHE_MAX_ENTRIES,
+    TRANSPORT_POOL_SIZE,
+    TRANSPORT_RATE,
+    TRANSPORT_BURST,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket per host, allowing rate requests per second in bursts of burst."""
+
+    def __init__(self, rate, burst):
+        self._rate = rate
+        self._burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        """Block until a request to host is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, updated = self._buckets.get(host, (self._burst, now))
+                tokens = min(self._burst, tokens + (now - updated) * self._rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self._rate
+            _LOGGER.debug("Rate limiting requests to " + host)
+            time.sleep(wait)
+
+
+class RateLimitedSession(requests.Session):
+    """Session whose requests wait for the transport's rate limiter.
+
+    Every request is recorded in the transport's metrics, and in those of the
+    refresh making it, see RequestMetrics.recording.
+    """
+
+    def __init__(self, limiter, metrics):
+        super().__init__()
+        self._limiter = limiter
+        self._metrics = metrics
+
+    def request(self, method, url, *args, **kwargs):
+        self._limiter.acquire(urlsplit(url).hostname or "")
+        metrics = [self._metrics, current_metrics()]
+        started = time.monotonic()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            for recorder in filter(None, metrics):
+                recorder.record(url, time.monotonic() - started)
+            raise
+        seconds = time.monotonic() - started
+        if kwargs.get("stream"):
+            size = int(response.headers.get("content-length") or 0)
+        else:
+            size = len(response.content)
+        for recorder in filter(None, metrics):
+            recorder.record(url, seconds, response.status_code, size)
+        return response
+
+
+class Transport:
+    """Connection pool, rate limiter and fetch threads shared by all clients.
+
+    It also holds the data that is the same for every guardian of a child, so
+    an entry can reuse what another entry fetched for the same child.
+    """
+
+    def __init__(
+        self,
+        rate=TRANSPORT_RATE,
+        burst=TRANSPORT_BURST,
+        pool_size=TRANSPORT_POOL_SIZE,
+        max_workers=MAX_CONCURRENT_FETCHES,
+        adapter=None,
+    ):
+        """Create the transport, sending requests through adapter if given.
+
+        By default requests go to the network through a pooled HTTPAdapter.
+        """
+        self.limiter = RateLimiter(rate, burst)
+        # Requests of all clients, see metrics.py
+        self.metrics = RequestMetrics()
+        # Keyed by child user id, see Client._week_key
+        self.weekplan_cache = TTLCache(max_entries=WEEKPLAN_CACHE_MAX_ENTRIES)
+        # Presence by child id, and schedules by the child ids they cover
+        self.child_data = TTLCache(max_entries=SHARED_CHILD_DATA_MAX_ENTRIES)
+        self._adapter = adapter or HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="aula"
+        )
+        # The widget APIs are authenticated per request, so their requests share
+        # one session that never keeps cookies between accounts
+        self._session = self.new_session()
+        self._session.cookies.set_policy(
+            http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+        )
+
+    def new_session(self):
+        """Return a session of its own, e.g. for an account's Aula cookies.
+
+        The session still uses the shared connection pool and rate limiter.
+        """
+        session = RateLimitedSession(self.limiter, self.metrics)
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)
+        return session
+
+    def get(self, url, **kwargs):
+        return self._session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._session.post(url, **kwargs)
+
+    def submit(self, job):
+        """Run job on one of the shared fetch threads, returning a future.
+
+        The job runs in a copy of the caller's context, so its requests are
+        recorded in the metrics of the refresh that submitted it, and profiled
+        with it when it is profiled.
+        """
+        return self._executor.submit(contextvars.copy_context().run, profiled(job))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+        self._adapter.close()
@@ -0,0 +1,78 @@
+import logging
+import datetime
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from .const import (
+    DOMAIN,
+    CONTENT_KINDS,
+    DEFAULT_CONTENT_PAGE_SIZE,
+    MAX_CONTENT_PAGE_SIZE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@callback
+def async_register_websocket_commands(hass: HomeAssistant) -> None:
+    """Register the websocket commands once, however many entries are set up."""
+    if hass.data[DOMAIN].get("websocket_registered"):
+        return
+    websocket_api.async_register_command(hass, websocket_content)
+    hass.data[DOMAIN]["websocket_registered"] = True
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "aula/content",
+        vol.Required("child"): str,
+        vol.Required("kind"): vol.In(CONTENT_KINDS),
+        vol.Optional("week"): vol.Match(r"^\d{4}-W\d{2}$"),
+        vol.Optional("config_entry_id"): str,
+        vol.Optional("page", default=0): vol.All(int, vol.Range(min=0)),
+        vol.Optional("page_size", default=DEFAULT_CONTENT_PAGE_SIZE): vol.All(
+            int, vol.Range(min=1, max=MAX_CONTENT_PAGE_SIZE)
+        ),
+    }
+)
+@callback
+def websocket_content(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict
+) -> None:
+    """Return a page of plan, Huskelisten or message content for a child.
+
+    The child is given by first name, as in the sensor attributes, and the week
+    as an ISO week like 2024-W04, defaulting to the current week. The content
+    comes from the client's caches, so this never waits for Aula. Without a
+    config_entry_id, the first account with a child of that name is used.
+    """
+    from . import loaded_entries
+
+    entries = loaded_entries(hass)
+    if "config_entry_id" in msg:
+        entries = {
+            entry_id: data
+            for entry_id, data in entries.items()
+            if entry_id == msg["config_entry_id"]
+        }
+    clients = [
+        data["client"]
+        for data in entries.values()
+        if any(
+            child["name"].split()[0] == msg["child"]
+            for child in data["client"].snapshot.children
+        )
+    ]
+    if not clients:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_NOT_FOUND, "No Aula child " + msg["child"]
+        )
+        return
+    client = clients[0]
+    week = msg.get("week") or datetime.datetime.now().strftime("%G-W%V")
+    connection.send_result(
+        msg["id"],
+        client.get_content(
+            msg["kind"], msg["child"], week, msg["page"], msg["page_size"]
+        ),
+    )
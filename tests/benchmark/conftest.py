@@ -0,0 +1,52 @@
+import json
+import os
+
+# Filled by the benchmarks, reported at the end of the test session
+RESULTS = []
+
+
+REFRESH_COLUMNS = ("children", "stage", "wall_ms", "cpu_ms", "requests", "peak_kib")
+LOAD_COLUMNS = (
+    "entries",
+    "cycle",
+    "cycle_s",
+    "max_refresh_s",
+    "requests",
+    "threads",
+    "fetch_threads",
+    "connections",
+    "pool_full",
+    "rss_mib",
+    "max_entries",
+)
+
+
+def _write_table(terminalreporter, columns, results):
+    width = max(12, *(len(column) + 2 for column in columns))
+    terminalreporter.write_line("".join(column.rjust(width) for column in columns))
+    for result in results:
+        terminalreporter.write_line(
+            "".join(str(result.get(column, "")).rjust(width) for column in columns)
+        )
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    refreshes = [result for result in RESULTS if "benchmark" not in result]
+    loads = [result for result in RESULTS if result.get("benchmark") == "load"]
+    if refreshes:
+        terminalreporter.section("Aula benchmarks")
+        _write_table(terminalreporter, REFRESH_COLUMNS, refreshes)
+    if loads:
+        terminalreporter.section(
+            "Aula load test, {children} children per entry, {latency_ms} ms latency".format(
+                **loads[0]
+            )
+        )
+        _write_table(terminalreporter, LOAD_COLUMNS, loads)
+    # CI can keep the results to compare runs
+    path = os.environ.get("AULA_BENCHMARK_JSON")
+    if path:
+        with open(path, "w") as results_file:
+            json.dump(RESULTS, results_file, indent=2)
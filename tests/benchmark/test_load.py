@@ -0,0 +1,198 @@
+"""Load test of several entries refreshing against the local stub.
+
+Starts N entries with M children each, sharing one transport and refresh
+scheduler as the entries of one Home Assistant instance do, and runs two
+refresh cycles in which every entry is due at once. Every cycle reports its
+duration and slowest refresh, the peak number of threads, fetch threads and
+connections to the stub, the urllib3 warnings about a full connection pool,
+and the resident memory of the process. max_entries estimates how many such
+entries fit in TRANSITION_UPDATE_INTERVAL, the shortest refresh interval.
+
+Scale it with AULA_LOAD_ENTRIES, the values of N (default "1,3"),
+AULA_LOAD_CHILDREN, M (default 2), and AULA_LOAD_LATENCY, the stub's
+latency in seconds (default 0.02):
+
+    AULA_LOAD_ENTRIES=1,5,10,20 AULA_LOAD_LATENCY=0.2 pytest tests/benchmark/test_load.py
+"""
+
+import asyncio
+import functools
+import gc
+import logging
+import os
+import resource
+import threading
+import time
+
+import pytest
+
+from custom_components.aula.const import MAX_CONCURRENT_FETCHES, TRANSPORT_POOL_SIZE
+from custom_components.aula.coordinator import (
+    TRANSITION_UPDATE_INTERVAL,
+    RefreshScheduler,
+)
+from custom_components.aula.model import build_child_views
+from custom_components.aula.transport import Transport
+
+from .conftest import RESULTS
+from ..helpers.stub import AulaStub, StubAdapter, logged_in_client
+
+ENTRIES = [int(n) for n in os.environ.get("AULA_LOAD_ENTRIES", "1,3").split(",")]
+CHILDREN = int(os.environ.get("AULA_LOAD_CHILDREN", "2"))
+LATENCY = float(os.environ.get("AULA_LOAD_LATENCY", "0.02"))
+# How often the sampler looks at the threads and connections, in seconds
+SAMPLE_INTERVAL = 0.01
+
+
+class ExecutorHass:
+    """Just enough of Home Assistant for the refresh scheduler."""
+
+    async def async_add_executor_job(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def connections(port):
+    """Return the number of established client connections to port, if known."""
+    count = 0
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as tcp:
+                next(tcp)
+                for line in tcp:
+                    fields = line.split()
+                    remote_port = int(fields[2].rpartition(":")[2], 16)
+                    if remote_port == port and fields[3] == "01":
+                        count += 1
+        except OSError:
+            return None
+    return count
+
+
+def resident_kib():
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        return None
+    return pages * resource.getpagesize() // 1024
+
+
+class Sampler:
+    """Samples the threads and connections in the background, keeping the peaks."""
+
+    def __init__(self, transport, port):
+        self._transport = transport
+        self._port = port
+        self._stop = threading.Event()
+        self.threads = self.fetch_threads = 0
+        self.connections = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.threads = max(self.threads, threading.active_count())
+            self.fetch_threads = max(
+                self.fetch_threads, len(self._transport._executor._threads)
+            )
+            count = connections(self._port)
+            if count is not None:
+                self.connections = max(self.connections or 0, count)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class PoolWarnings(logging.Handler):
+    """Counts the connections urllib3 discards as its pool is full."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if "pool is full" in record.getMessage():
+            self.count += 1
+
+
+def refresh(client, durations):
+    started = time.perf_counter()
+    client.update_data()
+    build_child_views(client)
+    durations.append(time.perf_counter() - started)
+
+
+async def refresh_cycle(scheduler, clients):
+    """Refresh every client once, all due at the same time, return the durations."""
+    durations = []
+    await asyncio.gather(
+        *(
+            scheduler.async_run(functools.partial(refresh, client, durations))
+            for client in clients
+        )
+    )
+    return durations
+
+
+@pytest.mark.parametrize("entries", ENTRIES, ids=lambda n: f"{n}entries")
+def test_load__entries_share_transport_and_scheduler(entries):
+    stub = AulaStub(CHILDREN, latency=LATENCY, guardians=entries)
+    stub.url = stub.start()
+    port = int(stub.url.rpartition(":")[2])
+    transport = Transport(adapter=StubAdapter(stub.url))
+    clients = [
+        logged_in_client(stub, transport, guardian) for guardian in range(entries)
+    ]
+    scheduler = RefreshScheduler(ExecutorHass())
+    # One loop for all cycles, as the scheduler's lock belongs to it
+    loop = asyncio.new_event_loop()
+    pool_warnings = PoolWarnings()
+    logging.getLogger("urllib3.connectionpool").addHandler(pool_warnings)
+
+    try:
+        for cycle in ("cold", "warm"):
+            gc.collect()
+            requests = sum(stub.requests.values())
+            warnings = pool_warnings.count
+            with Sampler(transport, port) as sampler:
+                started = time.perf_counter()
+                durations = loop.run_until_complete(refresh_cycle(scheduler, clients))
+                wall = time.perf_counter() - started
+            RESULTS.append(
+                {
+                    "benchmark": "load",
+                    "entries": entries,
+                    "children": CHILDREN,
+                    "latency_ms": round(LATENCY * 1000),
+                    "cycle": cycle,
+                    "cycle_s": round(wall, 2),
+                    "max_refresh_s": round(max(durations), 2),
+                    "requests": sum(stub.requests.values()) - requests,
+                    "threads": sampler.threads,
+                    "fetch_threads": f"{sampler.fetch_threads}/{MAX_CONCURRENT_FETCHES}",
+                    "connections": f"{sampler.connections}/{TRANSPORT_POOL_SIZE}",
+                    "pool_full": pool_warnings.count - warnings,
+                    "rss_mib": round((resident_kib() or 0) / 1024, 1),
+                    "max_entries": int(
+                        TRANSITION_UPDATE_INTERVAL.total_seconds() / (wall / entries)
+                    ),
+                }
+            )
+    finally:
+        logging.getLogger("urllib3.connectionpool").removeHandler(pool_warnings)
+        loop.close()
+        transport.close()
+        stub.stop()
+
+    assert stub.unknown == []
+    assert len(durations) == entries
+    # Every entry sees its own children only
+    child_ids = [
+        {child["id"] for child in client.snapshot.children} for client in clients
+    ]
+    assert all(len(ids) == CHILDREN for ids in child_ids)
+    assert len(set().union(*child_ids)) == entries * CHILDREN
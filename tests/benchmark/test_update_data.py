@@ -0,0 +1,106 @@
+"""Benchmarks of a refresh against the local stub, for 1, 3 and 8 children.
+
+Every stage reports wall time, CPU time of the process, the number of
+requests the stub answered and the peak of memory allocated by Python. Run
+them alone with `pytest tests/benchmark`, and set AULA_BENCHMARK_JSON to a
+path to also write the results there.
+"""
+
+import gc
+import resource
+import time
+import tracemalloc
+from unittest.mock import MagicMock
+
+import pytest
+
+from custom_components.aula.binary_sensor import AulaBinarySensor
+from custom_components.aula.calendar import CalendarDevice
+from custom_components.aula.model import build_child_views
+from custom_components.aula.sensor import (
+    AulaHuskelistenSensor,
+    AulaMuOpgaverSensor,
+    AulaPresenceSensor,
+    AulaUgeplanSensor,
+)
+
+from .conftest import RESULTS
+from ..helpers.stub import AulaStub, logged_in_client
+
+
+@pytest.fixture
+def stub(request):
+    stub = AulaStub(request.param)
+    stub.url = stub.start()
+    yield stub
+    stub.stop()
+
+
+def set_up_entities(client):
+    coordinator = MagicMock()
+    coordinator.data = build_child_views(client)
+    entities = [AulaBinarySensor(coordinator, client, "aulamessage_benchmark")]
+    for child in client.snapshot.children:
+        entities.extend(
+            sensor(coordinator, child["id"], "benchmark" + str(child["id"]) + sensor._key)
+            for sensor in (
+                AulaPresenceSensor,
+                AulaUgeplanSensor,
+                AulaMuOpgaverSensor,
+                AulaHuskelistenSensor,
+            )
+        )
+        entities.append(
+            CalendarDevice(
+                coordinator, child["name"], child["id"], "benchmark" + str(child["id"])
+            )
+        )
+    return entities
+
+
+def measure(stub, children, stage, func, memory=False):
+    gc.collect()
+    requests = sum(stub.requests.values())
+    if memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = func()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    record = {
+        "children": children,
+        "stage": stage,
+        "wall_ms": round(wall * 1000, 1),
+        "cpu_ms": round(cpu * 1000, 1),
+        "requests": sum(stub.requests.values()) - requests,
+    }
+    if memory:
+        record["peak_kib"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    RESULTS.append(record)
+    return result, record
+
+
+@pytest.mark.parametrize("stub", [1, 3, 8], indirect=True, ids=lambda n: f"{n}children")
+def test_benchmark__update_data(stub):
+    children = len(stub.children)
+    client = logged_in_client(stub)
+
+    _, cold = measure(stub, children, "cold", client.update_data)
+    _, warm = measure(stub, children, "warm", client.update_data)
+    entities, _ = measure(
+        stub, children, "entities", lambda: set_up_entities(client)
+    )
+    # Peak memory of a first refresh, measured apart as tracing slows it down
+    traced = logged_in_client(stub)
+    measure(stub, children, "cold+mem", traced.update_data, memory=True)
+    RESULTS[-1]["maxrss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    assert stub.unknown == []
+    assert len(client.snapshot.children) == children
+    assert len(client.snapshot.messages) == 3
+    assert all(view.lessons for view in build_child_views(client).values())
+    assert len(entities) == 1 + 5 * children
+    # The warm refresh reuses cached plans, threads and reminders
+    assert warm["requests"] < cold["requests"]
+    client._transport.close()
+    traced._transport.close()
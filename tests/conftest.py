@@ -0,0 +1,12 @@
+import pytest
+
+from .helpers.stub import AulaStub
+
+
+@pytest.fixture
+def stub():
+    """The local stub of Aula and the providers, for a guardian of two children."""
+    stub = AulaStub(2)
+    stub.url = stub.start()
+    yield stub
+    stub.stop()
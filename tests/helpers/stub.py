@@ -0,0 +1,330 @@
+"""Local HTTP stub of Aula and the widget providers, for tests and benchmarks.
+
+The stub serves responses built from the recorded fixtures in
+tests/fixtures/benchmark for any number of guardians with any number of
+children, and StubAdapter sends a Transport's requests to it instead of to
+the real hosts. A guardian logs in with the access token "guardian-<n>",
+and the providers recognise it by the widget token Aula then hands out.
+"""
+
+import copy
+import datetime
+import json
+import os
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+from custom_components.aula.client import Client
+from custom_components.aula.transport import Transport
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "fixtures")
+FIRST_NAMES = ["Emilie", "Oscar", "Freja", "William", "Ida", "Noah", "Clara", "Alfred"]
+SURNAMES = ["Hansen", "Jensen", "Nielsen", "Pedersen", "Andersen", "Larsen"]
+WIDGETS = {
+    "0029": "Min Uddannelse Ugebrev",
+    "0030": "Min Uddannelse Opgaver",
+    "0004": "Meebook Ugeplan",
+    "0062": "Huskelisten",
+    "0001": "EasyIQ Ugeplan",
+    "0128": "EasyIQ Ugeplan",
+}
+THREADS_PER_PAGE = 20
+UNREAD_THREADS = 3
+LESSONS_PER_DAY = 6
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as fixture:
+        return json.load(fixture)
+
+
+def _guardian(token):
+    """Return the guardian number at the end of a token, 0 for other tokens."""
+    number = (token or "").rpartition("-")[2]
+    return int(number) if number.isdigit() else 0
+
+
+class AulaStub:
+    """Serves what Aula and the providers would answer guardians of children.
+
+    Each guardian has as many children of their own as children says, and
+    the children attribute lists those of the first guardian.
+    """
+
+    def __init__(self, children, latency=0.0, guardians=1):
+        self.latency = latency
+        self.requests = Counter()
+        # Requests to Aula by API method
+        self.methods = Counter()
+        # Requests the stub has no response for
+        self.unknown = []
+        self._lock = threading.Lock()
+        self.guardians = [
+            [
+                {
+                    "id": 2500001 + guardian * 100 + i,
+                    "userId": str(1300001 + guardian * 100 + i),
+                    "name": FIRST_NAMES[i % len(FIRST_NAMES)]
+                    + " "
+                    + SURNAMES[guardian % len(SURNAMES)],
+                    "institutionProfile": {"institutionName": "Højelse Skole"},
+                }
+                for i in range(children)
+            ]
+            for guardian in range(guardians)
+        ]
+        self.children = self.guardians[0]
+        self._fixtures = {
+            name: load("benchmark/" + name + ".json")
+            for name in (
+                "daily_overview",
+                "thread",
+                "mu_ugebrev",
+                "mu_opgave",
+                "meebook_weekplan",
+                "systematic_reminder",
+                "easyiq_event",
+                "easyiq_weekplan_event",
+            )
+        }
+        self._lesson = load("calendar_lesson_substitute_with_location.json")
+        self._server = None
+
+    # Responses
+
+    def _aula(self, method, query, children):
+        if method == "profiles.getProfilesByLogin":
+            return {
+                "status": {"code": 0, "message": "OK"},
+                "data": {
+                    "profiles": [
+                        {
+                            "children": children,
+                            "institutionProfiles": [{"institutionCode": "280123"}],
+                        }
+                    ]
+                },
+            }
+        if method == "profiles.getProfileContext":
+            return {
+                "status": {"code": 0, "message": "OK"},
+                "data": {
+                    "userId": "guardian01",
+                    "institutionProfile": {"relations": []},
+                    "pageConfiguration": {
+                        "widgetConfigurations": [
+                            {"widget": {"widgetId": widget_id, "name": name}}
+                            for widget_id, name in WIDGETS.items()
+                        ]
+                    },
+                },
+            }
+        if method == "presence.getDailyOverview":
+            child_id = int(query["childIds[]"][0])
+            overview = copy.deepcopy(self._fixtures["daily_overview"])
+            overview["institutionProfile"]["id"] = child_id
+            overview["institutionProfile"]["profilePicture"]["url"] = (
+                "https://media-prod.aula.dk/profile-pictures/"
+                + str(child_id)
+                + ".jpg?X-Amz-Signature=0123456789abcdef"
+            )
+            return {"status": {"code": 0, "message": "OK"}, "data": [overview]}
+        if method == "messaging.getThreads":
+            page = int(query.get("page", ["0"])[0])
+            threads = [
+                {
+                    "id": 9000000 - page * THREADS_PER_PAGE - i,
+                    "read": page > 0 or i >= UNREAD_THREADS,
+                    "subject": "Tråd " + str(i),
+                    "latestMessage": {"id": "m" + str(page * THREADS_PER_PAGE + i)},
+                }
+                for i in range(THREADS_PER_PAGE)
+            ]
+            return {
+                "status": {"code": 0, "message": "OK"},
+                "data": {"threads": threads, "moreMessagesExist": page < 2},
+            }
+        if method == "messaging.getMessagesForThread":
+            return self._fixtures["thread"]
+        if method == "aulaToken.getAulaToken":
+            guardian = _guardian(query.get("access_token", [""])[0])
+            return {
+                "status": {"code": 0, "message": "OK"},
+                "data": "widget-token-" + str(guardian),
+            }
+        if method == "calendar.getEventsByProfileIdsAndResourceIds":
+            return {
+                "status": {"code": 0, "message": "OK"},
+                "data": self._lessons(children),
+            }
+        return None
+
+    def _lessons(self, children):
+        """A week of lessons for every child, starting with today."""
+        lessons = []
+        today = datetime.date.today()
+        for child in children:
+            for day in range(5):
+                date = today + datetime.timedelta(days=day)
+                for hour in range(8, 8 + LESSONS_PER_DAY):
+                    lesson = copy.deepcopy(self._lesson)
+                    lesson["belongsToProfiles"] = [child["id"]]
+                    lesson["startDateTime"] = f"{date}T{hour:02}:00:00+02:00"
+                    lesson["endDateTime"] = f"{date}T{hour:02}:45:00+02:00"
+                    lessons.append(lesson)
+        return lessons
+
+    def _provider(self, host, path, query, body, children):
+        names = [child["name"] for child in children]
+        if path.endswith("/ugebrev"):
+            return {
+                "personer": [
+                    {
+                        "navn": name,
+                        "institutioner": [
+                            {"ugebreve": [dict(self._fixtures["mu_ugebrev"])]}
+                        ],
+                    }
+                    for name in names
+                ]
+            }
+        if path.endswith("/opgaveliste"):
+            return {
+                "opgaver": [
+                    dict(self._fixtures["mu_opgave"], kuvertnavn=name, id=i)
+                    for i, name in enumerate(names * 4)
+                ]
+            }
+        if path.endswith("/relatedweekplan/all"):
+            return [
+                {"id": i, "name": name, "weekPlan": self._fixtures["meebook_weekplan"]}
+                for i, name in enumerate(names)
+            ]
+        if path.endswith("/reminders/v1"):
+            return [
+                {
+                    "userName": name,
+                    "teamReminders": [
+                        dict(self._fixtures["systematic_reminder"], id=i * 10 + j)
+                        for j in range(3)
+                    ],
+                }
+                for i, name in enumerate(names)
+            ]
+        if path.endswith("/weekplaninfo"):
+            return {"Events": [self._fixtures["easyiq_event"]] * 10}
+        if path.endswith("/Aula/AuthenticateAulaUser"):
+            return {"loginId": "login-1"}
+        if path.endswith("/Dashboard/Content"):
+            return '<html><body><input id="StudentBaseClass" value="4711"></body></html>'
+        if path.endswith("/Calendar/WeekPlan"):
+            return {"weekPlans": [{"text": self._fixtures["mu_ugebrev"]["indhold"]}]}
+        if path.endswith("/Calendar/CalendarGetWeekplanEvents"):
+            return [self._fixtures["easyiq_weekplan_event"]] * 10
+        return None
+
+    def respond(self, method, url, body, headers=None):
+        """Return status, content type and body for a request to url."""
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        with self._lock:
+            self.requests[parts.hostname] += 1
+            if "method" in query:
+                self.methods[query["method"][0]] += 1
+        if "method" in query:
+            token = query.get("access_token", [""])[0]
+        else:
+            headers = headers or {}
+            token = headers.get("authorization") or headers.get("aula-authorization")
+        children = self.guardians[min(_guardian(token), len(self.guardians) - 1)]
+        if "method" in query:
+            content = self._aula(query["method"][0], query, children)
+        else:
+            content = self._provider(parts.hostname, parts.path, query, body, children)
+        if content is None:
+            with self._lock:
+                self.unknown.append(method + " " + url)
+            return 404, "application/json", b'{"status": {"code": 404}}'
+        if isinstance(content, str):
+            return 200, "text/html", content.encode()
+        return 200, "application/json", json.dumps(content).encode()
+
+    # Server
+
+    def start(self):
+        """Start serving on a free local port, returning the stub's URL."""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("content-length") or 0)
+                body = self.rfile.read(length) if length else b""
+                # The path starts with the host the request was meant for
+                host, _, path = self.path[1:].partition("/")
+                if stub.latency:
+                    threading.Event().wait(stub.latency)
+                status, content_type, content = stub.respond(
+                    self.command, "https://" + host + "/" + path, body, self.headers
+                )
+                self.send_response(status)
+                self.send_header("content-type", content_type)
+                self.send_header("content-length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return "http://127.0.0.1:" + str(self._server.server_port)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubAdapter(HTTPAdapter):
+    """Sends requests for any host to the stub, prefixing the path with the host."""
+
+    def __init__(self, stub_url):
+        super().__init__(pool_connections=10, pool_maxsize=10)
+        self._stub_url = stub_url
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = (
+            self._stub_url
+            + "/"
+            + parts.hostname
+            + parts.path
+            + ("?" + parts.query if parts.query else "")
+        )
+        return super().send(request, **kwargs)
+
+
+def logged_in_client(stub, transport=None, guardian=0):
+    """Return a client logged in to the stub with the API verification of login.
+
+    The client gets a transport of its own unless one is given.
+    """
+    token = "guardian-" + str(guardian)
+    client = Client(
+        "guardian" + str(guardian),
+        stored_tokens={"access_token": token, "token_type": "Bearer"},
+        transport=transport or Transport(adapter=StubAdapter(stub.url)),
+    )
+    # Token expiry is checked against the MitID login service, which is not stubbed
+    client._ensure_valid_token = lambda: True
+    client._apply_token_to_session(token)
+    client._verify_api_access()
+    return client
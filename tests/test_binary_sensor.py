@@ -0,0 +1,25 @@
+from dataclasses import replace
+from unittest.mock import MagicMock
+
+from custom_components.aula.binary_sensor import AulaBinarySensor
+from custom_components.aula.client import Client
+
+
+def test_message_sensor__writes_state_only_when_unread_message_changes():
+    client = Client("testuser")
+    sensor = AulaBinarySensor(MagicMock(), client, "aulamessage_entry")
+    sensor.async_write_ha_state = MagicMock()
+    assert sensor.is_on is False
+
+    sensor._handle_coordinator_update()
+    sensor.async_write_ha_state.assert_not_called()
+
+    client.snapshot = replace(
+        client.snapshot,
+        unread_messages=1,
+        message={"subject": "Tur", "text": "<p>Husk madpakke</p>", "sender": "Lærer"},
+    )
+    sensor._handle_coordinator_update()
+    sensor.async_write_ha_state.assert_called_once()
+    assert sensor.is_on is True
+    assert sensor.extra_state_attributes["subject"] == "Tur"
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from custom_components.aula.cache import TTLCache
+from custom_components.aula.client import weekplan_ttl
+from custom_components.aula.const import WEEKPLAN_TTL_CURRENT, WEEKPLAN_TTL_FUTURE
+
+
+def test_ttl_cache__expired_entry_is_missing():
+    cache = TTLCache()
+    cache.set("fresh", "a", timedelta(minutes=5))
+    cache.set("expired", "b", timedelta(seconds=-1))
+    cache.set("forever", None)
+    assert cache.get("fresh") == "a"
+    assert "expired" not in cache
+    assert "forever" in cache
+
+
+def test_ttl_cache__evicts_oldest_entry():
+    cache = TTLCache(max_entries=2)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.set(3, "c")
+    assert 1 not in cache
+    assert len(cache) == 2
+
+
+def test_weekplan_ttl__depends_on_week_distance():
+    assert weekplan_ttl(0) == WEEKPLAN_TTL_CURRENT
+    assert weekplan_ttl(3) == WEEKPLAN_TTL_FUTURE
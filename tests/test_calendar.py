@@ -1,10 +1,16 @@
 import os
 import pytest
 import json
+from dataclasses import replace
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
 
 from custom_components.aula.calendar import (
+    CalendarDevice,
     parseCalendarLesson,
 )
+from custom_components.aula.client import Client, ClientSnapshot
+from custom_components.aula.model import build_child_views
 
 
 def load_json_fixture(filename):
@@ -33,3 +39,76 @@ def test_parse__with_substitute_without_location(sample__substitute_without_loca
     event = parseCalendarLesson(sample__substitute_without_location)
     assert event.summary == "Test Subject, VIKAR: Test Substitute"
     assert event.location == None
+
+
+def lesson_at(sample, start, end, title):
+    return dict(
+        sample,
+        title=title,
+        startDateTime="2025-02-17T" + start + ":00+00:00",
+        endDateTime="2025-02-17T" + end + ":00+00:00",
+    )
+
+
+@pytest.fixture
+def client(sample__substitute_with_location):
+    sample = sample__substitute_with_location
+    client = Client("testuser")
+    client.snapshot = ClientSnapshot(
+        children=[{"id": 1, "name": "Emilie Test"}],
+        institutions={1: "Test Skole"},
+        schedule=json.dumps(
+            {
+                "data": [
+                    lesson_at(sample, "10:00", "10:45", "Matematik"),
+                    lesson_at(sample, "08:00", "08:45", "Dansk"),
+                    lesson_at(sample, "09:00", "09:45", "Engelsk"),
+                ]
+            }
+        ),
+    )
+    return client
+
+
+def at(time):
+    hour, minute = time.split(":")
+    return datetime(2025, 2, 17, int(hour), int(minute), tzinfo=timezone.utc)
+
+
+def test_child_view__indexes_lessons_by_start(client):
+    view = build_child_views(client)[1]
+    assert [lesson.summary.split(",")[0] for lesson in view.lessons] == [
+        "Dansk",
+        "Engelsk",
+        "Matematik",
+    ]
+    assert view.next_lesson(at("08:30")).summary.startswith("Dansk")
+    assert view.next_lesson(at("08:50")).summary.startswith("Engelsk")
+    assert view.next_lesson(at("11:00")) is None
+    assert [
+        lesson.summary.split(",")[0]
+        for lesson in view.lessons_between(at("08:30"), at("10:00"))
+    ] == ["Dansk", "Engelsk"]
+
+
+def test_calendar__writes_state_only_when_next_lesson_changes(client, monkeypatch):
+    monkeypatch.setattr(
+        "custom_components.aula.calendar.dt_util.now", lambda: at("08:50")
+    )
+    coordinator = MagicMock()
+    coordinator.data = build_child_views(client)
+    calendar = CalendarDevice(coordinator, "Emilie Test", 1, "aulacalendar1_entry")
+    calendar.async_write_ha_state = MagicMock()
+    assert calendar.event.summary.startswith("Engelsk")
+
+    coordinator.data = build_child_views(client)
+    calendar._handle_coordinator_update()
+    calendar.async_write_ha_state.assert_not_called()
+
+    schedule = json.loads(client.snapshot.schedule)
+    del schedule["data"][2]
+    client.snapshot = replace(client.snapshot, schedule=json.dumps(schedule))
+    coordinator.data = build_child_views(client)
+    calendar._handle_coordinator_update()
+    calendar.async_write_ha_state.assert_called_once()
+    assert calendar.event.summary.startswith("Matematik")
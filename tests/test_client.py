@@ -0,0 +1,321 @@
+import datetime
+
+import pytest
+
+from custom_components.aula.client import Client
+from custom_components.aula.transport import Transport
+
+from .helpers.stub import StubAdapter, logged_in_client
+
+
+def reminder(reminder_id, due_date, text="Husk madpakke"):
+    return {
+        "id": reminder_id,
+        "dueDate": due_date,
+        "subjectName": "Dansk",
+        "createdBy": "Test Teacher",
+        "reminderText": text,
+    }
+
+
+@pytest.fixture
+def client():
+    return Client("testuser")
+
+
+def test_sync_reminders__renders_only_changed_reminders(client):
+    first_day = datetime.date(2024, 1, 1)
+    last_day = datetime.date(2024, 1, 8)
+    data = [{"userName": "Emilie Test", "teamReminders": [reminder(1, "2024-01-02T10:00:00Z")]}]
+    client._sync_reminders(data, first_day, last_day)
+    cached = client._reminders["Emilie", 1]
+
+    client._sync_reminders(data, first_day, last_day)
+    assert client._reminders["Emilie", 1] is cached
+
+    data[0]["teamReminders"][0]["reminderText"] = "Husk idrætstøj"
+    result = client._sync_reminders(data, first_day, last_day)
+    assert client._reminders["Emilie", 1] is not cached
+    assert "Husk idrætstøj" in result["Emilie"]
+
+
+def test_sync_reminders__keeps_reminders_outside_synced_range(client):
+    first_day = datetime.date(2024, 1, 1)
+    data = [
+        {
+            "userName": "Emilie Test",
+            "teamReminders": [
+                reminder(1, "2024-01-02T10:00:00Z"),
+                reminder(2, "2024-01-20T10:00:00Z"),
+            ],
+        }
+    ]
+    client._sync_reminders(data, first_day, datetime.date(2024, 1, 30))
+
+    # A near sync that no longer returns reminder 1 means it was deleted
+    data = [{"userName": "Emilie Test", "teamReminders": []}]
+    result = client._sync_reminders(data, first_day, datetime.date(2024, 1, 3))
+    assert ("Emilie", 1) not in client._reminders
+    assert ("Emilie", 2) in client._reminders
+    assert result["Emilie"].count("<h3>") == 1
+
+
+def test_get_content__pages_cached_reminders_for_week(client):
+    data = [
+        {
+            "userName": "Emilie Test",
+            "teamReminders": [
+                reminder(1, "2024-01-22T10:00:00Z"),
+                reminder(2, "2024-01-23T10:00:00Z"),
+                reminder(3, "2024-01-30T10:00:00Z"),
+            ],
+        }
+    ]
+    client._sync_reminders(data, datetime.date(2024, 1, 22), datetime.date(2024, 2, 5))
+
+    content = client.get_content("huskelisten", "Emilie", "2024-W04", 1, 1)
+    assert content["total"] == 2
+    assert [item["due_date"][:10] for item in content["items"]] == ["2024-01-23"]
+
+
+def test_get_content__returns_cached_plans_in_provider_order(client):
+    client._weekplan_cache.set(("0004", "Emilie", "2024-W04"), "<h3>Meebook</h3>")
+    client._weekplan_cache.set(("0029", "Emilie", "2024-W04"), "<p>Ugebrev</p>")
+    client._weekplan_cache.set(("0029", "Karla", "2024-W04"), "<p>Karla</p>")
+
+    content = client.get_content("ugeplan", "Emilie", "2024-W04")
+    assert [item["source"] for item in content["items"]] == ["0029", "0004"]
+    assert client.get_content("mu_opgaver", "Emilie", "2024-W04")["items"] == []
+
+
+def test_update_data__publishes_snapshot_when_refresh_fails(client, monkeypatch):
+    published = client.snapshot
+
+    def failing_refresh(changes):
+        changes["presence"] = {"1234": 1}
+        raise RuntimeError("Aula is down")
+
+    monkeypatch.setattr(client, "_update_data", failing_refresh)
+    with pytest.raises(RuntimeError):
+        client.update_data()
+    assert client.snapshot.presence == {"1234": 1}
+    assert published.presence == {}
+    assert Client("otheruser").widgets is not client.widgets
+
+
+def test_weekplan_cache__is_shared_by_clients_of_the_same_child():
+    transport = Transport()
+    first, second = Client("guardian1", transport=transport), Client(
+        "guardian2", transport=transport
+    )
+    for client in (first, second):
+        client._user_ids_by_name = {"Emilie": "500"}
+    weeks = {0: "2024-W04"}
+    first._store_week("0029", 0, "2024-W04", {"Emilie": "<p>Uge 4</p>"}, ["Emilie"])
+
+    assert second._stale_weeks("0029", ["Emilie"], weeks) == []
+    assert second._cached_week("0029", "2024-W04", ["Emilie"]) == {
+        "Emilie": "<p>Uge 4</p>"
+    }
+    transport.close()
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class FakeThreadSession:
+    """Serves pages of two threads, with the newest listed first."""
+
+    def __init__(self, threads):
+        self.threads = threads
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if "getThreads" in url:
+            page = int(url.split("&page=")[1].split("&")[0])
+            threads = self.threads[page * 2 : page * 2 + 2]
+            return FakeResponse(
+                {
+                    "data": {
+                        "threads": threads,
+                        "moreMessagesExist": len(self.threads) > page * 2 + 2,
+                    }
+                }
+            )
+        thread_id = url.split("threadId=")[1].split("&")[0]
+        return FakeResponse(
+            {
+                "status": {"code": 0},
+                "data": {
+                    "subject": "Tråd " + thread_id,
+                    "messages": [
+                        {
+                            "messageType": "Message",
+                            "text": {"html": "<p>Besked " + thread_id + "</p>"},
+                            "sender": {"fullName": "Lærer"},
+                        }
+                    ],
+                },
+            }
+        )
+
+
+def thread(thread_id, message_id, read=False):
+    return {"id": thread_id, "read": read, "latestMessage": {"id": message_id}}
+
+
+def test_sync_threads__reads_only_changed_threads(client):
+    session = FakeThreadSession(
+        [thread(i, i * 10, read=i > 2) for i in range(1, 7)]
+    )
+    client._session = session
+    client.apiurl = "https://www.aula.dk/api/v19/"
+    client._get_access_token_param = lambda: ""
+
+    assert client._sync_threads() == [1, 2]
+    assert client._read_thread(1)["text"] == "<p>Besked 1</p>"
+    assert len(session.urls) == 4
+
+    # A new message in thread 5 moves it first, the rest is already known, and
+    # the second page is read for unread thread 2 only
+    session.threads = [thread(5, 51)] + [
+        thread(i, i * 10, read=i > 2) for i in (1, 2, 3, 4, 6)
+    ]
+    session.urls = []
+    assert client._sync_threads() == [5, 1, 2]
+    assert len(session.urls) == 2
+    assert client._read_thread(1)["text"] == "<p>Besked 1</p>"
+    assert client._read_thread(5)["subject"] == "Tråd 5"
+    assert len(session.urls) == 3
+
+
+def test_sync_threads__marks_threads_read_elsewhere_as_read(client):
+    session = FakeThreadSession(
+        [thread(i, i * 10, read=i not in (2, 5)) for i in range(1, 7)]
+    )
+    client._session = session
+    client.apiurl = "https://www.aula.dk/api/v19/"
+    client._get_access_token_param = lambda: ""
+    assert client._sync_threads() == [2, 5]
+
+    # Thread 5 on the last page is read in Aula, without a new message
+    session.threads[4] = thread(5, 50, read=True)
+    session.urls = []
+    assert client._sync_threads() == [2]
+    assert len(session.urls) == 3
+
+    # With no unread threads left to look for, the first page is enough
+    session.threads[1] = thread(2, 20, read=True)
+    client._sync_threads()
+    session.urls = []
+    assert client._sync_threads() == []
+    assert len(session.urls) == 1
+
+
+def test_unread_messages__reads_unread_threads_of_first_page_once(client):
+    session = FakeThreadSession(
+        [thread(1, 10), thread(2, 20), thread(3, 30, read=True), thread(4, 40)]
+    )
+    client._session = session
+    client.apiurl = "https://www.aula.dk/api/v19/"
+    client._get_access_token_param = lambda: ""
+
+    unread, messages = client._unread_messages()
+    assert unread == [1, 2, 4]
+    assert [message["thread_id"] for message in messages] == [1, 2]
+    assert messages[1]["text"] == "<p>Besked 2</p>"
+    bodies = [url for url in session.urls if "getMessagesForThread" in url]
+    assert len(bodies) == 2
+
+    session.urls = []
+    assert client._unread_messages()[1] == messages
+    assert not [url for url in session.urls if "getMessagesForThread" in url]
+
+
+def test_update_data__refetches_own_presence_and_reuses_other_entries(stub):
+    transport = Transport(adapter=StubAdapter(stub.url))
+    first = logged_in_client(stub, transport)
+    first.update_data()
+    first.update_data()
+    # An entry's own presence and schedule are not cached between its refreshes
+    assert stub.methods["presence.getDailyOverview"] == 4
+    assert stub.methods["calendar.getEventsByProfileIdsAndResourceIds"] == 2
+    assert first.shared_reuse == {}
+
+    # Another guardian of the same children reuses them within the interval
+    second = logged_in_client(stub, transport)
+    second.update_data()
+    assert stub.methods["presence.getDailyOverview"] == 4
+    assert second.shared_reuse == {"presence": 2, "schedule": 1}
+    assert second.snapshot.daily_overview == first.snapshot.daily_overview
+    transport.close()
+
+
+def test_update_data__drops_an_expired_easyiq_login(stub, monkeypatch):
+    transport = Transport(adapter=StubAdapter(stub.url))
+    client = logged_in_client(stub, transport)
+    client.update_data()
+    logins = dict(client._easyiq_logins)
+    events = client.snapshot.ugep_events
+    assert logins
+
+    paths = []
+    provider = stub._provider
+
+    def expired(host, path, *args):
+        paths.append(path)
+        if path.endswith("/Calendar/WeekPlan"):
+            # EasyIQ no longer accepts the loginId
+            return None
+        return provider(host, path, *args)
+
+    monkeypatch.setattr(stub, "_provider", expired)
+    transport.weekplan_cache.clear()
+    client.update_data()
+    assert client._easyiq_logins == {}
+    assert not [path for path in paths if path.endswith("/CalendarGetWeekplanEvents")]
+    # The events of the last refresh are kept, and the week is not cached as empty
+    assert client.snapshot.ugep_events == events
+    week = client._weeks(1)[0]
+    for name in client._childrenFirstNamesAndUserIDs.values():
+        assert client._week_key("0128", name, week) not in transport.weekplan_cache
+
+    monkeypatch.setattr(stub, "_provider", provider)
+    client.update_data()
+    assert client._easyiq_logins.keys() == logins.keys()
+    transport.close()
+
+
+@pytest.mark.parametrize(
+    "path, widgetid", [("/ugebrev", "0029"), ("/relatedweekplan/all", "0004")]
+)
+def test_update_data__does_not_cache_a_failed_weekplan(stub, monkeypatch, path, widgetid):
+    transport = Transport(adapter=StubAdapter(stub.url))
+    client = logged_in_client(stub, transport)
+    provider = stub._provider
+
+    def failing(host, request_path, *args):
+        if request_path.endswith(path):
+            return None
+        return provider(host, request_path, *args)
+
+    monkeypatch.setattr(stub, "_provider", failing)
+    client.update_data()
+    week = client._weeks(1)[0]
+    keys = [
+        client._week_key(widgetid, name, week)
+        for name in client._childrenFirstNamesAndUserIDs.values()
+    ]
+    # Not cached as children without a plan, so the next refresh asks again
+    assert not [key for key in keys if key in transport.weekplan_cache]
+
+    monkeypatch.setattr(stub, "_provider", provider)
+    client.update_data()
+    assert all(transport.weekplan_cache.get(key) for key in keys)
+    transport.close()
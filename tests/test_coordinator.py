@@ -0,0 +1,147 @@
+import asyncio
+import functools
+import threading
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType, SimpleNamespace
+
+from homeassistant.components.calendar import CalendarEvent
+from homeassistant.util import dt as dt_util
+
+from custom_components.aula import cache, coordinator
+from custom_components.aula.const import SHARED_CHILD_DATA_TTL
+from custom_components.aula.coordinator import (
+    IDLE_UPDATE_INTERVAL,
+    TRANSITION_UPDATE_INTERVAL,
+    UPDATE_INTERVAL,
+    next_update_interval,
+)
+from custom_components.aula.model import ChildView
+from custom_components.aula.transport import Transport
+
+from .helpers.stub import StubAdapter, logged_in_client
+
+
+def at(day, time):
+    hour, minute = time.split(":")
+    return datetime(2025, 2, day, int(hour), int(minute), tzinfo=timezone.utc)
+
+
+def view(presence_attributes=None, lessons=()):
+    empty = MappingProxyType({})
+    return ChildView(
+        child_id=1,
+        first_name="Emilie",
+        institution="Test Skole",
+        week="2025-W08",
+        presence="Kommet/Til stede",
+        presence_attributes=MappingProxyType(presence_attributes or {}),
+        ugeplan_attributes=empty,
+        mu_opgaver_attributes=empty,
+        huskelisten_count=0,
+        huskelisten_attributes=empty,
+        lessons=tuple(
+            CalendarEvent(summary="Dansk", start=at(day, start), end=at(day, end))
+            for day, start, end in lessons
+        ),
+    )
+
+
+def test_next_update_interval__polls_densely_around_expected_pick_up():
+    views = {1: view({"entryTime": "08:00", "exitTime": "15:00"})}
+    assert next_update_interval(views, at(17, "14:50")) == TRANSITION_UPDATE_INTERVAL
+    assert next_update_interval(views, at(17, "11:00")) == UPDATE_INTERVAL
+
+
+def test_next_update_interval__backs_off_until_next_school_day():
+    views = {1: view(lessons=[(17, "08:00", "13:00"), (18, "08:00", "13:00")])}
+    assert next_update_interval(views, at(17, "20:00")) == IDLE_UPDATE_INTERVAL
+    assert next_update_interval(views, at(18, "07:20")) == timedelta(minutes=20)
+    assert next_update_interval({}, at(17, "10:00")) == IDLE_UPDATE_INTERVAL
+
+
+def test_next_update_interval__uses_local_times_on_a_dst_change_day():
+    default = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(dt_util.get_time_zone("Europe/Copenhagen"))
+    try:
+        # Summer time starts at 02:00 on 30 March, 15:00 is then 13:00 UTC
+        views = {1: view({"entryTime": "08:00", "exitTime": "15:00"})}
+        summer = timezone(timedelta(hours=2))
+        interval = functools.partial(next_update_interval, views)
+        assert interval(datetime(2025, 3, 30, 12, 50, tzinfo=timezone.utc)) == (
+            TRANSITION_UPDATE_INTERVAL
+        )
+        assert interval(datetime(2025, 3, 30, 14, 50, tzinfo=summer)) == (
+            TRANSITION_UPDATE_INTERVAL
+        )
+        # 14:50 in winter time is 15:50 local, after the pick-up
+        winter = timezone(timedelta(hours=1))
+        assert interval(datetime(2025, 3, 30, 14, 50, tzinfo=winter)) == (
+            IDLE_UPDATE_INTERVAL
+        )
+        assert interval(datetime(2025, 3, 30, 11, 0, tzinfo=timezone.utc)) == (
+            UPDATE_INTERVAL
+        )
+    finally:
+        dt_util.set_default_time_zone(default)
+
+
+def test_transition_polls__fetch_presence_on_every_poll(stub, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    transport = Transport(adapter=StubAdapter(stub.url))
+    # Two guardians of the same children, polling in a transition window
+    first, second = logged_in_client(stub, transport), logged_in_client(stub, transport)
+    interval = TRANSITION_UPDATE_INTERVAL.total_seconds()
+    ttl = SHARED_CHILD_DATA_TTL.total_seconds()
+
+    def fetched():
+        return stub.methods["presence.getDailyOverview"]
+
+    try:
+        # An entry alone fetches the presence of both children on every poll
+        for poll in range(3):
+            clock[0] = 1000.0 + poll * interval
+            first.update_data()
+            assert fetched() == 2 * (poll + 1)
+        # Another entry polling after the first one's fetch expired fetches too
+        clock[0] += ttl + 1
+        second.update_data()
+        assert fetched() == 8
+        # and the first one reuses that fetch, younger than the poll interval
+        clock[0] += interval - ttl - 1
+        first.update_data()
+        assert fetched() == 8
+        assert first.shared_reuse["presence"] == 2
+    finally:
+        transport.close()
+    assert SHARED_CHILD_DATA_TTL < TRANSITION_UPDATE_INTERVAL
+
+
+class ExecutorHass:
+    async def async_add_executor_job(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def test_refresh_scheduler__a_hanging_refresh_only_delays_others_until_timeout(
+    monkeypatch,
+):
+    monkeypatch.setattr(coordinator, "REFRESH_TURN_TIMEOUT", timedelta(seconds=0.1))
+    scheduler = coordinator.RefreshScheduler(ExecutorHass())
+    login = threading.Event()
+    finished = []
+
+    async def refreshes():
+        # An account waiting on its MitID login, then another account
+        hanging = asyncio.ensure_future(scheduler.async_run(login.wait))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(
+            scheduler.async_run(lambda: finished.append("other")), timeout=5
+        )
+        assert not hanging.done()
+        login.set()
+        await hanging
+        # and one at a time again, once the hanging one has finished
+        await scheduler.async_run(lambda: finished.append("next"))
+
+    asyncio.run(refreshes())
+    assert finished == ["other", "next"]
@@ -0,0 +1,88 @@
+from dataclasses import replace
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+from homeassistant.components.calendar import CalendarEvent
+
+from custom_components.aula.client import ClientSnapshot
+from custom_components.aula.const import (
+    EVENT_NEW_MESSAGE,
+    EVENT_NEW_REMINDER,
+    EVENT_PRESENCE_CHANGED,
+    EVENT_SUBSTITUTE_TEACHER,
+    EVENT_WEEKPLAN_CHANGED,
+)
+from custom_components.aula.events import diff_events
+from custom_components.aula.model import ChildView
+
+EMPTY = MappingProxyType({})
+VIEW = ChildView(
+    child_id=1234,
+    first_name="Emilie",
+    institution="Test Skole",
+    week="2024-W04",
+    presence="Ikke kommet",
+    presence_attributes=EMPTY,
+    ugeplan_attributes=EMPTY,
+    mu_opgaver_attributes=EMPTY,
+    huskelisten_count=0,
+    huskelisten_attributes=EMPTY,
+)
+SNAPSHOT = ClientSnapshot(ugep_attr={"Emilie": "<p>Uge 4</p>"})
+LESSON = CalendarEvent(
+    summary="Dansk, VIKAR: Test Substitute",
+    start=datetime(2024, 1, 23, 8, tzinfo=timezone.utc),
+    end=datetime(2024, 1, 23, 9, tzinfo=timezone.utc),
+)
+
+
+def test_diff_events__no_events_without_changes():
+    assert diff_events(SNAPSHOT, {1234: VIEW}, SNAPSHOT, {1234: VIEW}) == []
+
+
+def test_diff_events__reports_each_kind_of_change():
+    snapshot = replace(
+        SNAPSHOT,
+        ugepnext_attr={"Emilie": "<p>Uge 5</p>"},
+        messages=[{"thread_id": 7, "subject": "Tur", "sender": "Lærer", "text": "x"}],
+    )
+    view = replace(
+        VIEW,
+        presence="Kommet/Til stede",
+        lessons=(LESSON,),
+        reminders=MappingProxyType({99: datetime(2024, 1, 24)}),
+    )
+    events = diff_events(SNAPSHOT, {1234: VIEW}, snapshot, {1234: view})
+
+    child = {"child_id": 1234, "child": "Emilie"}
+    assert events == [
+        (EVENT_NEW_MESSAGE, {"thread_id": 7, "subject": "Tur", "sender": "Lærer"}),
+        (
+            EVENT_PRESENCE_CHANGED,
+            {**child, "from": "Ikke kommet", "to": "Kommet/Til stede"},
+        ),
+        (EVENT_WEEKPLAN_CHANGED, {**child, "week": "2024-W05", "new": True}),
+        (
+            EVENT_SUBSTITUTE_TEACHER,
+            {
+                **child,
+                "summary": LESSON.summary,
+                "start": "2024-01-23T08:00:00+00:00",
+                "end": "2024-01-23T09:00:00+00:00",
+                "location": None,
+            },
+        ),
+        (
+            EVENT_NEW_REMINDER,
+            {**child, "reminder_id": 99, "due_date": "2024-01-24T00:00:00"},
+        ),
+    ]
+
+
+def test_diff_events__week_rollover_is_not_a_change():
+    old = replace(SNAPSHOT, ugepnext_attr={"Emilie": "<p>Uge 5</p>"})
+    new = replace(SNAPSHOT, ugep_attr={"Emilie": "<p>Uge 5</p>"})
+    assert (
+        diff_events(old, {1234: VIEW}, new, {1234: replace(VIEW, week="2024-W05")})
+        == []
+    )
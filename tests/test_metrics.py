@@ -0,0 +1,53 @@
+import requests
+
+from custom_components.aula.metrics import RequestMetrics, request_label
+from custom_components.aula.transport import Transport
+
+API = "https://www.aula.dk/api/v22/?method=messaging.getThreads&page=0"
+
+
+def test_request_label__aula_method_or_host():
+    assert request_label(API) == "messaging.getThreads"
+    assert request_label("https://api.minuddannelse.net/aula/ugebrev?x=1") == (
+        "api.minuddannelse.net"
+    )
+
+
+def test_record__counts_latency_bytes_and_errors():
+    metrics = RequestMetrics()
+    metrics.record(API, 0.2, 200, 1000)
+    metrics.record(API, 3, 503, 10)
+    metrics.record(API, 0.05)
+
+    endpoint = metrics.as_dict()["messaging.getThreads"]
+    assert endpoint["requests"] == 3
+    assert endpoint["errors"] == 2
+    assert endpoint["bytes"] == 1010
+    assert endpoint["statuses"] == {"200": 1, "503": 1, "exception": 1}
+    assert endpoint["latency_buckets"]["0.1"] == 1
+    assert endpoint["latency_buckets"]["0.25"] == 1
+    assert endpoint["latency_buckets"]["5"] == 1
+    assert metrics.totals()[:2] == (3, 2)
+    assert (
+        'aula_request_duration_seconds_bucket{endpoint="messaging.getThreads",le="+Inf"} 3'
+        in metrics.as_text()
+    )
+
+
+def test_transport__records_fetch_jobs_in_the_submitting_refresh(monkeypatch):
+    def fake_request(self, method, url, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"{}"
+        return response
+
+    monkeypatch.setattr(requests.Session, "request", fake_request)
+    transport = Transport()
+    refresh = RequestMetrics()
+    with refresh.recording():
+        transport.submit(lambda: transport.get(API)).result()
+    transport.get(API)
+
+    assert refresh.totals()[0] == 1
+    assert transport.metrics.totals()[0] == 2
+    transport.close()
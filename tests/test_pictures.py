@@ -0,0 +1,48 @@
+from custom_components.aula.pictures import ProfilePictureCache
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.headers = {"content-type": "image/png"}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeTransport:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return FakeResponse(url.split("?")[0].encode() * 10)
+
+
+def test_update__fetches_picture_only_when_source_changes(tmp_path):
+    transport = FakeTransport()
+    cache = ProfilePictureCache(str(tmp_path), transport)
+
+    urls = cache.update({42: "https://media.aula.dk/42.png?signature=a"})
+    assert urls[42].startswith("/api/aula/profile_picture/")
+    assert cache.update({42: "https://media.aula.dk/42.png?signature=b"}) == urls
+    assert len(transport.urls) == 1
+
+    path, etag, content_type = cache.lookup(urls[42].rsplit("/", 1)[1])
+    assert content_type == "image/png"
+    cache.update({42: "https://media.aula.dk/42-new.png?signature=c"})
+    assert len(transport.urls) == 2
+    assert cache.lookup(urls[42].rsplit("/", 1)[1])[1] != etag
+
+    # The index survives a restart, keeping the local URLs
+    restarted = ProfilePictureCache(str(tmp_path), transport)
+    assert restarted.update({42: "https://media.aula.dk/42-new.png?x=d"}) == urls
+    assert len(transport.urls) == 2
+
+
+def test_update__drops_oldest_pictures_beyond_max_bytes(tmp_path):
+    cache = ProfilePictureCache(str(tmp_path), FakeTransport(), max_bytes=400)
+    first = cache.update({1: "https://media.aula.dk/1.png"})[1]
+    cache.update({2: "https://media.aula.dk/2.png"})
+    assert cache.lookup(first.rsplit("/", 1)[1]) is None
+    assert not (tmp_path / "1").exists()
@@ -0,0 +1,35 @@
+from custom_components.aula.profiling import RefreshProfile, StageTimer
+from custom_components.aula.transport import Transport
+
+
+def fetch_weekplan():
+    return sum(i * i for i in range(10000))
+
+
+def test_refresh_profile__includes_jobs_run_on_fetch_threads():
+    transport = Transport()
+    profile = RefreshProfile()
+
+    def refresh():
+        return [transport.submit(fetch_weekplan).result() for _ in range(3)]
+
+    try:
+        assert profile.run(refresh) == [fetch_weekplan()] * 3
+    finally:
+        transport.close()
+    functions = {row["function"]: row for row in profile.functions(200)}
+    job = next(row for name, row in functions.items() if "(fetch_weekplan)" in name)
+    assert job["calls"] == 3
+    assert profile.duration >= job["cumulative_time"] / 3
+    assert len(profile.functions(2)) == 2
+    # A profile that has not run has no functions
+    assert RefreshProfile().functions(10) == []
+
+
+def test_stage_timer__adds_up_repeated_stages():
+    stages = StageTimer()
+    stages.mark("presence")
+    stages.mark("messages")
+    stages.mark("presence")
+    assert list(stages.stages) == ["presence", "messages"]
+    assert all(seconds >= 0 for seconds in stages.stages.values())
@@ -0,0 +1,161 @@
+import datetime
+import gzip
+import json
+import types
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from custom_components.aula import client as client_module, recording
+from custom_components.aula.client import Client
+from custom_components.aula.recording import (
+    SAVE_EVERY_EXCHANGES,
+    Archive,
+    Exchange,
+    RecordingAdapter,
+    ReplayAdapter,
+)
+from custom_components.aula.transport import Transport
+
+from .helpers.stub import StubAdapter
+
+
+def refreshed_client(adapter):
+    client = Client(
+        "guardian01",
+        stored_tokens={"access_token": "secret-access-token", "token_type": "Bearer"},
+        transport=Transport(adapter=adapter),
+    )
+    client._ensure_valid_token = lambda: True
+    client._apply_token_to_session("secret-access-token")
+    client._verify_api_access()
+    client.update_data()
+    return client
+
+
+def test_replay__answers_a_refresh_from_the_redacted_archive(stub, tmp_path):
+    path = tmp_path / "refresh.jsonl.gz"
+    recording = RecordingAdapter(path, StubAdapter(stub.url))
+    recorded = refreshed_client(recording)
+    recorded._transport.close()
+    requests = sum(stub.requests.values())
+
+    with gzip.open(path, "rt", encoding="utf-8") as archive_file:
+        archive = archive_file.read()
+    # The MitID username is the guardian's id in Aula and the providers' URLs
+    for secret in ("secret-access-token", "widget-token", "Emilie", "Hansen", "guardian01"):
+        assert secret not in archive
+
+    snapshots = []
+    for _ in range(2):
+        replayed = refreshed_client(ReplayAdapter(Archive.load(path)))
+        snapshots.append(replayed.snapshot)
+        replayed._transport.close()
+    assert sum(stub.requests.values()) == requests
+    assert snapshots[0] == snapshots[1]
+    # The same data, with the names replaced by the same pseudonyms everywhere
+    snapshot = snapshots[0]
+    assert [child["id"] for child in snapshot.children] == [
+        child["id"] for child in recorded.snapshot.children
+    ]
+    assert snapshot.children[0]["name"].startswith("Navn")
+    assert snapshot.unread_count == recorded.snapshot.unread_count == 3
+    assert len(snapshot.ugep_attr) == len(recorded.snapshot.ugep_attr)
+    assert len(json.loads(snapshot.schedule)["data"]) == len(
+        json.loads(recorded.snapshot.schedule)["data"]
+    )
+
+
+def test_replay__answers_the_same_refresh_on_a_later_day(stub, tmp_path, monkeypatch):
+    path = tmp_path / "refresh.jsonl.gz"
+    recorded = refreshed_client(RecordingAdapter(path, StubAdapter(stub.url)))
+    recorded._transport.close()
+
+    # Ten days later, in another week, the client asks for other dates and weeks
+    class Later(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.datetime.now(tz) + datetime.timedelta(days=10)
+
+    later = types.SimpleNamespace(**vars(datetime))
+    later.datetime = Later
+    monkeypatch.setattr(client_module, "datetime", later)
+    monkeypatch.setattr(recording, "datetime", later)
+    replayed = refreshed_client(ReplayAdapter(Archive.load(path)))
+    replayed._transport.close()
+
+    assert replayed.snapshot.unread_count == recorded.snapshot.unread_count
+    assert len(replayed.snapshot.ugep_attr) == len(recorded.snapshot.ugep_attr)
+    assert len(json.loads(replayed.snapshot.schedule)["data"]) == len(
+        json.loads(recorded.snapshot.schedule)["data"]
+    )
+
+
+def test_archive__redacts_login_secrets_and_keeps_names_consistent():
+    archive = Archive()
+
+    def exchange(url, content, headers=None):
+        archive.add(Exchange("GET", url, None, 200, headers or {}, content, 0.1))
+
+    exchange(
+        "https://login.aula.dk/callback?code=abc123&state=xyz",
+        '<form><input type="hidden" name="SAMLResponse" value="PHNhbWw+"/></form>',
+        {"location": "https://app-private.aula.dk/?code=abc123"},
+    )
+    exchange(
+        "https://login.aula.dk/token",
+        b'{"access_token": "eyJhbGci", "refresh_token": "r3fr3sh", "expires_in": 3600}',
+    )
+    exchange(
+        "https://www.aula.dk/api/v22?method=profiles.getProfilesByLogin",
+        '{"status": {"code": 0}, "data": {"children": [{"name": "Emilie Hansen"}]}}',
+    )
+    exchange(
+        "https://api.minuddannelse.net/aula/ugebrev?navn=Emilie",
+        '{"personer": [{"navn": "Emilie", "email": "emilie@example.dk"}]}',
+    )
+
+    redacted = archive.redacted().exchanges
+    text = " ".join(e.url + str(e.headers) + e.content for e in redacted)
+    for secret in ("abc123", "xyz", "PHNhbWw+", "eyJhbGci", "r3fr3sh", "Emilie", "Hansen"):
+        assert secret not in text
+    assert '"expires_in":3600' in redacted[1].content
+    assert '"code":0' in redacted[2].content
+    pseudonym = json.loads(redacted[2].content)["data"]["children"][0]["name"].split()[0]
+    assert redacted[3].url.endswith("navn=" + pseudonym)
+    assert pseudonym in redacted[3].content
+
+
+class PictureAdapter(BaseAdapter):
+    """Answers every request with a profile picture."""
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["content-type"] = "image/jpeg"
+        response._content = b"\xff\xd8\xff\xe0" + bytes(1000)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def test_recording__keeps_the_latest_exchanges_without_pictures(tmp_path):
+    path = tmp_path / "pictures.jsonl.gz"
+    recording = RecordingAdapter(path, PictureAdapter(), max_exchanges=10)
+    session = requests.Session()
+    session.mount("https://", recording)
+    for i in range(SAVE_EVERY_EXCHANGES):
+        response = session.get("https://media-prod.aula.dk/picture" + str(i))
+        # The client still gets the picture
+        assert len(response.content) == 1004
+
+    assert len(recording.archive.exchanges) == 10
+    first = recording.archive.exchanges[0]
+    assert first.url.endswith("picture" + str(SAVE_EVERY_EXCHANGES - 10))
+    assert all(exchange.content == b"" for exchange in recording.archive.exchanges)
+    # Saved while recording, before it is closed
+    assert len(Archive.load(path).exchanges) == 10
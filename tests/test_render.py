@@ -0,0 +1,94 @@
+from custom_components.aula.render import (
+    render_easyiq_weekplan,
+    render_meebook_weekplan,
+    sanitize_html,
+    truncate_html,
+)
+
+
+def test_render_easyiq_weekplan():
+    events = [
+        {
+            "start": "2024/01/22 08:00",
+            "end": "2024/01/22 09:00",
+            "itemType": "5",
+            "title": "Test Title",
+            "ownername": "Test Owner",
+            "description": "Test Description",
+        }
+    ]
+    html = render_easyiq_weekplan("2024-W04", events)
+    assert html == (
+        "<h2> Uge 04</h2><br><b>Mandag  08:00 - 09:00</b><br>"
+        "<br><b>Test Title</b><br>Test Description<br>"
+    )
+
+
+def test_render_meebook_weekplan__is_memoized_by_content():
+    week_plan = [
+        {
+            "date": "mandag 22. jan.",
+            "tasks": [
+                {
+                    "type": "comment",
+                    "pill": "Dansk",
+                    "author": "Test Teacher",
+                    "content": "1. lektion",
+                }
+            ],
+        },
+        {"date": "tirsdag 23. jan.", "tasks": []},
+    ]
+    html = render_meebook_weekplan(week_plan)
+    assert html == (
+        "<h3>mandag 22. jan.</h3><b>Dansk</b><br>Test Teacher<br><br>"
+        "1\\. lektion<br><br><h3>tirsdag 23. jan.</h3>-"
+    )
+    cached = len(render_meebook_weekplan.cache)
+    assert render_meebook_weekplan([dict(day) for day in week_plan]) is html
+    assert len(render_meebook_weekplan.cache) == cached
+
+
+def test_truncate_html():
+    assert truncate_html("<b>kort</b>", 20) == "<b>kort</b>"
+    assert truncate_html("<b>lang tekst</b>", 7) == "<b>lang</b> …"
+    # Never inside a tag, an entity or a word, and with the open tags closed
+    html = '<p>Se <a href="https://example.com/ugeplan">planen</a> for uge 4</p>'
+    assert truncate_html(html, 20) == "<p>Se</p> …"
+    assert truncate_html(html, 52) == (
+        '<p>Se <a href="https://example.com/ugeplan">planen</a></p> …'
+    )
+    assert truncate_html(html, 58) == (
+        '<p>Se <a href="https://example.com/ugeplan">planen</a> for</p> …'
+    )
+    assert truncate_html("<p>Kaffe &amp; kage</p>", 12) == "<p>Kaffe</p> …"
+
+
+def test_sanitize_html__keeps_only_renderable_markup():
+    html = (
+        '<div style="color: red" class="x"><span></span>'
+        '<p><span style="font-size: 12px">Husk   madpakke</span></p>'
+        '<img src="https://t.example/p.gif" width="1" height="1">'
+        '<script>track()</script><!-- note --><font face="Arial">Dansk</font>'
+        '<a href="https://example.com" onclick="track()">Link</a><br></div>'
+    )
+    assert sanitize_html(html) == (
+        "<div><p><span>Husk madpakke</span></p>Dansk"
+        '<a href="https://example.com">Link</a><br/></div>'
+    )
+
+
+def test_sanitize_html__minifies_plain_text():
+    assert sanitize_html("1. lektion  \n\n\n  2. lektion\n  ude") == (
+        "1. lektion\n\n2. lektion\nude"
+    )
+
+
+def test_sanitize_html__escapes_numbering_in_text_only():
+    html = '<p>1. lektion: <a href="https://example.com/uge 1. 2. del">Se 2. del</a></p>'
+    assert sanitize_html(html, escape_numbers=True) == (
+        "<p>1\\. lektion: "
+        '<a href="https://example.com/uge 1. 2. del">Se 2\\. del</a></p>'
+    )
+    assert sanitize_html("1. lektion", escape_numbers=True) == "1\\. lektion"
+    assert sanitize_html(html).startswith("<p>1. lektion")
@@ -0,0 +1,169 @@
+import asyncio
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from custom_components.aula import calendar, sensor
+from custom_components.aula.client import Client, ClientSnapshot
+from custom_components.aula.const import (
+    CONF_MITID_USERNAME,
+    CONF_MU_OPGAVER,
+    CONF_SCHOOLSCHEDULE,
+    CONF_UGEPLAN,
+    DOMAIN,
+)
+from custom_components.aula.model import PRESENCE_FIELDS, build_child_views
+from custom_components.aula.sensor import AulaPresenceSensor, AulaUgeplanSensor
+
+CHILD = {"id": 1234, "name": "Emilie Test"}
+
+
+@pytest.fixture
+def client():
+    client = Client("testuser")
+    client.snapshot = ClientSnapshot(
+        children=[CHILD],
+        institutions={CHILD["id"]: "Test Skole"},
+        presence={str(CHILD["id"]): 0},
+        ugep_attr={"Emilie": "<p>Uge 4</p>"},
+    )
+    return client
+
+
+@pytest.fixture
+def coordinator(client):
+    coordinator = MagicMock()
+    coordinator.data = build_child_views(client)
+    return coordinator
+
+
+def test_build_child_views__presence_daily_overview(client):
+    daily_info = dict.fromkeys(PRESENCE_FIELDS)
+    daily_info.update(
+        status=3,
+        institutionProfile={"id": 42},
+        checkInTime="07:45:00",
+        exitTime="23:59:00",
+    )
+    client.snapshot = replace(
+        client.snapshot,
+        presence={str(CHILD["id"]): 1},
+        daily_overview={str(CHILD["id"]): daily_info},
+    )
+    view = build_child_views(client)[CHILD["id"]]
+    assert view.presence == "Kommet/Til stede"
+    assert view.presence_attributes["checkInTime"] == "07:45"
+    assert view.presence_attributes["exitTime"] is None
+    assert view.presence_attributes["profilePicture"] is None
+    with pytest.raises(AttributeError):
+        view.presence = "Syg"
+
+
+def test_ugeplan_sensor__writes_state_only_when_plan_changes(client, coordinator):
+    sensor = AulaUgeplanSensor(coordinator, CHILD["id"], "aula1234_ugeplan_entry")
+    sensor.async_write_ha_state = MagicMock()
+    assert sensor.extra_state_attributes["ugeplan"] == "<p>Uge 4</p>"
+    assert sensor.extra_state_attributes["content_summary"]["ugeplan"] == 12
+
+    coordinator.data = build_child_views(client)
+    sensor._handle_coordinator_update()
+    sensor.async_write_ha_state.assert_not_called()
+
+    client.snapshot = replace(
+        client.snapshot, ugep_attr={"Emilie": "<p>Uge 4, rettet</p>"}
+    )
+    coordinator.data = build_child_views(client)
+    sensor._handle_coordinator_update()
+    sensor.async_write_ha_state.assert_called_once()
+
+
+def test_child_sensors__share_a_device_per_child(coordinator):
+    presence = AulaPresenceSensor(coordinator, CHILD["id"], "aula1234_entry")
+    ugeplan = AulaUgeplanSensor(coordinator, CHILD["id"], "aula1234_ugeplan_entry")
+    assert presence.native_value == "n/a"
+    assert ugeplan.unique_id == "aula1234_ugeplan_entry"
+    assert presence.device_info == ugeplan.device_info
+    assert presence.device_info["name"] == "Test Skole Emilie"
+
+
+class FakeEntityRegistry:
+    """Entities by unique id, as (entity id, config entry id)."""
+
+    def __init__(self, entities):
+        self.entities = entities
+
+    def async_get_entity_id(self, platform, domain, unique_id):
+        entity = self.entities.get((platform, unique_id))
+        return entity[0] if entity else None
+
+    def async_get(self, entity_id):
+        for entity, config_entry_id in self.entities.values():
+            if entity == entity_id:
+                return SimpleNamespace(config_entry_id=config_entry_id)
+
+    def async_update_entity(self, entity_id, new_unique_id):
+        for (platform, unique_id), entity in list(self.entities.items()):
+            if entity[0] == entity_id:
+                del self.entities[platform, unique_id]
+                self.entities[platform, new_unique_id] = entity
+
+
+def test_setup__entries_sharing_a_child_have_their_own_entities(monkeypatch):
+    # Set up before the unique ids were scoped to the entry
+    registry = FakeEntityRegistry(
+        {
+            ("sensor", "aula1234"): ("sensor.emilie", "first"),
+            ("calendar", "aulacalendar1234"): ("calendar.skoleskema_emilie", "first"),
+        }
+    )
+    monkeypatch.setattr(
+        "custom_components.aula.entity.er.async_get", lambda hass: registry
+    )
+    hass = MagicMock()
+    hass.data = {DOMAIN: {}}
+    other = {"id": 5678, "name": "Oscar Test"}
+    added = {}
+    for entry_id, children in (("first", [CHILD]), ("second", [CHILD, other])):
+        client = Client("guardian-" + entry_id)
+        client.snapshot = ClientSnapshot(
+            children=children,
+            institutions={child["id"]: "Test Skole" for child in children},
+            presence={str(child["id"]): 0 for child in children},
+        )
+        coordinator = MagicMock()
+        coordinator.data = build_child_views(client)
+        hass.data[DOMAIN][entry_id] = {
+            "client": client,
+            "coordinator": coordinator,
+            CONF_MITID_USERNAME: client._mitid_username,
+            CONF_SCHOOLSCHEDULE: True,
+            CONF_UGEPLAN: True,
+            CONF_MU_OPGAVER: True,
+        }
+        entry = SimpleNamespace(entry_id=entry_id, options={}, title=entry_id)
+        for platform in (sensor, calendar):
+            asyncio.run(
+                platform.async_setup_entry(hass, entry, added.setdefault(entry_id, []).extend)
+            )
+
+    unique_ids = [
+        entity.unique_id for entities in added.values() for entity in entities
+    ]
+    assert len(unique_ids) == len(set(unique_ids))
+    assert "aula1234_first" in unique_ids and "aula1234_second" in unique_ids
+    assert "aulacalendar1234_second" in unique_ids
+    # The entities of the first entry keep their entity ids
+    assert registry.entities == {
+        ("sensor", "aula1234_first"): ("sensor.emilie", "first"),
+        ("calendar", "aulacalendar1234_first"): ("calendar.skoleskema_emilie", "first"),
+    }
+    # A shared child is one device, with the entities of both entries
+    devices = {
+        entity.device_info["name"]
+        for entities in added.values()
+        for entity in entities
+        if entity.device_info
+    }
+    assert devices == {"Test Skole Emilie", "Test Skole Oscar"}
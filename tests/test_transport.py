@@ -0,0 +1,24 @@
+import time
+
+from custom_components.aula.transport import RateLimiter, Transport
+
+
+def test_rate_limiter__waits_once_burst_is_spent():
+    limiter = RateLimiter(rate=50, burst=2)
+    start = time.monotonic()
+    limiter.acquire("www.aula.dk")
+    limiter.acquire("www.aula.dk")
+    limiter.acquire("app.meebook.com")
+    assert time.monotonic() - start < 0.015
+    limiter.acquire("www.aula.dk")
+    assert time.monotonic() - start >= 0.015
+
+
+def test_transport__account_sessions_share_the_connection_pool():
+    transport = Transport()
+    first, second = transport.new_session(), transport.new_session()
+    assert first.cookies is not second.cookies
+    assert first.get_adapter("https://www.aula.dk") is second.get_adapter(
+        "https://www.aula.dk"
+    )
+    transport.close()